@@ -0,0 +1,417 @@
+"""
+Бэктест радара AGGRESSIVE / SAFE на истории из локального хранилища свечей.
+
+Правила те же, что в run_bot: объём x, импульс от dynamic_threshold,
+перегрев OVERHEAT_4H, HTF-фильтр, режим рынка, risk/vol_mode, COOLDOWN_MIN,
+анти-дубликат и подтверждение AGG → SAFE.
+
+Все признаки считаются матрицами (монеты × часы) сразу по всем барам.
+По барам в цикле проходим только редкие кандидаты — ради кулдауна и
+подтверждения, которые зависят от предыдущих отправок.
+
+Запуск из корня репозитория (нужны 1h свечи в OHLCV_STORE_DIR):
+    python backtest.py --source binance --symbols BTCUSDT,ETHUSDT,SOLUSDT
+    python backtest.py --source binance --json report.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from core.thresholds import (
+    FLAT_RANGE_MAX,
+    OVERHEAT_4H,
+    COOLDOWN_MIN,
+    AGG_VOL_MIN,
+    AGG_IMPULSE_FACTOR,
+    SAFE_MIN_STRENGTH,
+    CONFIRM_WINDOW_HOURS,
+)
+from core.datasource import OHLCV_STORE_DIR
+from core.store import CandleStore
+
+# =============================
+# НАСТРОЙКИ
+# =============================
+CHART_BARS = 48          # market_chart days=2 → ~48 часовых точек
+VOLUME_24H_BARS = 24     # total_volumes CoinGecko — оборот за 24ч
+VOL_AVG_SKIP = 12        # volumes[:-12] в радаре
+HTF_EMA_SPAN = 20
+HORIZONS = (1, 4, 24)    # горизонты форвард-доходности, в барах
+REGIME_COINS = 50        # calculate_market_regime: coins[:50]
+VOL_MODE_COINS = 30      # calculate_volatility_mode: coins_sample[:30]
+
+STAGE_NONE, STAGE_PREP, STAGE_LAUNCH, STAGE_OVERHEAT = 0, 1, 2, 3
+STAGE_NAMES = {STAGE_NONE: None, STAGE_PREP: "ПОДГОТОВКА", STAGE_LAUNCH: "ЗАПУСК", STAGE_OVERHEAT: "ПЕРЕГРЕВ"}
+
+
+# =============================
+# ЗАГРУЗКА
+# =============================
+def load_history(store, source, symbols, tf="1h"):
+    """
+    Общая сетка timestamp и матрицы close/volume (монеты × бары).
+    Пропуски — NaN. Колонки читаются из memmap без десериализации.
+    """
+    arrays = {}
+    for sym in symbols:
+        cols = store.open_arrays(source, sym, tf)
+        if len(cols["timestamp"]):
+            arrays[sym] = cols
+
+    if not arrays:
+        return [], np.empty(0), np.empty((0, 0)), np.empty((0, 0))
+
+    grid = np.unique(np.concatenate([c["timestamp"] for c in arrays.values()]))
+    close = np.full((len(arrays), len(grid)), np.nan)
+    volume = np.full((len(arrays), len(grid)), np.nan)
+    for i, cols in enumerate(arrays.values()):
+        idx = np.searchsorted(grid, cols["timestamp"])
+        close[i, idx] = cols["close"]
+        volume[i, idx] = cols["volume"]
+
+    return list(arrays), grid, close, volume
+
+
+# =============================
+# СКОЛЬЗЯЩИЕ ОКНА (по оси баров)
+# =============================
+def _rolling(matrix, window, reduce):
+    """reduce по окну, заканчивающемуся на баре t. Первые window-1 баров — NaN."""
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= window:
+        out[:, window - 1:] = reduce(sliding_window_view(matrix, window, axis=1), axis=-1)
+    return out
+
+
+def _shift(matrix, h):
+    """Значение h баров назад (слева NaN)."""
+    out = np.full(matrix.shape, np.nan)
+    if h < matrix.shape[1]:
+        out[:, h:] = matrix[:, :-h] if h else matrix
+    return out
+
+
+def _pct(last, base):
+    # как pct_change: нулевая база → 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chg = (last - base) / base * 100.0
+    return np.where(base == 0, 0.0, chg)
+
+
+def _window_ema(matrix, window, span):
+    """
+    ewm(span, adjust=True).mean() по окну из window последних баров,
+    для каждого бара t. Веса (1-α)^k, k=0 — текущий бар.
+    """
+    alpha = 2.0 / (span + 1)
+    weights = (1 - alpha) ** np.arange(window)
+    weights /= weights.sum()
+    out = np.full(matrix.shape, np.nan)
+    if matrix.shape[1] >= window:
+        for i, row in enumerate(matrix):
+            out[i, window - 1:] = np.convolve(row, weights, mode="valid")
+    return out
+
+
+# =============================
+# ПРИЗНАКИ РАДАРА НА КАЖДОМ БАРЕ
+# =============================
+def radar_frames(close, volume, window=CHART_BARS):
+    """
+    Признаки радара для каждого (монета, бар) — как если бы на этом баре
+    пришёл market_chart за последние window часов.
+    """
+    # total_volumes у CoinGecko — скользящий оборот за 24ч, у свечей — объём бара
+    turnover = _rolling(close * volume, VOLUME_24H_BARS, np.sum)
+
+    full = _rolling(np.isnan(close) | np.isnan(turnover), window, np.sum) == 0
+
+    mean = _rolling(close, window, np.mean)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        price_range = (_rolling(close, window, np.max) - _rolling(close, window, np.min)) / mean * 100.0
+    price_range = np.where(mean != 0, price_range, 0.0)
+
+    # volumes[:-12].mean(): окно window-12, закончившееся 12 баров назад
+    vol_avg = _shift(_rolling(turnover, window - VOL_AVG_SKIP, np.mean), VOL_AVG_SKIP)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_mult = np.where(vol_avg > 0, turnover / vol_avg, 0.0)
+
+    chg_1h = _pct(close, _shift(close, 1))
+    chg_4h = _pct(close, _shift(close, 4))
+
+    # dynamic_threshold: window-1 изменений внутри окна
+    prev = _shift(close, 1)
+    valid = prev != 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = np.where(valid, np.abs((close - prev) / prev * 100), 0.0)
+    count = _rolling(valid.astype(float), window - 1, np.sum)
+    changes_mean = _rolling(changes, window - 1, np.sum) / np.maximum(count, 1)
+    dyn_thr = np.where(count < 10, 1.0, np.maximum(changes_mean * 2, 0.8))
+
+    # analyze_htf_trend: EMA20 по окну, наклон за 4 бара
+    last_ema = _window_ema(close, window, HTF_EMA_SPAN)
+    prev_ema = _shift(_window_ema(close, window - 4, HTF_EMA_SPAN), 4)
+    slope = last_ema - prev_ema
+    htf = np.where((close > last_ema) & (slope > 0), 1, np.where((close < last_ema) & (slope < 0), -1, 0))
+
+    return {
+        "full": full,
+        "price_range": price_range,
+        "vol_mult": vol_mult,
+        "chg_1h": chg_1h,
+        "chg_4h": chg_4h,
+        "dyn_thr": dyn_thr,
+        "htf": htf,
+    }
+
+
+def market_filters(chg_4h, full):
+    """
+    Режим рынка и vol_mode на каждом баре — по тем же монетам, что и вживую
+    (первые REGIME_COINS / VOL_MODE_COINS в порядке списка символов).
+    regime: 1 LONG MARKET, -1 SHORT MARKET, 0 RANGE. vol_mode: 1 HIGH, -1 LOW, 0 NORMAL.
+    """
+    top = full[:REGIME_COINS]
+    chg = np.where(top, chg_4h[:REGIME_COINS], 0.0)
+    total = top.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        long_ratio = np.where(total > 0, (chg > 1.0).sum(axis=0) / total, 0.0)
+        short_ratio = np.where(total > 0, (chg < -1.0).sum(axis=0) / total, 0.0)
+    regime = np.where(long_ratio > 0.6, 1, np.where(short_ratio > 0.6, -1, 0))
+
+    sample = full[:VOL_MODE_COINS]
+    moves = np.where(sample, np.abs(chg_4h[:VOL_MODE_COINS]), 0.0).sum(axis=0)
+    n = sample.sum(axis=0)
+    avg_move = np.where(n > 0, moves / np.maximum(n, 1), 0.0)
+    vol_mode = np.where(n == 0, 0, np.where(avg_move > 5, 1, np.where(avg_move < 1.5, -1, 0)))
+
+    return regime, vol_mode
+
+
+def candidate_signals(fr, regime, vol_mode, risk_score=50):
+    """
+    Условия AGG / SAFE сразу по всем барам. Возвращает матрицы
+    is_agg, is_safe, stage (код), strength — до кулдауна и анти-дубликата.
+    """
+    vm = fr["vol_mult"]
+    chg_1h, chg_4h, thr = fr["chg_1h"], fr["chg_4h"], fr["dyn_thr"]
+
+    strength = (vm >= 1.6).astype(int) + (vm >= 2.0) + (vm >= 3.0)
+    stage = np.full(vm.shape, STAGE_NONE)
+
+    prep = (vm >= 2.0) & (fr["price_range"] <= FLAT_RANGE_MAX)
+    stage[prep] = STAGE_PREP
+    launch = (vm >= 3.0) & (np.abs(chg_1h) >= thr)
+    stage[launch] = STAGE_LAUNCH
+    overheat = np.abs(chg_4h) >= OVERHEAT_4H
+    stage[overheat] = STAGE_OVERHEAT
+    strength = strength + prep + launch + overheat + (chg_1h * chg_4h > 0)
+
+    agg_impulse = np.abs(chg_1h) >= np.maximum(thr * AGG_IMPULSE_FACTOR, 0.6)
+    is_agg = (vm >= AGG_VOL_MIN) & agg_impulse & (stage != STAGE_OVERHEAT)
+
+    is_safe = (stage == STAGE_LAUNCH) & (strength >= SAFE_MIN_STRENGTH) & (np.abs(chg_4h) < OVERHEAT_4H)
+
+    # режим рынка и HTF: SAFE только по направлению
+    direction = np.where(chg_1h >= 0, 1, -1)
+    is_safe &= ~((regime == 1) & (direction == -1))
+    is_safe &= ~((regime == -1) & (direction == 1))
+    is_safe &= fr["htf"] == direction
+
+    if risk_score < 40:
+        is_agg = np.zeros_like(is_agg)
+    if risk_score < 30:
+        is_safe = np.zeros_like(is_safe)
+    if risk_score > 65:
+        strength = strength + is_safe
+
+    is_agg = is_agg & ~(vol_mode == -1)
+    if risk_score < 55:
+        is_agg = is_agg & ~(vol_mode == 1)
+
+    full = fr["full"]
+    return is_agg & full, is_safe & full, stage, strength
+
+
+# =============================
+# КУЛДАУН / АНТИ-ДУБЛИКАТ / ПОДТВЕРЖДЕНИЕ
+# =============================
+def replay_state(ts, is_agg, is_safe, stage, strength, chg_1h):
+    """
+    Последовательный проход по кандидатам одной монеты с тем же состоянием,
+    что coins_state в run_bot. Возвращает список (бар, тип, стадия, сила, направление, подтверждён).
+    """
+    events = []
+    last_sent_ts = 0
+    last_type = last_stage = last_strength = None
+    last_agg_ts = 0
+    last_agg_dir = None
+
+    for t in np.flatnonzero(is_agg | is_safe):
+        now_ts = ts[t]
+        if last_sent_ts and (now_ts - last_sent_ts) < (COOLDOWN_MIN * 60):
+            continue
+
+        sig_type = "SAFE" if is_safe[t] else "AGG"
+        stage_name = STAGE_NAMES[stage[t]]
+        # как в радаре: сравнивается сырая сила с сохранённой нормированной
+        if last_type == sig_type and last_stage == stage_name and last_strength == strength[t]:
+            continue
+
+        direction = "UP" if chg_1h[t] >= 0 else "DOWN"
+        confirmed = (
+            sig_type == "SAFE"
+            and bool(last_agg_ts)
+            and (now_ts - last_agg_ts) <= (CONFIRM_WINDOW_HOURS * 3600)
+            and last_agg_dir == direction
+        )
+        strength_norm = max(1, min(int(strength[t]), 5))
+
+        events.append((int(t), sig_type, stage_name, strength_norm, direction, confirmed))
+
+        last_sent_ts = now_ts
+        last_type, last_stage, last_strength = sig_type, stage_name, strength_norm
+        if sig_type == "AGG":
+            last_agg_ts = now_ts
+            last_agg_dir = direction
+
+    return events
+
+
+# =============================
+# ОТЧЁТ
+# =============================
+def forward_returns(close, horizons=HORIZONS):
+    """{h: матрица доходности в % через h баров}."""
+    out = {}
+    for h in horizons:
+        future = np.full(close.shape, np.nan)
+        if h < close.shape[1]:
+            future[:, :-h] = close[:, h:]
+        out[h] = _pct(future, close)
+    return out
+
+
+def summarize(signals, horizons=HORIZONS):
+    """
+    Число сигналов, hit rate и средняя доходность по направлению сигнала.
+    Доходность шорта (DOWN) берётся с обратным знаком.
+    """
+    groups = {
+        "AGG": [s for s in signals if s["type"] == "AGG"],
+        "SAFE": [s for s in signals if s["type"] == "SAFE"],
+        "SAFE_CONFIRMED": [s for s in signals if s["type"] == "SAFE" and s["confirmed"]],
+        "ALL": signals,
+    }
+
+    summary = {}
+    for name, items in groups.items():
+        row = {"count": len(items)}
+        for h in horizons:
+            rets = np.array([s[f"ret_{h}"] for s in items], dtype=float)
+            rets = rets[~np.isnan(rets)]
+            row[f"hit_{h}"] = float((rets > 0).mean()) if len(rets) else None
+            row[f"avg_{h}"] = float(rets.mean()) if len(rets) else None
+            row[f"med_{h}"] = float(np.median(rets)) if len(rets) else None
+        summary[name] = row
+    return summary
+
+
+def run_backtest(symbols, grid, close, volume, risk_score=50, window=CHART_BARS, horizons=HORIZONS):
+    """
+    Полный прогон: признаки → кандидаты → состояние монет → форвард-доходности.
+    symbols, grid, close, volume — как из load_history.
+    """
+    fr = radar_frames(close, volume, window)
+    regime, vol_mode = market_filters(fr["chg_4h"], fr["full"])
+    is_agg, is_safe, stage, strength = candidate_signals(fr, regime, vol_mode, risk_score)
+    fwd = forward_returns(close, horizons)
+
+    signals = []
+    for i, sym in enumerate(symbols):
+        for t, sig_type, stage_name, strength_norm, direction, confirmed in replay_state(
+            grid, is_agg[i], is_safe[i], stage[i], strength[i], fr["chg_1h"][i]
+        ):
+            sign = 1.0 if direction == "UP" else -1.0
+            sig = {
+                "symbol": sym,
+                "ts": int(grid[t]),
+                "type": sig_type,
+                "stage": stage_name,
+                "strength": strength_norm,
+                "direction": direction,
+                "confirmed": confirmed,
+                "chg_1h": float(fr["chg_1h"][i, t]),
+                "chg_4h": float(fr["chg_4h"][i, t]),
+                "vol_mult": float(fr["vol_mult"][i, t]),
+            }
+            for h in horizons:
+                sig[f"ret_{h}"] = sign * float(fwd[h][i, t])
+            signals.append(sig)
+
+    return {
+        "symbols": len(symbols),
+        "bars": len(grid),
+        "candidates": {"agg": int(is_agg.sum()), "safe": int(is_safe.sum())},
+        "summary": summarize(signals, horizons),
+        "signals": signals,
+    }
+
+
+def format_report(report, horizons=HORIZONS):
+    lines = [
+        f"Монет: {report['symbols']} | баров: {report['bars']} | "
+        f"кандидатов AGG/SAFE: {report['candidates']['agg']}/{report['candidates']['safe']}",
+        "",
+    ]
+    header = f"{'тип':<16}{'сигналов':>9}" + "".join(f"{'hit ' + str(h) + 'ч':>10}{'avg ' + str(h) + 'ч':>10}" for h in horizons)
+    lines.append(header)
+    for name, row in report["summary"].items():
+        cells = f"{name:<16}{row['count']:>9}"
+        for h in horizons:
+            hit, avg = row[f"hit_{h}"], row[f"avg_{h}"]
+            cells += f"{'-' if hit is None else f'{hit * 100:.1f}%':>10}"
+            cells += f"{'-' if avg is None else f'{avg:+.2f}%':>10}"
+        lines.append(cells)
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бэктест радара AGG/SAFE по 1h свечам из хранилища")
+    parser.add_argument("--store", default=OHLCV_STORE_DIR, help="каталог хранилища свечей")
+    parser.add_argument("--source", default="binance", help="источник в хранилище (binance/bybit/coingecko)")
+    parser.add_argument("--symbols", help="через запятую; по умолчанию — все ряды источника (порядок = приоритет для режима рынка)")
+    parser.add_argument("--risk-score", type=int, default=50, help="risk_score для фильтров (вживую сейчас всегда 50)")
+    parser.add_argument("--json", help="сохранить отчёт с сигналами в файл")
+    args = parser.parse_args()
+
+    store = CandleStore(args.store)
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    else:
+        folder = os.path.join(args.store, args.source)
+        suffix = "_1h.f64"
+        names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+        symbols = [n[:-len(suffix)] for n in names if n.endswith(suffix)]
+
+    started = time.time()
+    symbols, grid, close, volume = load_history(store, args.source, symbols)
+    if not symbols:
+        print(f"[BACKTEST] нет 1h свечей в {args.store}/{args.source}", flush=True)
+        return
+
+    report = run_backtest(symbols, grid, close, volume, risk_score=args.risk_score)
+    print(format_report(report), flush=True)
+    print(f"\n[BACKTEST] {time.time() - started:.2f}s", flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Полная итерация радара (main.run_cycle) против локальной заглушки
+benchmarks/stub_server.py: без сети и без сообщений в настоящий чат.
+
+Меряет время цикла, время до доставки всех сообщений (отправка идёт
+в фоне, core/notifier.py), число запросов по эндпоинтам и время до
+первого алерта (AGGRESSIVE / SAFE). Первый цикл включает часовой срез рынка
+(режим, OI, риск), следующие в том же часе — только радар.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_cycle
+    python -m benchmarks.bench_cycle --latency 0.05 --jitter 0.02 --error-rate 0.02
+    python -m benchmarks.bench_cycle --coingecko-rpm 30 --cycles 2 --json cycle.json
+    python -m benchmarks.bench_cycle --at "2026-01-05 07:30"   # с утренним прогнозом
+    python -m benchmarks.bench_cycle --coalesce --telegram-rpm 600
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from benchmarks.stub_server import StubConfig, StubServer
+
+ALERT_MARKERS = ("<b>AGGRESSIVE</b>", "<b>SAFE</b>")
+
+
+def configure_env(base_url, state_dir, telegram_rpm=None, coalesce=False):
+    """Адреса API и настройки очереди читаются при импорте main — вызывать до него."""
+    os.environ["COINGECKO_BASE"] = f"{base_url}/api/v3"
+    os.environ["BYBIT_BASE"] = base_url
+    os.environ["TELEGRAM_API"] = base_url
+    os.environ["STATE_DIR"] = state_dir
+    # настоящий токен из .env в заглушку не отправляем
+    os.environ["BOT_TOKEN"] = "bench"
+    os.environ["CHAT_ID"] = "bench"
+    if telegram_rpm:
+        os.environ["TELEGRAM_CHAT_RPM"] = str(telegram_rpm)
+    if coalesce:
+        os.environ["TELEGRAM_COALESCE"] = "1"
+
+
+def cycle_report(elapsed, delivered, started, stats):
+    messages = stats["messages"]
+    alerts = [m for m in messages if any(marker in m["text"] for marker in ALERT_MARKERS)]
+    return {
+        "cycle_s": round(elapsed, 3),
+        "delivered_s": round(delivered, 3),
+        "requests": stats["counts"],
+        "requests_total": sum(stats["counts"].values()),
+        "injected_errors": stats["errors"],
+        "messages": len(messages),
+        "alerts": len(alerts),
+        "first_message_s": round(messages[0]["ts"] - started, 3) if messages else None,
+        "first_alert_s": round(alerts[0]["ts"] - started, 3) if alerts else None,
+    }
+
+
+def run_bench(coins=80, latency=0.0, jitter=0.0, error_rate=0.0, fixtures=None,
+              cycles=1, at=None, coingecko_rpm=None, telegram_rpm=None, coalesce=False):
+    cfg = StubConfig(coins, latency, jitter, error_rate, fixtures)
+    reports = []
+
+    with StubServer(cfg) as stub, tempfile.TemporaryDirectory() as state_dir:
+        configure_env(stub.url, state_dir, telegram_rpm, coalesce)
+        import main
+        from core.httpclient import rate_limiter
+
+        if coingecko_rpm:
+            # лимит CoinGecko на хост заглушки — цикл идёт с боевым темпом запросов
+            rate_limiter.set_limit(urlsplit(stub.url).netloc, coingecko_rpm / 60.0, 5)
+
+        state, coins_state, stats = main.init_state({})
+        for i in range(cycles):
+            cfg.reset()
+            started = time.time()
+            main.run_cycle(state, coins_state, stats, now=at)
+            elapsed = time.time() - started
+            main.notifier.wait_idle(timeout=600)
+            delivered = time.time() - started
+
+            report = cycle_report(elapsed, delivered, started, cfg.stats())
+            report["cycle"] = i + 1
+            reports.append(report)
+            first = report["first_alert_s"]
+            print(
+                f"[CYCLE {i + 1}] {report['cycle_s']:.2f}s (delivered {report['delivered_s']:.2f}s) | requests {report['requests_total']} | "
+                f"alerts {report['alerts']} | first alert {'-' if first is None else f'{first:.2f}s'}",
+                flush=True,
+            )
+            for name, n in sorted(report["requests"].items()):
+                print(f"    {name:<16}{n:>6}", flush=True)
+
+    return {
+        "config": {
+            "coins": coins,
+            "latency": latency,
+            "jitter": jitter,
+            "error_rate": error_rate,
+            "fixtures": fixtures,
+            "at": at.isoformat() if at else None,
+            "coingecko_rpm": coingecko_rpm,
+            "telegram_rpm": telegram_rpm,
+            "coalesce": coalesce,
+        },
+        "cycles": reports,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк итерации радара против локальной заглушки")
+    parser.add_argument("--coins", type=int, default=80)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа заглушки, сек")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--fixtures", help="каталог с записанными ответами (см. stub_server)")
+    parser.add_argument("--cycles", type=int, default=1)
+    parser.add_argument("--at", help='время по Варшаве "YYYY-MM-DD HH:MM" (по умолчанию — текущее)')
+    parser.add_argument("--coingecko-rpm", type=float, help="включить лимит CoinGecko (запросов/мин)")
+    parser.add_argument("--telegram-rpm", type=float, help="темп отправки в чат (по умолчанию TELEGRAM_CHAT_RPM)")
+    parser.add_argument("--coalesce", action="store_true", help="склеивать алерты цикла в одно сообщение")
+    parser.add_argument("--json", help="сохранить отчёт в файл")
+    args = parser.parse_args()
+
+    at = datetime.strptime(args.at, "%Y-%m-%d %H:%M") if args.at else None
+    report = run_bench(args.coins, args.latency, args.jitter, args.error_rate,
+                       args.fixtures, args.cycles, at, args.coingecko_rpm,
+                       args.telegram_rpm, args.coalesce)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
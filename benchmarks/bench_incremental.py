@@ -0,0 +1,196 @@
+"""
+Потоковые индикаторы (core/incremental.py) против calculate_indicators.
+
+Проверки:
+  * seed (векторный прогрев) даёт то же состояние, что warmup по одной свече;
+  * растущее окно — свечи по одной через indicators_for, на каждом шаге
+    сверка с calculate_indicators по той же истории (должно совпасть);
+  * скользящее окно --window (как отдаёт get_ohlcv) — RSI и SuperTrend
+    совпадают точно, EMA / MACD — с точностью до прогрева EMA на старте
+    окна (печатается максимальная разница и доля совпавших trend);
+  * рестарт — save_engines / load_engines посередине, дальше результат
+    тот же, что без рестарта;
+  * смена источника — за окном Binance 1h приходит окно CoinGecko (30m)
+    или другой ряд того же источника: ответ равен calculate_indicators.
+Время — на одну новую свечу: движок против пересчёта по окну.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_incremental
+    python -m benchmarks.bench_incremental --bars 2000 --window 500
+"""
+import argparse
+import math
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import make_ohlcv
+from core import incremental
+from core.indicators import calculate_indicators
+
+NUMERIC = ("macd_hist", "rsi", "supertrend")
+STEP = 3600
+
+
+def _diff(a, b, keys=NUMERIC):
+    """Максимальная относительная разница числовых полей (NaN == NaN)."""
+    worst = 0.0
+    for k in keys:
+        x, y = a[k], b[k]
+        if math.isnan(x) or math.isnan(y):
+            if not (math.isnan(x) and math.isnan(y)):
+                return math.inf
+            continue
+        worst = max(worst, abs(x - y) / max(1.0, abs(y)))
+    return worst
+
+
+def _indicators(df):
+    return incremental.indicators_for("CHECK", "1h", df, STEP)
+
+
+def _reset():
+    with incremental._engines_lock:
+        incremental._engines.clear()
+
+
+def check_seed(df):
+    seeded = incremental.IndicatorEngine()
+    seeded.seed(df)
+    looped = incremental.IndicatorEngine()
+    looped.warmup(df)
+    probe = df.iloc[-1]
+    a = seeded.preview(probe["high"], probe["low"], probe["close"])
+    b = looped.preview(probe["high"], probe["low"], probe["close"])
+    return _diff(a, b) <= 1e-9 and a["trend"] == b["trend"] and seeded.last_ts == looped.last_ts
+
+
+def check_growing(df, start=60, tol=1e-9):
+    _reset()
+    worst = 0.0
+    trend_ok = True
+    for k in range(start, len(df) + 1):
+        window = df.iloc[:k]
+        got = _indicators(window)
+        ref = calculate_indicators(window)
+        worst = max(worst, _diff(got, ref))
+        trend_ok &= got["trend"] == ref["trend"]
+    return worst <= tol and trend_ok, worst
+
+
+def check_sliding(df, window):
+    _reset()
+    worst = {k: 0.0 for k in NUMERIC}
+    trend_same = 0
+    steps = 0
+    t_engine = t_batch = 0.0
+    for k in range(window, len(df) + 1):
+        part = df.iloc[k - window:k]
+        t0 = time.perf_counter()
+        got = _indicators(part)
+        t1 = time.perf_counter()
+        ref = calculate_indicators(part.copy())     # копия — без кэша core/features.py
+        t2 = time.perf_counter()
+        if k > window:      # первый шаг — прогрев движка, в время не входит
+            t_engine += t1 - t0
+            t_batch += t2 - t1
+        for key in NUMERIC:
+            worst[key] = max(worst[key], _diff(got, ref, (key,)))
+        trend_same += got["trend"] == ref["trend"]
+        steps += 1
+    timed = max(1, steps - 1)
+    return worst, trend_same / steps, t_engine / timed, t_batch / timed
+
+
+def check_restart(df, window):
+    half = len(df) // 2
+
+    def run(restart):
+        _reset()
+        out = []
+        for k in range(window, len(df) + 1):
+            if restart and k == half:
+                path = os.path.join(tempfile.mkdtemp(), "engines.json")
+                incremental.save_engines(path)
+                _reset()
+                incremental.load_engines(path)
+            out.append(_indicators(df.iloc[k - window:k]))
+        return out
+
+    plain, restarted = run(False), run(True)
+    return all(_diff(a, b) == 0.0 and a["trend"] == b["trend"] for a, b in zip(plain, restarted))
+
+
+def check_sources(df, window):
+    """Окна разных рядов подряд: движок не должен склеить их историю."""
+    _reset()
+    binance = df.iloc[-window:].copy()
+    binance.attrs["source"] = "binance"
+    # CoinGecko /ohlc: свечи по 30 минут, свой ряд цен; помечено тем же
+    # источником — отсечь должны проверки шага свечей и закрытия на last_ts
+    coingecko = make_ohlcv(48, seed=7, step_sec=1800)
+    coingecko.index = coingecko.index - coingecko.index[-1] + binance.index[-1] + STEP
+    coingecko.attrs["source"] = "binance"
+    # тот же источник, но ряд разошёлся (другие закрытия на тех же ts)
+    other = make_ohlcv(len(df), seed=11).iloc[-window + 1:].copy()
+    other.index = binance.index[1:]
+    other = other.reindex(list(other.index) + [other.index[-1] + STEP], method="ffill")
+    other.index.name = "timestamp"
+    other.attrs["source"] = "binance"
+
+    ok = True
+    for part in (binance, coingecko, other):
+        got = _indicators(part)
+        ref = calculate_indicators(part.copy())
+        ok &= got is None or (_diff(got, ref) <= 1e-6 and got["trend"] == ref["trend"])
+    _reset()
+    return ok
+
+
+def run_bench(bars=1000, window=200):
+    df = make_ohlcv(bars)
+    df.attrs["source"] = "bench"
+
+    seed_ok = check_seed(df)
+    print(f"[INCREMENTAL] seed vs warmup, {bars} bars: same {seed_ok}", flush=True)
+
+    ok, worst = check_growing(df)
+    print(f"[INCREMENTAL] growing window, {bars} bars: max rel diff {worst:.2e}  same {ok}", flush=True)
+
+    worst_by, trend_share, t_engine, t_batch = check_sliding(df, window)
+    diffs = "  ".join(f"{k} {v:.2e}" for k, v in worst_by.items())
+    print(f"[INCREMENTAL] sliding window {window}: max rel diff {diffs} | trend same {trend_share:.1%}", flush=True)
+    print(f"[INCREMENTAL] per new bar: engine {t_engine * 1e3:.3f} ms vs calculate_indicators "
+          f"{t_batch * 1e3:.3f} ms ({t_batch / t_engine:.1f}x)", flush=True)
+
+    restart_ok = check_restart(df, window)
+    print(f"[INCREMENTAL] save/load mid-stream: same {restart_ok}", flush=True)
+
+    sources_ok = check_sources(df, window)
+    print(f"[INCREMENTAL] mixed sources / diverged series: same as window {sources_ok}", flush=True)
+    _reset()
+
+    return {
+        "seed_same": seed_ok,
+        "growing_same": ok,
+        "growing_max_diff": worst,
+        "sliding_max_diff": worst_by,
+        "sliding_trend_same": trend_share,
+        "engine_ms": t_engine * 1e3,
+        "batch_ms": t_batch * 1e3,
+        "restart_same": restart_ok,
+        "sources_same": sources_ok,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковые индикаторы против calculate_indicators")
+    parser.add_argument("--bars", type=int, default=1000)
+    parser.add_argument("--window", type=int, default=200, help="длина окна get_ohlcv")
+    args = parser.parse_args()
+
+    run_bench(args.bars, args.window)
+
+
+if __name__ == "__main__":
+    main()
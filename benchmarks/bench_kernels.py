@@ -0,0 +1,130 @@
+"""
+Микробенчмарк векторных ядер OBV / MFI / SuperTrend против прежних циклов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_kernels
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ohlcv
+from core.divergence import OBV
+from core.indicators import atr, obv, supertrend
+from core.moneyflow import mfi
+
+SIZES = (500, 5_000, 50_000)
+
+
+# ---------------------------------------------------------
+# Прежние реализации (эталон для сравнения)
+# ---------------------------------------------------------
+
+def obv_loop(df):
+    obv = [0]
+    for i in range(1, len(df)):
+        if df["close"].iloc[i] > df["close"].iloc[i-1]:
+            obv.append(obv[-1] + df["volume"].iloc[i])
+        elif df["close"].iloc[i] < df["close"].iloc[i-1]:
+            obv.append(obv[-1] - df["volume"].iloc[i])
+        else:
+            obv.append(obv[-1])
+    return pd.Series(obv)
+
+
+def OBV_loop(df):
+    obv = [0]
+    for i in range(1, len(df)):
+        if df.close.iloc[i] > df.close.iloc[i - 1]:
+            obv.append(obv[-1] + df.volume.iloc[i])
+        elif df.close.iloc[i] < df.close.iloc[i - 1]:
+            obv.append(obv[-1] - df.volume.iloc[i])
+        else:
+            obv.append(obv[-1])
+    return pd.Series(obv, index=df.index)
+
+
+def mfi_loop(df, period=14):
+    typical_price = (df.high + df.low + df.close) / 3
+    money_flow = typical_price * df.volume
+
+    positive_flow = []
+    negative_flow = []
+
+    for i in range(1, len(typical_price)):
+        if typical_price.iloc[i] > typical_price.iloc[i - 1]:
+            positive_flow.append(money_flow.iloc[i])
+            negative_flow.append(0)
+        else:
+            positive_flow.append(0)
+            negative_flow.append(money_flow.iloc[i])
+
+    pos_mf = pd.Series(positive_flow).rolling(period).sum()
+    neg_mf = pd.Series(negative_flow).rolling(period).sum()
+
+    return 100 - (100 / (1 + pos_mf / neg_mf))
+
+
+def supertrend_loop(df, period=10, multiplier=3):
+    atr_value = atr(df, period)
+    hl2 = (df["high"] + df["low"]) / 2
+
+    upperband = hl2 + multiplier * atr_value
+    lowerband = hl2 - multiplier * atr_value
+
+    st = [0]
+    for i in range(1, len(df)):
+        if df["close"].iloc[i] > upperband.iloc[i-1]:
+            st.append(lowerband.iloc[i])
+        elif df["close"].iloc[i] < lowerband.iloc[i-1]:
+            st.append(upperband.iloc[i])
+        else:
+            st.append(st[i-1])
+    return pd.Series(st)
+
+
+KERNELS = (
+    ("indicators.obv", obv, obv_loop),
+    ("divergence.OBV", OBV, OBV_loop),
+    ("moneyflow.mfi", mfi, mfi_loop),
+    ("indicators.supertrend", supertrend, supertrend_loop),
+)
+
+
+def best_time(fn, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def same_output(a, b):
+    return (
+        len(a) == len(b)
+        and a.index.equals(b.index)
+        and np.allclose(a.to_numpy(dtype=float), b.to_numpy(dtype=float), equal_nan=True)
+    )
+
+
+def main():
+    print(f"{'kernel':<24}{'rows':>8}{'loop, ms':>12}{'numpy, ms':>12}{'speedup':>10}  same")
+    for rows in SIZES:
+        df = make_ohlcv(rows)
+        # циклы на 50k строк идут секунды — меряем их один раз
+        loop_repeat = 1 if rows >= 50_000 else 3
+
+        for name, fast, slow in KERNELS:
+            ok = same_output(fast(df), slow(df))
+            t_slow = best_time(slow, df, loop_repeat)
+            t_fast = best_time(fast, df, 10)
+            print(
+                f"{name:<24}{rows:>8}{t_slow * 1e3:>12.2f}{t_fast * 1e3:>12.3f}"
+                f"{t_slow / t_fast:>9.0f}x  {'yes' if ok else 'NO'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
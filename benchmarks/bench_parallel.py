@@ -0,0 +1,67 @@
+"""
+Масштабирование analyze_parallel (core/parallel.py) по числу процессов
+против последовательного analyze_frame на тех же синтетических свечах.
+Сверяет результаты с последовательным прогоном.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_parallel
+    python -m benchmarks.bench_parallel --symbols 100 --workers 1 2 4 8
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_ohlcv
+from core.analyzer import analyze_frame
+from core.parallel import analyze_parallel, available_cores
+
+TIMEFRAMES = {"1h": (500, 3600), "4h": (300, 14400), "1d": (200, 86400)}
+
+
+def make_frames(symbols):
+    return {
+        (f"S{i}USDT", tf): make_ohlcv(rows, seed=i * 31 + n, step_sec=step)
+        for i in range(symbols)
+        for n, (tf, (rows, step)) in enumerate(TIMEFRAMES.items())
+    }
+
+
+def run_bench(symbols=40, workers=None):
+    frames = make_frames(symbols)
+    jobs = list(frames)
+    cores = available_cores()
+    workers = workers or sorted({1, 2, cores} | ({cores // 2} if cores > 3 else set()))
+
+    t = time.perf_counter()
+    serial = {job: analyze_frame(df) for job, df in frames.items()}
+    t_serial = time.perf_counter() - t
+    print(f"[PARALLEL] {len(jobs)} jobs, cores available: {cores}", flush=True)
+    print(f"{'workers':>8}{'total, s':>10}{'first, s':>10}{'speedup':>10}  same", flush=True)
+    print(f"{'serial':>8}{t_serial:>10.2f}{'':>10}{1.0:>9.2f}x", flush=True)
+
+    report = {"jobs": len(jobs), "cores": cores, "serial_s": t_serial, "runs": {}}
+    for w in workers:
+        results = {}
+        first = None
+        t = time.perf_counter()
+        for job, result in analyze_parallel(jobs, workers=w, frames=frames):
+            if first is None:
+                first = time.perf_counter() - t
+            results[job] = result
+        total = time.perf_counter() - t
+        same = results == serial
+        report["runs"][w] = {"total_s": total, "first_s": first, "same": same}
+        print(f"{w:>8}{total:>10.2f}{first:>10.2f}{t_serial / total:>9.2f}x  {same}", flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyze_symbol в пуле процессов против последовательного")
+    parser.add_argument("--symbols", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", help="число процессов (по умолчанию 1, 2, ядра)")
+    args = parser.parse_args()
+
+    run_bench(args.symbols, args.workers)
+
+
+if __name__ == "__main__":
+    main()
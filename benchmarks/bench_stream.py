@@ -0,0 +1,101 @@
+"""
+core/stream.py против локальной заглушки benchmarks/ws_stub.py: подписка,
+обрывы соединения (--drop-after), переподключение с паузой и REST-добор
+дыр. В конце сверяет закрытые свечи в памяти с тем, что отдал бы REST,
+и печатает число обработанных обновлений (on_bar) в секунду.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_stream
+    python -m benchmarks.bench_stream --exchange binance --symbols 20 --seconds 10 --drop-after 300
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from benchmarks.ws_stub import WsStubConfig, WsStubServer, synthetic_backfill
+from core import stream as stream_mod
+from core.stream import KlineStream
+
+
+def run_bench(exchange="bybit", symbols=10, seconds=5.0, tick=0.02, updates_per_bar=5,
+              drop_after=None, window=120):
+    cfg = WsStubConfig(tick=tick, updates_per_bar=updates_per_bar, drop_after=drop_after)
+    names = [f"C{i}USDT" for i in range(symbols)]
+    step = stream_mod.TF_SECONDS["1h"]
+    updates = [0]
+    lock = threading.Lock()
+
+    def backfill(sym, tf, start):
+        return synthetic_backfill(sym, tf, start, now_ts=cfg.clock(step)[0], limit=window)
+
+    def on_bar(sym, bar):
+        with lock:
+            updates[0] += 1
+
+    # паузы переподключения в прогоне короче боевых
+    stream_mod.STREAM_BACKOFF_MAX = 0.5
+    stream_mod.BACKFILL_RETRY_SEC = 0.2
+
+    with WsStubServer(cfg) as stub:
+        ks = KlineStream(exchange, names, "1h", url=stub.url(exchange), window=window,
+                         backfill=backfill, on_bar=on_bar, stale_sec=5).start()
+        time.sleep(seconds)
+        # при частых обрывах можно попасть в паузу переподключения — ждём связь
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            ready = {s: ks.candles(s) for s in names}
+            if all(df is not None for df in ready.values()):
+                break
+            time.sleep(0.05)
+        ks.stop()
+        stub_stats = cfg.stats()
+
+    complete = 0
+    mismatched = 0
+    for sym, df in ready.items():
+        if df is None:
+            continue
+        complete += 1
+        closed = df.iloc[:-1]
+        ref = synthetic_backfill(sym, "1h", int(closed.index[0]), now_ts=int(closed.index[-1]))
+        if not np.allclose(closed[["open", "close"]].to_numpy(), ref[["open", "close"]].to_numpy(), rtol=1e-6):
+            mismatched += 1
+
+    reconnects = stream_mod.STREAM_RECONNECTS.value(exchange=exchange)
+    backfills = {r: stream_mod.STREAM_BACKFILLS.value(exchange=exchange, result=r) for r in ("ok", "partial", "empty", "error")}
+    report = {
+        "exchange": exchange,
+        "symbols": symbols,
+        "stub": stub_stats,
+        "reconnects": reconnects,
+        "backfills": backfills,
+        "complete": complete,
+        "mismatched": mismatched,
+        "updates_per_s": round(updates[0] / seconds, 1),
+    }
+    print(
+        f"[STREAM] {exchange}: {stub_stats['messages']} msgs, {stub_stats['connections']} connections, "
+        f"reconnects {reconnects}, backfills {backfills} | complete {complete}/{symbols}, mismatched {mismatched} | "
+        f"on_bar {report['updates_per_s']}/s",
+        flush=True,
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kline-стрим против локальной WebSocket-заглушки")
+    parser.add_argument("--exchange", default="bybit", choices=("bybit", "binance"))
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--tick", type=float, default=0.02, help="пауза между обновлениями заглушки, сек")
+    parser.add_argument("--updates-per-bar", type=int, default=5)
+    parser.add_argument("--drop-after", type=int, help="заглушка рвёт соединение после N сообщений")
+    args = parser.parse_args()
+
+    run_bench(args.exchange, args.symbols, args.seconds, args.tick, args.updates_per_bar, args.drop_after)
+
+
+if __name__ == "__main__":
+    main()
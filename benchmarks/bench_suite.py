@@ -0,0 +1,234 @@
+"""
+Бенчмарк публичных функций core/ (indicators, divergence, moneyflow,
+phases, volatility), signals.py и analyze_symbol целиком на синтетических
+свечах нескольких размеров. Для каждой пары (функция, размер) —
+время (лучшее и медиана из repeat прогонов) и пик памяти (tracemalloc,
+отдельным прогоном, чтобы трассировка не искажала время).
+
+Результат — JSON; два файла с разных коммитов сравниваются через --compare.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_suite
+    python -m benchmarks.bench_suite --sizes 500,5000 --repeat 3 --out before.json
+    python -m benchmarks.bench_suite --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import signals
+from benchmarks.synthetic import make_ohlcv
+from core import analyzer, divergence, incremental, indicators, moneyflow, phases, volatility
+
+SIZES = (500, 5_000, 50_000)
+REPEAT = 5
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+# ---------------------------------------------------------
+# Что меряем: (имя, подготовка аргументов из df, вызов)
+# Подготовка в замер не входит.
+# ---------------------------------------------------------
+
+def _df(df):
+    return (df,)
+
+
+def _close(df):
+    return (df["close"],)
+
+
+def _vol_series(df):
+    return (volatility.calculate_volatility(df),)
+
+
+def _wave3_args(df):
+    return (df["close"].tolist(), df["volume"].tolist())
+
+
+def _engine_behind(df):
+    # движок прогрет по всем свечам, кроме двух последних:
+    # замер — одна новая закрытая свеча и незакрытая
+    engine = incremental.IndicatorEngine()
+    engine.seed(df.iloc[:-2])
+    return (engine, df)
+
+
+def _analyze_symbol(df):
+    # analyze_symbol сам берёт свечи через get_ohlcv — подставляем синтетику;
+    # движок индикаторов каждый раз новый — замер холодного вызова
+    with incremental._engines_lock:
+        incremental._engines.pop(("bench", "BENCH", "1h"), None)
+    df.attrs["source"] = "bench"
+    original = analyzer.get_ohlcv
+    analyzer.get_ohlcv = lambda symbol, tf: df
+    try:
+        return analyzer.analyze_symbol("BENCH", "1h")
+    finally:
+        analyzer.get_ohlcv = original
+
+
+CASES = (
+    ("indicators.sma", _close, indicators.sma),
+    ("indicators.ema", _close, indicators.ema),
+    ("indicators.macd", _close, indicators.macd),
+    ("indicators.rsi", _close, indicators.rsi),
+    ("indicators.stochastic", _df, indicators.stochastic),
+    ("indicators.atr", _df, indicators.atr),
+    ("indicators.adx", _df, indicators.adx),
+    ("indicators.bollinger", _close, indicators.bollinger),
+    ("indicators.vwap", _df, indicators.vwap),
+    ("indicators.obv", _df, indicators.obv),
+    ("indicators.momentum", _close, indicators.momentum),
+    ("indicators.roc", _close, indicators.roc),
+    ("indicators.supertrend", _df, indicators.supertrend),
+    ("indicators.calculate_indicators", _df, indicators.calculate_indicators),
+    ("incremental.sync (+1 bar)", _engine_behind, incremental.sync),
+    ("divergence.RSI", _close, divergence.RSI),
+    ("divergence.OBV", _df, divergence.OBV),
+    ("divergence.detect_divergence", _df, divergence.detect_divergence),
+    ("moneyflow.mfi", _df, moneyflow.mfi),
+    ("moneyflow.vwap", _df, moneyflow.vwap),
+    ("moneyflow.money_pressure", _df, moneyflow.money_pressure),
+    ("moneyflow.moneyflow_signal", _df, moneyflow.moneyflow_signal),
+    ("moneyflow.analyze_moneyflow", _df, moneyflow.analyze_moneyflow),
+    ("phases.detect_market_phase", _df, phases.detect_market_phase),
+    ("volatility.calculate_volatility", _df, volatility.calculate_volatility),
+    ("volatility.detect_volatility_zone", _vol_series, volatility.detect_volatility_zone),
+    ("volatility.analyze_volatility", _df, volatility.analyze_volatility),
+    ("signals.range_breakout_5m", _df, signals.range_breakout_5m),
+    ("signals.wave3_setup", _wave3_args, signals.wave3_setup),
+    ("analyzer.analyze_symbol", _df, _analyze_symbol),
+)
+
+
+# ---------------------------------------------------------
+# Замер
+# ---------------------------------------------------------
+
+def _fresh_args(prepare, df):
+    # новый DataFrame на каждый прогон: иначе кэш core/features.py
+    # отдаст уже посчитанные ряды и замер покажет только поиск в словаре
+    return prepare(df.copy())
+
+
+def measure(prepare, fn, df, repeat):
+    times = []
+    for _ in range(repeat):
+        args = _fresh_args(prepare, df)
+        t0 = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - t0)
+
+    args = _fresh_args(prepare, df)
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "best_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_kb": round(peak / 1024, 1),
+    }
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_suite(sizes=SIZES, repeat=REPEAT, only=None, seed=42):
+    results = []
+    for rows in sizes:
+        df = make_ohlcv(rows, seed=seed)
+        for name, prepare, fn in CASES:
+            if only and not any(part in name for part in only):
+                continue
+            res = measure(prepare, fn, df, repeat)
+            results.append({"name": name, "rows": rows, **res})
+            print(
+                f"{name:<36}{rows:>8}{res['best_s'] * 1e3:>12.3f}{res['median_s'] * 1e3:>12.3f}{res['peak_kb']:>12.1f}",
+                flush=True,
+            )
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "sizes": list(sizes),
+            "repeat": repeat,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(old, new):
+    """Строки: имя, размер, было/стало (best, мс), отношение времени и пика памяти."""
+    before = {(r["name"], r["rows"]): r for r in old["results"]}
+    lines = [f"{'case':<36}{'rows':>8}{'old, ms':>12}{'new, ms':>12}{'time':>9}{'memory':>9}"]
+    for r in new["results"]:
+        prev = before.get((r["name"], r["rows"]))
+        if prev is None:
+            continue
+        t_ratio = r["best_s"] / prev["best_s"] if prev["best_s"] else float("nan")
+        m_ratio = r["peak_kb"] / prev["peak_kb"] if prev["peak_kb"] else float("nan")
+        lines.append(
+            f"{r['name']:<36}{r['rows']:>8}{prev['best_s'] * 1e3:>12.3f}{r['best_s'] * 1e3:>12.3f}"
+            f"{t_ratio:>8.2f}x{m_ratio:>8.2f}x"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк core/, signals.py и analyze_symbol")
+    parser.add_argument("--sizes", help="размеры через запятую (по умолчанию 500,5000,50000)")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--only", help="подстроки имён через запятую, например indicators,analyze")
+    parser.add_argument("--out", help="куда писать JSON (по умолчанию benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON прошлого прогона — вывести отношения время/память")
+    args = parser.parse_args()
+
+    sizes = tuple(int(s) for s in args.sizes.split(",")) if args.sizes else SIZES
+    only = [s.strip() for s in args.only.split(",")] if args.only else None
+
+    print(f"{'case':<36}{'rows':>8}{'best, ms':>12}{'median, ms':>12}{'peak, KB':>12}")
+    report = run_suite(sizes, args.repeat, only)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{report['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n[BENCH] saved {out}", flush=True)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print("\n" + compare(json.load(f), report))
+
+
+if __name__ == "__main__":
+    main()
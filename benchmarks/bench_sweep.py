@@ -0,0 +1,131 @@
+"""
+Векторные признаки sweep.py против signals.range_breakout_5m / wave3_setup,
+вызванных по каждому бару (df[:t+1]) — те же бары срабатывания.
+Длины рядов — от коротких (короче окон wave3, 65–88 баров) до полных.
+В конце — run_sweep по временному хранилищу, где есть и короткий ряд.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_sweep
+    python -m benchmarks.bench_sweep --lengths 80,100,300 --combos 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import signals
+import sweep
+from benchmarks.synthetic import make_ohlcv
+from core.store import CandleStore
+
+LENGTHS = (15, 21, 65, 80, 88, 99, 100, 101, 300)
+
+
+def wave3_series(n, seed):
+    """Ряд со сетапом wave3 в конце: импульс, откат, флет и всплеск объёма."""
+    df = make_ohlcv(n, seed=seed, step_sec=300)
+    rng = np.random.default_rng(seed)
+    close = 100.0 * (1 + rng.normal(0.0, 0.001, n))
+    if n >= 90:
+        close[n - 90:n - 50] *= np.linspace(1.0, 1.08, 40)
+        close[n - 50:n - 30] *= np.linspace(1.07, 1.05, 20)
+        close[n - 30:] *= 1.05
+    volume = np.full(n, 1000.0) * (1 + rng.random(n) * 0.1)
+    volume[-3:] *= 3.0
+    df["close"] = close
+    df["open"] = close
+    df["high"] = close * 1.001
+    df["low"] = close * 0.999
+    df["volume"] = volume
+    return df
+
+
+def _cols(df):
+    return {col: df[col].to_numpy(dtype=float) for col in ("open", "high", "low", "close", "volume")}
+
+
+def reference_hits(strategy, df, p):
+    close = df["close"].tolist()
+    volume = df["volume"].tolist()
+    hits = np.zeros(len(df), dtype=bool)
+    for t in range(len(df)):
+        if strategy == "rb":
+            hits[t] = signals.range_breakout_5m(df.iloc[:t + 1], p) is not None
+        else:
+            hits[t] = signals.wave3_setup(close[:t + 1], volume[:t + 1], **p) is not None
+    return hits
+
+
+def _series(strategy, n):
+    # случайное блуждание + для wave3 ряд со сетапом: на блуждании он почти не встречается
+    series = [make_ohlcv(n, seed=n, step_sec=300)]
+    if strategy == "wave3":
+        series.append(wave3_series(n, seed=n))
+    return series
+
+
+def _compare(strategy, feature_cls, df, params):
+    """(комбинаций с расхождением, срабатываний эталона)."""
+    features = feature_cls(_cols(df))
+    mismatched = hits = 0
+    for p in params:
+        got = features.hits(p)
+        got = got[0] if isinstance(got, tuple) else got
+        ref = reference_hits(strategy, df, p)
+        mismatched += int(not np.array_equal(got, ref))
+        hits += int(ref.sum())
+    return mismatched, hits
+
+
+def check_strategy(strategy, lengths, combos):
+    grid, feature_cls = sweep.STRATEGIES[strategy]
+    params = sweep.grid_combos(grid, combos, seed=1)
+    mismatched = hits = cases = 0
+    for n in lengths:
+        for df in _series(strategy, n):
+            m, h = _compare(strategy, feature_cls, df, params)
+            mismatched += m
+            hits += h
+            cases += len(params)
+    return mismatched, hits, cases
+
+
+def check_store_run(strategy):
+    """run_sweep по хранилищу с коротким рядом — без падения пула."""
+    root = tempfile.mkdtemp()
+    store = CandleStore(root)
+    store.merge("binance", "SHORTUSDT", "5m", make_ohlcv(80, seed=3, step_sec=300))
+    store.merge("binance", "LONGUSDT", "5m", make_ohlcv(400, seed=4, step_sec=300))
+    grid, _ = sweep.STRATEGIES[strategy]
+    results = sweep.run_sweep(root, "binance", ["SHORTUSDT", "LONGUSDT"], strategy,
+                              sweep.grid_combos(grid, 4, seed=1), workers=1)
+    return len(results) == 4
+
+
+def run_bench(lengths=LENGTHS, combos=6):
+    report = {}
+    for strategy in sorted(sweep.STRATEGIES):
+        t = time.perf_counter()
+        mismatched, hits, cases = check_strategy(strategy, lengths, combos)
+        store_ok = check_store_run(strategy)
+        report[strategy] = {"cases": cases, "mismatched": mismatched, "hits": hits, "store_run": store_ok}
+        print(f"[SWEEP CHECK] {strategy}: {cases} cases (lengths {min(lengths)}..{max(lengths)}), "
+              f"reference hits {hits}, mismatched {mismatched} | store run with short series ok {store_ok} "
+              f"| {time.perf_counter() - t:.1f}s", flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Признаки sweep.py против signals.py по каждому бару")
+    parser.add_argument("--lengths", help="длины рядов через запятую")
+    parser.add_argument("--combos", type=int, default=6, help="случайных комбинаций параметров на стратегию")
+    args = parser.parse_args()
+
+    lengths = tuple(int(x) for x in args.lengths.split(",")) if args.lengths else LENGTHS
+    run_bench(lengths, args.combos)
+
+
+if __name__ == "__main__":
+    main()
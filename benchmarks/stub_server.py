@@ -0,0 +1,322 @@
+"""
+Локальная заглушка CoinGecko / Bybit / Telegram для прогонов run_cycle
+без сети. Отдаёт записанные ответы из каталога fixtures, а если файла нет —
+синтетику (детерминированную по coin_id / symbol). Умеет добавлять
+задержку и долю ошибок, считает запросы по эндпоинтам и запоминает
+отправленные в Telegram сообщения со временем.
+
+Записанные ответы (все файлы необязательны):
+    <fixtures>/coins_markets.json
+    <fixtures>/market_chart/<coin_id>.json
+    <fixtures>/tickers.json
+    <fixtures>/open_interest/<SYMBOL>.json
+    <fixtures>/kline/<SYMBOL>.json
+
+Отдельный запуск (адреса для бота: COINGECKO_BASE=http://127.0.0.1:8099/api/v3,
+BYBIT_BASE=http://127.0.0.1:8099, TELEGRAM_API=http://127.0.0.1:8099):
+    python -m benchmarks.stub_server --port 8099 --latency 0.05 --error-rate 0.02
+Счётчики: GET /_stats, сброс: POST /_reset.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+CHART_POINTS = 49        # market_chart days=2 → почасовые точки
+SIGNAL_EVERY = 5         # каждая 5-я монета получает всплеск объёма и импульс в конце
+
+ROUTES = (
+    ("coins_markets", "GET", re.compile(r"^/api/v3/coins/markets$")),
+    ("market_chart", "GET", re.compile(r"^/api/v3/coins/(?P<coin_id>[^/]+)/market_chart$")),
+    ("tickers", "GET", re.compile(r"^/v5/market/tickers$")),
+    ("open_interest", "GET", re.compile(r"^/v5/market/open-interest$")),
+    ("kline", "GET", re.compile(r"^/v5/market/kline$")),
+    ("send_message", "POST", re.compile(r"^/bot[^/]*/sendMessage$")),
+)
+
+
+def _seed(key):
+    return zlib.crc32(key.encode("utf-8"))
+
+
+# ---------------------------------------------------------
+# Синтетические ответы
+# ---------------------------------------------------------
+
+def synthetic_markets(count):
+    coins = []
+    for i in range(count):
+        # изменения — по тому же синтетическому графику, что отдаёт market_chart
+        prices = synthetic_market_chart(f"coin-{i}")["prices"]
+        chg_1h = (prices[-1][1] / prices[-2][1] - 1) * 100
+        chg_24h = (prices[-1][1] / prices[-25][1] - 1) * 100
+        coins.append({
+            "id": f"coin-{i}",
+            "symbol": f"c{i}",
+            "name": f"Coin {i}",
+            "current_price": 1.0 + i,
+            "market_cap": float(10 ** 10 - i * 10 ** 7),
+            "market_cap_rank": i + 1,
+            "price_change_percentage_1h_in_currency": chg_1h,
+            "price_change_percentage_24h_in_currency": chg_24h,
+        })
+    return coins
+
+
+def synthetic_market_chart(coin_id, now=None):
+    rng = np.random.default_rng(_seed(coin_id))
+    now_ms = int((now or time.time()) * 1000)
+    ts = now_ms - np.arange(CHART_POINTS)[::-1] * 3_600_000
+
+    prices = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.004, CHART_POINTS)))
+    volumes = rng.lognormal(15.0, 0.1, CHART_POINTS)
+
+    # часть монет — с "запуском" в последний час: объём x4 и импульс ~2.5%
+    index = int(coin_id.rsplit("-", 1)[-1]) if coin_id.rsplit("-", 1)[-1].isdigit() else _seed(coin_id)
+    if index % SIGNAL_EVERY == 0:
+        sign = 1.0 if (index // SIGNAL_EVERY) % 2 == 0 else -1.0
+        prices[-1] = prices[-2] * (1 + sign * 0.025)
+        volumes[-1] *= 4.0
+
+    return {
+        "prices": [[int(t), float(p)] for t, p in zip(ts, prices)],
+        "market_caps": [[int(t), float(p) * 1e6] for t, p in zip(ts, prices)],
+        "total_volumes": [[int(t), float(v)] for t, v in zip(ts, volumes)],
+    }
+
+
+def synthetic_tickers(count=40, now=None):
+    # OI и цена меняются от часа к часу — у бота, сравнивающего срезы, есть дельты
+    hour = int((now or time.time()) // 3600)
+    rows = []
+    for i in range(count):
+        rng = random.Random(_seed(f"tk{i}:{hour}"))
+        prev_price = 1.0 + i
+        rows.append({
+            "symbol": f"C{i}USDT",
+            "turnover24h": str(10 ** 9 - i * 10 ** 6),
+            "lastPrice": f"{prev_price * (1 + rng.uniform(-0.02, 0.02)):.6f}",
+            "prevPrice1h": f"{prev_price:.6f}",
+            "openInterest": f"{1_000_000 * (1 + rng.uniform(-0.03, 0.03)):.2f}",
+        })
+    return {"retCode": 0, "result": {"category": "linear", "list": rows}}
+
+
+def synthetic_open_interest(symbol):
+    rng = random.Random(_seed("oi" + symbol))
+    now_oi = 1_000_000 * (1 + rng.uniform(-0.03, 0.03))
+    prev_oi = 1_000_000.0
+    now_ms = int(time.time() // 3600 * 3600 * 1000)
+    # Bybit отдаёт от новых к старым
+    return {"retCode": 0, "result": {"symbol": symbol, "list": [
+        {"openInterest": f"{now_oi:.2f}", "timestamp": str(now_ms)},
+        {"openInterest": f"{prev_oi:.2f}", "timestamp": str(now_ms - 3_600_000)},
+    ]}}
+
+
+def synthetic_kline(symbol):
+    rng = random.Random(_seed("kl" + symbol))
+    prev_close = 100.0
+    close = prev_close * (1 + rng.uniform(-0.02, 0.02))
+    now_ms = int(time.time() // 3600 * 3600 * 1000)
+    row = lambda ts, c: [str(ts), f"{c:.4f}", f"{c * 1.01:.4f}", f"{c * 0.99:.4f}", f"{c:.4f}", "1000", "100000"]
+    return {"retCode": 0, "result": {"symbol": symbol, "list": [
+        row(now_ms, close),
+        row(now_ms - 3_600_000, prev_close),
+    ]}}
+
+
+# ---------------------------------------------------------
+# Сервер
+# ---------------------------------------------------------
+
+class StubConfig:
+
+    def __init__(self, coins=80, latency=0.0, jitter=0.0, error_rate=0.0, fixtures=None, seed=42):
+        self.coins = coins
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.fixtures = fixtures
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = {}
+            self.errors = {}
+            self.messages = []
+
+    def stats(self):
+        with self.lock:
+            return {
+                "counts": dict(self.counts),
+                "errors": dict(self.errors),
+                "messages": list(self.messages),
+            }
+
+    def fixture(self, *parts):
+        if not self.fixtures:
+            return None
+        path = os.path.join(self.fixtures, *parts)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # заголовки и тело уходят отдельными write — без TCP_NODELAY клиент
+    # ждёт delayed ACK (~40 мс на запрос), и замер меряет ядро, а не бота
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    @property
+    def cfg(self):
+        return self.server.cfg
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method):
+        parts = urlsplit(self.path)
+        for name, route_method, pattern in ROUTES:
+            m = pattern.match(parts.path)
+            if m and route_method == method:
+                return name, m.groupdict(), {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        return None, {}, {}
+
+    def _handle(self, method):
+        parts = urlsplit(self.path)
+        if parts.path == "/_stats":
+            return self._send(200, self.cfg.stats())
+        if parts.path == "/_reset":
+            self.cfg.reset()
+            return self._send(200, {"ok": True})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+
+        name, path_args, query = self._route(method)
+        if name is None:
+            return self._send(404, {"error": "not found"})
+
+        cfg = self.cfg
+        with cfg.lock:
+            cfg.counts[name] = cfg.counts.get(name, 0) + 1
+            delay = max(0.0, cfg.latency + cfg.rng.uniform(-cfg.jitter, cfg.jitter))
+            failed = cfg.rng.random() < cfg.error_rate
+        if delay:
+            time.sleep(delay)
+        if failed:
+            with cfg.lock:
+                cfg.errors[name] = cfg.errors.get(name, 0) + 1
+            return self._send(500, {"error": "injected"})
+
+        if name == "coins_markets":
+            data = cfg.fixture("coins_markets.json") or synthetic_markets(cfg.coins)
+            per_page = int(query.get("per_page", len(data)))
+            return self._send(200, data[:per_page])
+
+        if name == "market_chart":
+            cid = path_args["coin_id"]
+            return self._send(200, cfg.fixture("market_chart", f"{cid}.json") or synthetic_market_chart(cid))
+
+        if name == "tickers":
+            return self._send(200, cfg.fixture("tickers.json") or synthetic_tickers())
+
+        if name == "open_interest":
+            sym = query.get("symbol", "")
+            return self._send(200, cfg.fixture("open_interest", f"{sym}.json") or synthetic_open_interest(sym))
+
+        if name == "kline":
+            sym = query.get("symbol", "")
+            return self._send(200, cfg.fixture("kline", f"{sym}.json") or synthetic_kline(sym))
+
+        # send_message
+        form = parse_qs(body.decode("utf-8"))
+        with cfg.lock:
+            cfg.messages.append({"ts": time.time(), "text": form.get("text", [""])[-1]})
+        return self._send(200, {"ok": True, "result": {"message_id": len(cfg.messages)}})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+class StubServer:
+    """Заглушка в фоновом потоке: with StubServer(cfg) as stub: stub.url ..."""
+
+    def __init__(self, cfg=None, host="127.0.0.1", port=0):
+        self.cfg = cfg or StubConfig()
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.cfg = self.cfg
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка CoinGecko / Bybit / Telegram")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--coins", type=int, default=80)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа, сек")
+    parser.add_argument("--jitter", type=float, default=0.0, help="± к задержке, сек")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--fixtures", help="каталог с записанными ответами")
+    args = parser.parse_args()
+
+    cfg = StubConfig(args.coins, args.latency, args.jitter, args.error_rate, args.fixtures)
+    server = StubServer(cfg, args.host, args.port)
+    print(f"[STUB] {server.url}", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
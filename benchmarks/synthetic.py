@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+
+def make_ohlcv(rows, seed=42, start_price=100.0, step_sec=3600):
+    """
+    Синтетические свечи: геометрическое случайное блуждание + шумный объём.
+    Повторяемо для одного seed — результаты можно сравнивать между коммитами.
+    """
+    rng = np.random.default_rng(seed)
+
+    returns = rng.normal(0.0, 0.01, rows)
+    close = start_price * np.exp(np.cumsum(returns))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    spread = np.abs(rng.normal(0.0, 0.004, rows)) * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(10.0, 0.5, rows)
+
+    # немного свечей без движения — проверяет ветку "цена не изменилась"
+    flat = rng.random(rows) < 0.02
+    close[flat] = open_[flat]
+
+    timestamp = 1_700_000_000 + np.arange(rows) * step_sec
+    return pd.DataFrame(
+        {"open": open_, "high": high, "low": low, "close": close, "volume": volume},
+        index=pd.Index(timestamp, name="timestamp"),
+    )
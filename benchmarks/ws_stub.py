@@ -0,0 +1,237 @@
+"""
+Локальная заглушка kline-стримов Bybit (/v5/public/linear) и Binance (/ws)
+для core/stream.py. После subscribe шлёт по каждому символу обновления
+текущей свечи раз в tick секунд; каждые updates_per_bar обновлений свеча
+закрывается (confirm / x = true) и открывается следующая — время свечей
+идёт быстрее настоящего, так что часовые свечи сменяются за секунды.
+
+drop_after — рвать соединение после стольких сообщений (проверка
+переподключения); свечи, пока клиента нет, идут дальше — после
+переподключения у клиента дыра, которую он добирает по REST.
+Для добора есть synthetic_backfill(symbol, tf, start) — те же свечи,
+что шлёт заглушка.
+
+Отдельный запуск:
+    python -m benchmarks.ws_stub --port 8098 --tick 0.05 --drop-after 200
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+import zlib
+
+import pandas as pd
+from aiohttp import WSMsgType, web
+
+TF_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "4h": 14400}
+BYBIT_TF = {"1": "1m", "5": "5m", "15": "15m", "60": "1h", "240": "4h"}
+
+
+def synthetic_bar(symbol, ts, update=None, updates_per_bar=1):
+    """Детерминированная свеча symbol на ts; update — номер обновления внутри свечи (None — закрытая)."""
+    seed = zlib.crc32(f"{symbol}:{ts}".encode("utf-8"))
+    base = 100.0 + (zlib.crc32(symbol.encode("utf-8")) % 1000) / 10.0
+    drift = ((seed % 2001) - 1000) / 100000.0
+    o = base * (1 + drift)
+    c_final = o * (1 + ((seed >> 11) % 201 - 100) / 10000.0)
+    share = 1.0 if update is None else (update + 1) / updates_per_bar
+    c = o + (c_final - o) * share
+    h = max(o, c) * 1.001
+    l = min(o, c) * 0.999
+    v = (1000.0 + (seed >> 3) % 500) * share
+    return o, h, l, c, v
+
+
+def synthetic_backfill(symbol, tf, start=None, now_ts=None, limit=200):
+    """REST-добор для проверок: закрытые свечи с start (или последние limit) до now_ts."""
+    step = TF_SECONDS[tf]
+    end = now_ts if now_ts is not None else int(time.time()) // step * step
+    first = start if start is not None else end - step * (limit - 1)
+    rows = [(ts,) + synthetic_bar(symbol, ts) for ts in range(int(first), int(end) + 1, step)]
+    df = pd.DataFrame(rows, columns=["timestamp", "open", "high", "low", "close", "volume"])
+    return df.set_index("timestamp")
+
+
+class WsStubConfig:
+
+    def __init__(self, tick=0.05, updates_per_bar=5, drop_after=None, start_ts=None):
+        self.tick = tick
+        self.updates_per_bar = updates_per_bar
+        self.drop_after = drop_after
+        self.start_ts = start_ts if start_ts is not None else int(time.time()) // 3600 * 3600
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+    def clock(self, step):
+        """(ts текущей свечи, номер обновления в ней) — по времени с запуска заглушки."""
+        n = int((time.monotonic() - self.started) / self.tick)
+        bar, update = divmod(n, self.updates_per_bar)
+        return self.start_ts + bar * step, update
+
+    def stats(self):
+        with self.lock:
+            return {"connections": self.connections, "messages": self.messages}
+
+
+def bybit_message(symbol, interval, ts, bar, closed, step):
+    o, h, l, c, v = bar
+    return {"topic": f"kline.{interval}.{symbol}", "type": "snapshot", "ts": int(time.time() * 1000), "data": [{
+        "start": ts * 1000, "end": (ts + step) * 1000 - 1, "interval": interval,
+        "open": f"{o:.4f}", "high": f"{h:.4f}", "low": f"{l:.4f}", "close": f"{c:.4f}",
+        "volume": f"{v:.2f}", "turnover": f"{v * c:.2f}", "confirm": closed, "timestamp": int(time.time() * 1000),
+    }]}
+
+
+def binance_message(symbol, interval, ts, bar, closed, step):
+    o, h, l, c, v = bar
+    return {"e": "kline", "E": int(time.time() * 1000), "s": symbol, "k": {
+        "t": ts * 1000, "T": (ts + step) * 1000 - 1, "s": symbol, "i": interval,
+        "o": f"{o:.4f}", "c": f"{c:.4f}", "h": f"{h:.4f}", "l": f"{l:.4f}",
+        "v": f"{v:.2f}", "x": closed,
+    }}
+
+
+async def _stream_handler(request, exchange):
+    cfg = request.app["cfg"]
+    ws = web.WebSocketResponse()
+    await ws.prepare(request)
+    with cfg.lock:
+        cfg.connections += 1
+
+    topics = []     # (symbol, interval, tf)
+    sent = 0
+    last_bar = {}
+
+    async def reader():
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            data = json.loads(msg.data)
+            if exchange == "bybit" and data.get("op") == "subscribe":
+                for arg in data.get("args", []):
+                    _, interval, symbol = arg.split(".")
+                    topics.append((symbol, interval, BYBIT_TF[interval]))
+                await ws.send_json({"success": True, "op": "subscribe", "ret_msg": ""})
+            elif exchange == "bybit" and data.get("op") == "ping":
+                await ws.send_json({"success": True, "op": "pong"})
+            elif exchange == "binance" and data.get("method") == "SUBSCRIBE":
+                for param in data.get("params", []):
+                    stream, interval = param.split("@kline_")
+                    topics.append((stream.upper(), interval, interval))
+                await ws.send_json({"result": None, "id": data.get("id")})
+
+    read_task = asyncio.create_task(reader())
+    make = bybit_message if exchange == "bybit" else binance_message
+    try:
+        while not ws.closed and not read_task.done():
+            await asyncio.sleep(cfg.tick)
+            for symbol, interval, tf in list(topics):
+                step = TF_SECONDS[tf]
+                ts, update = cfg.clock(step)
+                prev = last_bar.get(symbol)
+                if prev is not None and prev < ts:
+                    # закрыть прошлую свечу, как это делает биржа
+                    await ws.send_json(make(symbol, interval, prev, synthetic_bar(symbol, prev), True, step))
+                last_bar[symbol] = ts
+                await ws.send_json(make(symbol, interval, ts, synthetic_bar(symbol, ts, update, cfg.updates_per_bar), False, step))
+                sent += 1
+                with cfg.lock:
+                    cfg.messages += 1
+                if cfg.drop_after and sent >= cfg.drop_after:
+                    await ws.close()
+                    break
+    except (ConnectionResetError, RuntimeError):
+        pass
+    finally:
+        read_task.cancel()
+    return ws
+
+
+async def bybit_handler(request):
+    return await _stream_handler(request, "bybit")
+
+
+async def binance_handler(request):
+    return await _stream_handler(request, "binance")
+
+
+def make_app(cfg):
+    app = web.Application()
+    app["cfg"] = cfg
+    app.router.add_get("/v5/public/linear", bybit_handler)
+    app.router.add_get("/ws", binance_handler)
+    return app
+
+
+class WsStubServer:
+    """Заглушка в фоновом потоке: with WsStubServer(cfg) as stub: stub.url("bybit") ..."""
+
+    def __init__(self, cfg=None, host="127.0.0.1", port=0):
+        self.cfg = cfg or WsStubConfig()
+        self.host = host
+        self.port = port
+        self._loop = None
+        self._runner = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    def url(self, exchange):
+        path = "/v5/public/linear" if exchange == "bybit" else "/ws"
+        return f"ws://{self.host}:{self.port}{path}"
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._runner = web.AppRunner(make_app(self.cfg))
+        self._loop.run_until_complete(self._runner.setup())
+        site = web.TCPSite(self._runner, self.host, self.port)
+        self._loop.run_until_complete(site.start())
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        # обработчики соединений, которые ещё не заметили закрытия
+        pending = asyncio.all_tasks(self._loop)
+        for task in pending:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.close()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait(10)
+        return self
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread is not None:
+            self._thread.join(10)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка kline-стримов Bybit / Binance")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8098)
+    parser.add_argument("--tick", type=float, default=0.05, help="пауза между обновлениями, сек")
+    parser.add_argument("--updates-per-bar", type=int, default=5)
+    parser.add_argument("--drop-after", type=int, help="рвать соединение после N сообщений")
+    args = parser.parse_args()
+
+    cfg = WsStubConfig(args.tick, args.updates_per_bar, args.drop_after)
+    print(f"[WS STUB] ws://{args.host}:{args.port}/v5/public/linear  ws://{args.host}:{args.port}/ws", flush=True)
+    web.run_app(make_app(cfg), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
-from core.datasource import get_ohlcv
+from core import batch, incremental
+from core.datasource import TF_SECONDS, get_ohlcv
 from core.indicators import calculate_indicators
 from core.divergence import detect_divergence
 from core.moneyflow import analyze_moneyflow
@@ -12,165 +13,273 @@ def safe_dict(x):
     return {}
 
 
+def build_result(indi, div, mf, phase, vola, last_close):
+    """
+    Причины, скоринг, сигнал и уровни по результатам модулей.
+    Общая часть для analyze_symbol и analyze_symbols.
+    """
+    # 3. Причины
+    reasons = []
+
+    # Тренд
+    if indi.get("trend") == "up":
+        reasons.append("Тренд: восходящий (EMA20 > EMA50)")
+    elif indi.get("trend") == "down":
+        reasons.append("Тренд: нисходящий (EMA20 < EMA50)")
+    else:
+        reasons.append("Тренд: боковой")
+
+    # MACD
+    try:
+        macd_hist = float(indi.get("macd_hist", 0))
+    except Exception:
+        macd_hist = 0
+
+    if macd_hist > 0:
+        reasons.append("MACD: бычий импульс")
+    else:
+        reasons.append("MACD: медвежий импульс")
+
+    # RSI
+    try:
+        rsi = float(indi.get("rsi", 50))
+    except Exception:
+        rsi = 50
+
+    if rsi > 60:
+        reasons.append("RSI показывает покупку")
+    elif rsi < 40:
+        reasons.append("RSI показывает продажу")
+    else:
+        reasons.append("RSI нейтральный")
+
+    # SuperTrend + последняя цена
+    try:
+        supertrend = float(indi.get("supertrend", 0))
+        last_price = float(last_close)
+    except Exception:
+        supertrend = 0
+        last_price = 0.0
+
+    if supertrend < last_price:
+        reasons.append("SuperTrend: рынок над линией (бычий)")
+    else:
+        reasons.append("SuperTrend: рынок под линией (медвежий)")
+
+    # Дивергенции
+    if div.get("bullish"):
+        reasons.append("Обнаружена бычья дивергенция")
+    if div.get("bearish"):
+        reasons.append("Обнаружена медвежья дивергенция")
+
+    # Денежный поток
+    if mf.get("direction") == "in":
+        reasons.append("Капитал входит в рынок")
+    elif mf.get("direction") == "out":
+        reasons.append("Капитал выходит из рынка")
+    else:
+        reasons.append("Денежный поток нейтрален")
+
+    # VWAP
+    if mf.get("price_vs_vwap") == "above":
+        reasons.append("Цена выше VWAP → покупатели сильнее")
+    elif mf.get("price_vs_vwap") == "below":
+        reasons.append("Цена ниже VWAP → продавцы сильнее")
+
+    # Фаза рынка
+    reasons.append(f"Фаза рынка: {phase.get('phase', 'неизвестно')}")
+
+    # Волатильность
+    reasons.append(f"Волатильность: {vola.get('volatility', 'нет данных')}")
+
+    # 4. Итоговый скоринг
+    score = 0
+
+    if indi.get("trend") == "up":
+        score += 1
+    if macd_hist > 0:
+        score += 1
+    if rsi > 55:
+        score += 1
+    if supertrend < last_price:
+        score += 1
+    if mf.get("direction") == "in":
+        score += 1
+
+    if indi.get("trend") == "down":
+        score -= 1
+    if macd_hist < 0:
+        score -= 1
+    if rsi < 45:
+        score -= 1
+    if supertrend > last_price:
+        score -= 1
+    if mf.get("direction") == "out":
+        score -= 1
+
+    # 5. Финальный сигнал
+    if score >= 2:
+        signal = "LONG"
+    elif score <= -2:
+        signal = "SHORT"
+    else:
+        signal = "NEUTRAL"
+
+    # 6. Уровни (простая модель: 1% стоп, 2% и 3% тейки)
+    levels = None
+    if last_price > 0 and signal in ("LONG", "SHORT"):
+        sl_pct = 0.01
+        tp1_pct = 0.02
+        tp2_pct = 0.03
+
+        if signal == "LONG":
+            entry = last_price
+            stop_loss = last_price * (1 - sl_pct)
+            tp1 = last_price * (1 + tp1_pct)
+            tp2 = last_price * (1 + tp2_pct)
+        else:  # SHORT
+            entry = last_price
+            stop_loss = last_price * (1 + sl_pct)
+            tp1 = last_price * (1 - tp1_pct)
+            tp2 = last_price * (1 - tp2_pct)
+
+        levels = {
+            "entry": entry,
+            "stop_loss": stop_loss,
+            "take_profit_1": tp1,
+            "take_profit_2": tp2,
+        }
+
+    result = {
+        "signal": signal,
+        "strength": abs(score),
+        "reasons": reasons,
+    }
+
+    if levels:
+        result["levels"] = levels
+
+    return result
+
+
 def analyze_symbol(symbol: str, tf: str):
     try:
         # 1. Данные
         df = get_ohlcv(symbol, tf)
+    except Exception as e:
+        return {"error": str(e)}
+
+    return analyze_frame(df, key=(symbol, tf))
+
+
+def analyze_frame(df, key=None):
+    """
+    analyze_symbol по уже загруженным свечам (без get_ohlcv).
+    Используется и в пуле процессов (core/parallel.py).
+    key — (symbol, tf): индикаторы из потокового движка (core/incremental.py),
+    он досчитывает только новые закрытые свечи. Без key (или если окно
+    движку не подходит) — пересчёт по окну.
+    """
+    try:
         if df is None or len(df) < 20:
             return {"error": "Недостаточно данных"}
 
         # 2. Модули (защита от None и строк)
-        indi = safe_dict(calculate_indicators(df))
+        indi = None
+        if key:
+            symbol, tf = key
+            indi = incremental.indicators_for(symbol, tf, df, TF_SECONDS.get(tf, 3600))
+        if indi is None:
+            indi = calculate_indicators(df)
+        indi = safe_dict(indi)
         div = safe_dict(detect_divergence(df))
         mf = safe_dict(analyze_moneyflow(df))
         phase = safe_dict(detect_market_phase(df))
         vola = safe_dict(analyze_volatility(df))
 
-        # 3. Причины
-        reasons = []
+        # 3-6. Причины, скоринг, сигнал, уровни
+        return build_result(indi, div, mf, phase, vola, df["close"].iloc[-1])
 
-        # Тренд
-        if indi.get("trend") == "up":
-            reasons.append("Тренд: восходящий (EMA20 > EMA50)")
-        elif indi.get("trend") == "down":
-            reasons.append("Тренд: нисходящий (EMA20 < EMA50)")
-        else:
-            reasons.append("Тренд: боковой")
+    except Exception as e:
+        return {"error": str(e)}
 
-        # MACD
-        try:
-            macd_hist = float(indi.get("macd_hist", 0))
-        except Exception:
-            macd_hist = 0
 
-        if macd_hist > 0:
-            reasons.append("MACD: бычий импульс")
-        else:
-            reasons.append("MACD: медвежий импульс")
+def analyze_symbols(symbols, tf: str):
+    """
+    Пакетный analyze_symbol: {symbol: результат в том же формате}.
+    Все свечи складываются в матрицы (символы × свечи, выравнивание по
+    последней свече), индикаторы и скоринг считаются по всем строкам сразу.
+    """
+    results = {}
+    frames = []
+    names = []
 
-        # RSI
+    for symbol in symbols:
         try:
-            rsi = float(indi.get("rsi", 50))
-        except Exception:
-            rsi = 50
-
-        if rsi > 60:
-            reasons.append("RSI показывает покупку")
-        elif rsi < 40:
-            reasons.append("RSI показывает продажу")
-        else:
-            reasons.append("RSI нейтральный")
+            df = get_ohlcv(symbol, tf)
+        except Exception as e:
+            results[symbol] = {"error": str(e)}
+            continue
+        if df is None or len(df) < 20:
+            results[symbol] = {"error": "Недостаточно данных"}
+            continue
+        frames.append(df)
+        names.append(symbol)
 
-        # SuperTrend + последняя цена
-        try:
-            supertrend = float(indi.get("supertrend", 0))
-            last_price = float(df["close"].iloc[-1])
-        except Exception:
-            supertrend = 0
-            last_price = 0.0
-
-        if supertrend < last_price:
-            reasons.append("SuperTrend: рынок над линией (бычий)")
-        else:
-            reasons.append("SuperTrend: рынок под линией (медвежий)")
-
-        # Дивергенции
-        if div.get("bullish"):
-            reasons.append("Обнаружена бычья дивергенция")
-        if div.get("bearish"):
-            reasons.append("Обнаружена медвежья дивергенция")
-
-        # Денежный поток
-        if mf.get("direction") == "in":
-            reasons.append("Капитал входит в рынок")
-        elif mf.get("direction") == "out":
-            reasons.append("Капитал выходит из рынка")
-        else:
-            reasons.append("Денежный поток нейтрален")
-
-        # VWAP
-        if mf.get("price_vs_vwap") == "above":
-            reasons.append("Цена выше VWAP → покупатели сильнее")
-        elif mf.get("price_vs_vwap") == "below":
-            reasons.append("Цена ниже VWAP → продавцы сильнее")
-
-        # Фаза рынка
-        reasons.append(f"Фаза рынка: {phase.get('phase', 'неизвестно')}")
-
-        # Волатильность
-        reasons.append(f"Волатильность: {vola.get('volatility', 'нет данных')}")
-
-        # 4. Итоговый скоринг
-        score = 0
-
-        if indi.get("trend") == "up":
-            score += 1
-        if macd_hist > 0:
-            score += 1
-        if rsi > 55:
-            score += 1
-        if supertrend < last_price:
-            score += 1
-        if mf.get("direction") == "in":
-            score += 1
-
-        if indi.get("trend") == "down":
-            score -= 1
-        if macd_hist < 0:
-            score -= 1
-        if rsi < 45:
-            score -= 1
-        if supertrend > last_price:
-            score -= 1
-        if mf.get("direction") == "out":
-            score -= 1
-
-        # 5. Финальный сигнал
-        if score >= 2:
-            signal = "LONG"
-        elif score <= -2:
-            signal = "SHORT"
-        else:
-            signal = "NEUTRAL"
-
-        # 6. Уровни (простая модель: 1% стоп, 2% и 3% тейки)
-        levels = None
-        if last_price > 0 and signal in ("LONG", "SHORT"):
-            sl_pct = 0.01
-            tp1_pct = 0.02
-            tp2_pct = 0.03
-
-            if signal == "LONG":
-                entry = last_price
-                stop_loss = last_price * (1 - sl_pct)
-                tp1 = last_price * (1 + tp1_pct)
-                tp2 = last_price * (1 + tp2_pct)
-            else:  # SHORT
-                entry = last_price
-                stop_loss = last_price * (1 + sl_pct)
-                tp1 = last_price * (1 - tp1_pct)
-                tp2 = last_price * (1 - tp2_pct)
-
-            levels = {
-                "entry": entry,
-                "stop_loss": stop_loss,
-                "take_profit_1": tp1,
-                "take_profit_2": tp2,
-            }
-
-        result = {
-            "signal": signal,
-            "strength": abs(score),
-            "reasons": reasons,
-        }
+    if not frames:
+        return results
 
-        if levels:
-            result["levels"] = levels
+    try:
+        m = batch.stack_frames(frames)
+        high, low, close, volume = m["high"], m["low"], m["close"], m["volume"]
 
-        return result
+        ema20 = batch.ema_rows(close, 20)[:, -1]
+        ema50 = batch.ema_rows(close, 50)[:, -1]
+        macd_hist = batch.last_macd_hist(close)
+        rsi = batch.last_rsi(close)
+        supertrend = batch.last_supertrend(high, low, close)
 
+        mfi = batch.last_mfi(high, low, close, volume)
+        vwap = batch.last_vwap(high, low, close, volume)
+        pressure = batch.last_money_pressure(close, volume)
+        last_close = close[:, -1]
     except Exception as e:
-        return {"error": str(e)}
+        for symbol in names:
+            results[symbol] = {"error": str(e)}
+        return results
+
+    for i, symbol in enumerate(names):
+        if ema20[i] > ema50[i]:
+            trend = "up"
+        elif ema20[i] < ema50[i]:
+            trend = "down"
+        else:
+            trend = "sideways"
+
+        indi = {
+            "trend": trend,
+            "macd_hist": float(macd_hist[i]),
+            "rsi": float(rsi[i]),
+            "supertrend": float(supertrend[i]),
+        }
+
+        # как в analyze_moneyflow
+        if pressure[i] > 0 or mfi[i] > 55:
+            direction = "in"
+        elif pressure[i] < 0 or mfi[i] < 45:
+            direction = "out"
+        else:
+            direction = "neutral"
+
+        mf = {
+            "direction": direction,
+            "mfi": float(mfi[i]),
+            "price_vs_vwap": "above" if last_close[i] > vwap[i] else "below",
+        }
 
+        # detect_divergence и detect_market_phase возвращают строки,
+        # а в analyze_volatility нет ключа "volatility": после safe_dict
+        # analyze_symbol видит в них пустые значения — здесь то же самое
+        results[symbol] = build_result(indi, {}, mf, {}, {}, last_close[i])
 
-   
+    return results
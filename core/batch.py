@@ -0,0 +1,141 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# ---------------------------------------------------------
+# Матричные версии индикаторов для пакетного анализа.
+# Матрица — (символы × свечи), ряды выровнены по последней свече,
+# короткие ряды дополнены слева NaN. Каждая функция повторяет
+# одноимённую логику core/ по всем строкам сразу.
+# ---------------------------------------------------------
+
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+def stack_frames(frames):
+    """
+    {колонка: матрица} из списка DataFrame.
+    Выравнивание по последней свече, слева — NaN.
+    """
+    width = max((len(df) for df in frames), default=0)
+    out = {}
+    for col in OHLCV_COLUMNS:
+        matrix = np.full((len(frames), width), np.nan)
+        for i, df in enumerate(frames):
+            n = len(df)
+            if n:
+                matrix[i, width - n:] = df[col].to_numpy(dtype=float)
+        out[col] = matrix
+    return out
+
+
+# ---------------------------------------------------------
+# 1. EMA (как ewm(span, adjust=False); отсчёт с первой не-NaN свечи)
+# ---------------------------------------------------------
+
+def ema_rows(matrix, period):
+    alpha = 2.0 / (period + 1)
+    out = np.empty_like(matrix)
+    value = matrix[:, 0].copy()
+    out[:, 0] = value
+    for t in range(1, matrix.shape[1]):
+        x = matrix[:, t]
+        value = np.where(np.isnan(value), x, (1 - alpha) * value + alpha * x)
+        out[:, t] = value
+    return out
+
+
+# ---------------------------------------------------------
+# 2. MACD → последняя гистограмма
+# ---------------------------------------------------------
+
+def last_macd_hist(close, fast=12, slow=26, signal=9):
+    line = ema_rows(close, fast) - ema_rows(close, slow)
+    signal_line = ema_rows(line, signal)
+    return line[:, -1] - signal_line[:, -1]
+
+
+# ---------------------------------------------------------
+# 3. RSI (как indicators.rsi) → последнее значение
+# ---------------------------------------------------------
+
+def last_rsi(close, period=14):
+    if close.shape[1] < period + 1:
+        return np.full(close.shape[0], np.nan)
+    delta = np.diff(close[:, -(period + 1):], axis=1)
+    avg_gain = np.where(delta > 0, delta, 0.0).mean(axis=1)
+    avg_loss = np.where(delta < 0, -delta, 0.0).mean(axis=1)
+    # окно задело левый NaN — значения нет, как у rolling
+    short = np.isnan(delta).any(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = 100 - (100 / (1 + avg_gain / avg_loss))
+    return np.where(short, np.nan, value)
+
+
+# ---------------------------------------------------------
+# 4. SuperTrend (как indicators.supertrend) → последнее значение
+# ---------------------------------------------------------
+
+def rolling_mean_rows(matrix, period):
+    out = np.full_like(matrix, np.nan)
+    if matrix.shape[1] >= period:
+        out[:, period - 1:] = sliding_window_view(matrix, period, axis=1).mean(axis=-1)
+    return out
+
+
+def atr_rows(high, low, close, period=14):
+    prev_close = np.empty_like(close)
+    prev_close[:, 0] = np.nan
+    prev_close[:, 1:] = close[:, :-1]
+    # fmax пропускает NaN — как max(axis=1) в pandas
+    tr = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    return rolling_mean_rows(tr, period)
+
+
+def last_supertrend(high, low, close, period=10, multiplier=3):
+    atr_value = atr_rows(high, low, close, period)
+    hl2 = (high + low) / 2
+    upper = hl2 + multiplier * atr_value
+    lower = hl2 - multiplier * atr_value
+
+    brk_up = close[:, 1:] > upper[:, :-1]
+    brk_down = ~brk_up & (close[:, 1:] < lower[:, :-1])
+
+    values = np.zeros_like(close)
+    values[:, 1:] = np.where(brk_up, lower[:, 1:], upper[:, 1:])
+
+    changed = np.ones(close.shape, dtype=bool)
+    changed[:, 1:] = brk_up | brk_down
+
+    # последний пробой в строке (столбец 0 — стартовое значение 0)
+    last = close.shape[1] - 1 - np.argmax(changed[:, ::-1], axis=1)
+    return values[np.arange(close.shape[0]), last]
+
+
+# ---------------------------------------------------------
+# 5. Денежный поток (как moneyflow.mfi / vwap / money_pressure)
+# ---------------------------------------------------------
+
+def last_mfi(high, low, close, volume, period=14):
+    if close.shape[1] < period + 1:
+        return np.full(close.shape[0], np.nan)
+    tp = (high + low + close) / 3
+    money_flow = tp * volume
+    rising = tp[:, 1:] > tp[:, :-1]
+    pos = np.where(rising, money_flow[:, 1:], 0.0)[:, -period:].sum(axis=1)
+    neg = np.where(rising, 0.0, money_flow[:, 1:])[:, -period:].sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - (100 / (1 + pos / neg))
+
+
+def last_vwap(high, low, close, volume):
+    tp = (high + low + close) / 3
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nansum(tp * volume, axis=1) / np.nansum(volume, axis=1)
+
+
+def last_money_pressure(close, volume, period=20):
+    """+1 / -1 / 0 — positive / negative / neutral."""
+    if close.shape[1] < period + 1:
+        return np.zeros(close.shape[0], dtype=int)
+    flow = (np.diff(close, axis=1) * volume[:, 1:])[:, -period:].sum(axis=1)
+    return np.where(flow > 0, 1, np.where(flow < 0, -1, 0))
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+from core.metrics import gauge
+
+# метрики кэшей: метка cache — ohlcv (core/datasource.py), snapshot (срез рынка в main.py)
+CACHE_HIT_RATIO = gauge("cache_hit_ratio", "Доля обращений, обслуженных из кэша", ("cache",))
+CACHE_HITS = gauge("cache_hits", "Попадания кэша (за цикл для snapshot, всего для ohlcv)", ("cache",))
+CACHE_MISSES = gauge("cache_misses", "Промахи кэша (за цикл для snapshot, всего для ohlcv)", ("cache",))
+CACHE_ENTRIES = gauge("cache_entries", "Записей в кэше", ("cache",))
+
+
+def report_cache(cache, hits, misses, entries=None):
+    """Выставить метрики кэша cache по счётчикам попаданий / промахов."""
+    total = hits + misses
+    CACHE_HITS.set(hits, cache=cache)
+    CACHE_MISSES.set(misses, cache=cache)
+    CACHE_HIT_RATIO.set(hits / total if total else 0.0, cache=cache)
+    if entries is not None:
+        CACHE_ENTRIES.set(entries, cache=cache)
+
+
+class TTLCache:
+    """
+    Ограниченный кэш с LRU-вытеснением и временем жизни записи.
+    Время жизни задаётся при записи: expires_at — unix-время истечения.
+    Потокобезопасен: радар и FastAPI работают в разных потоках.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.get_first((key,))
+
+    def get_first(self, keys):
+        """
+        Первое живое значение из keys (по порядку).
+        Считается как одно обращение: один hit или один miss.
+        """
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+
+                value, expires_at = item
+                if expires_at <= now:
+                    del self._data[key]
+                    continue
+
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
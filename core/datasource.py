@@ -1,6 +1,14 @@
-import requests
+import os
 import pandas as pd
 import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from core import incremental
+from core.cache import TTLCache, report_cache
+from core.httpclient import http_get
+from core.metrics import on_collect
+from core.store import CandleStore
+from core.stream import KlineStream
 
 # =============================
 # СИМВОЛЫ ДЛЯ COINGECKO
@@ -62,7 +70,7 @@ def get_ohlcv_coingecko(symbol: str, timeframe: str):
     }
 
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=15)
+        r = http_get(url, params=params, headers=headers)
         data = r.json()
     except Exception as e:
         print("[COINGECKO] REQUEST ERROR:", e)
@@ -90,7 +98,8 @@ def get_ohlcv_coingecko(symbol: str, timeframe: str):
 # =============================
 # BINANCE DATA
 # =============================
-def get_klines_binance(symbol="BTCUSDT", interval="1h", limit=500):
+def get_klines_binance(symbol="BTCUSDT", interval="1h", limit=500, start=None):
+    """start — unix-время (сек): только свечи, открытые не раньше start."""
     url = "https://api.binance.com/api/v3/klines"
 
     params = {
@@ -98,15 +107,18 @@ def get_klines_binance(symbol="BTCUSDT", interval="1h", limit=500):
         "interval": interval,
         "limit": limit
     }
+    if start is not None:
+        params["startTime"] = int(start) * 1000
 
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = http_get(url, params=params)
         data = r.json()
     except Exception as e:
         print("[BINANCE] REQUEST ERROR:", e)
         return None
 
-    if not isinstance(data, list) or len(data) < 50:
+    # дозагрузка (start) может вернуть всего пару свечей
+    if not isinstance(data, list) or len(data) < (1 if start is not None else 50):
         print("[BINANCE] EMPTY DATA")
         return None
 
@@ -140,7 +152,8 @@ def convert_tf_to_bybit(tf):
     return mapping.get(tf, "60")
 
 
-def get_klines_bybit(symbol="BTCUSDT", interval="1h", limit=200):
+def get_klines_bybit(symbol="BTCUSDT", interval="1h", limit=200, start=None):
+    """start — unix-время (сек): только свечи, открытые не раньше start."""
     url = "https://api.bybit.com/v5/market/kline"
 
     interval_converted = convert_tf_to_bybit(interval)
@@ -151,9 +164,11 @@ def get_klines_bybit(symbol="BTCUSDT", interval="1h", limit=200):
         "interval": interval_converted,
         "limit": limit
     }
+    if start is not None:
+        params["start"] = int(start) * 1000
 
     try:
-        r = requests.get(url, params=params, timeout=10)
+        r = http_get(url, params=params)
         data = r.json()
     except Exception as e:
         print("[BYBIT] REQUEST ERROR:", e)
@@ -165,7 +180,7 @@ def get_klines_bybit(symbol="BTCUSDT", interval="1h", limit=200):
 
     raw = data["result"]["list"]
 
-    if not raw or len(raw) < 50:
+    if not raw or len(raw) < (1 if start is not None else 50):
         print("[BYBIT] EMPTY DATA")
         return None
 
@@ -182,39 +197,263 @@ def get_klines_bybit(symbol="BTCUSDT", interval="1h", limit=200):
     return df
 
 
+# =============================
+# КЭШ ОТВЕТОВ (до закрытия свечи)
+# =============================
+TF_SECONDS = {
+    "1m": 60,
+    "3m": 180,
+    "5m": 300,
+    "15m": 900,
+    "30m": 1800,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400,
+}
+
+SOURCES = ("coingecko", "binance", "bybit")
+
+OHLCV_CACHE_SIZE = int(os.getenv("OHLCV_CACHE_SIZE", "256"))
+
+_ohlcv_cache = TTLCache(maxsize=OHLCV_CACHE_SIZE)
+
+
+def next_candle_close(tf, now=None):
+    """Unix-время закрытия текущей свечи таймфрейма tf."""
+    step = TF_SECONDS.get(tf, 3600)
+    now = time.time() if now is None else now
+    return (int(now) // step + 1) * step
+
+
+def _cache_lookup(sym, tf):
+    # порядок источников тот же, что и при запросе
+    return _ohlcv_cache.get_first([(source, sym, tf) for source in SOURCES])
+
+
+def _cache_store(source, sym, tf, df):
+    _ohlcv_cache.set((source, sym, tf), df, next_candle_close(tf))
+
+
+def cache_stats():
+    """Счётчики попаданий/промахов кэша OHLCV."""
+    return _ohlcv_cache.stats()
+
+
+@on_collect
+def _collect_cache_metrics():
+    s = cache_stats()
+    report_cache("ohlcv", s["hits"], s["misses"], s["size"])
+
+
+# =============================
+# ЛОКАЛЬНАЯ ИСТОРИЯ + ДОЗАГРУЗКА
+# =============================
+# OHLCV_STORE=0 — работать как раньше, без диска
+OHLCV_STORE_DIR = os.getenv("OHLCV_STORE_DIR", os.path.join(os.getenv("STATE_DIR", "."), "candles"))
+
+store = CandleStore(OHLCV_STORE_DIR) if os.getenv("OHLCV_STORE", "1") == "1" else None
+
+# (лимит свечей за запрос, размер окна для анализатора)
+DELTA_SOURCES = {
+    "binance": (500, 500),
+    "bybit": (200, 200),
+}
+
+
+def _fetch_delta(source, fetch, sym, tf):
+    """
+    Запросить только свечи новее сохранённых, дописать их и вернуть окно из хранилища.
+    CoinGecko /ohlc не умеет "с момента": гранулярность зависит от days,
+    поэтому там всегда полный запрос, но история всё равно копится на диске.
+    """
+    last = store.last_ts(source, sym, tf)
+    limit, window = DELTA_SOURCES.get(source, (None, None))
+
+    if last is not None and limit is not None:
+        missed = (time.time() - last) / TF_SECONDS.get(tf, 3600)
+        # разрыв больше одного запроса — проще взять свежее окно целиком
+        if missed < limit:
+            df = fetch(sym, tf, start=last)
+        else:
+            df = fetch(sym, tf)
+    else:
+        df = fetch(sym, tf)
+
+    if df is None or len(df) == 0:
+        return None
+
+    written = store.merge(source, sym, tf, df)
+    print(f"[STORE] {source.upper()} {sym} {tf}: +{written} rows")
+    return store.read(source, sym, tf, limit=window or len(df))
+
+
+# =============================
+# ХЕДЖИРОВАННЫЙ ЗАПРОС К ИСТОЧНИКАМ
+# =============================
+# Через сколько секунд без ответа запускать следующий источник (0 — все сразу)
+OHLCV_HEDGE_DELAY = float(os.getenv("OHLCV_HEDGE_DELAY", "2"))
+
+# общий пул: брошенные запросы доигрывают в фоне и просто пополняют кэш
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ohlcv")
+
+
+def _source_chain():
+    # (источник, загрузчик, минимум строк) — в порядке приоритета
+    return (
+        ("coingecko", get_ohlcv_coingecko, 20),
+        ("binance", get_klines_binance, 50),
+        ("bybit", get_klines_bybit, 50),
+    )
+
+
+def _fetch_source(source, fetch, min_rows, sym, tf):
+    if store is not None:
+        df = _fetch_delta(source, fetch, sym, tf)
+    else:
+        df = fetch(sym, tf)
+    if df is None or len(df) < min_rows:
+        return None
+    # чей ряд — движкам индикаторов (core/incremental.py)
+    df.attrs["source"] = source
+    _cache_store(source, sym, tf, df)
+    return df
+
+
+def _fetch_hedged(sym, tf, delay):
+    """
+    Запускаем основной источник; если за delay секунд нет годного ответа —
+    параллельно запускаем следующий. Источник, который ответил ошибкой,
+    сразу передаёт ход следующему. Берём первый DataFrame с нужным числом строк,
+    ещё не начатые запросы отменяем.
+    """
+    chain = _source_chain()
+    running = {}
+    launched = 0
+
+    def launch():
+        nonlocal launched
+        source, fetch, min_rows = chain[launched]
+        running[_hedge_pool.submit(_fetch_source, source, fetch, min_rows, sym, tf)] = source
+        launched += 1
+
+    launch()
+    while delay <= 0 and launched < len(chain):
+        launch()
+
+    while running:
+        timeout = delay if launched < len(chain) else None
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        if not done:
+            launch()
+            continue
+
+        for future in done:
+            source = running.pop(future)
+            try:
+                df = future.result()
+            except Exception as e:
+                print(f"[DATASOURCE] {source.upper()} ERROR:", e)
+                df = None
+
+            if df is not None:
+                for other in running:
+                    other.cancel()
+                return df
+
+        if not running and launched < len(chain):
+            launch()
+
+    return None
+
+
+# =============================
+# WEBSOCKET-СВЕЧИ (core/stream.py)
+# =============================
+# Необязательный режим: пока стрим подключён и свечи символа свежие,
+# get_ohlcv отдаёт их из памяти, без REST. Иначе — обычная цепочка источников.
+STREAM_MIN_ROWS = 50
+
+_stream = None
+
+
+def start_stream(exchange, symbols, tf="1h", url=None, on_bar=None):
+    """
+    Запустить kline-стрим (bybit | binance); дыры добираются тем же REST-загрузчиком биржи.
+    Закрытые свечи сразу уходят в движки индикаторов (core/incremental.py).
+    """
+    global _stream
+    fetch = {"bybit": get_klines_bybit, "binance": get_klines_binance}[exchange]
+    step = TF_SECONDS[tf]
+
+    def handle_bar(symbol, bar):
+        incremental.feed_bar(exchange, symbol, tf, bar, step)
+        if on_bar:
+            on_bar(symbol, bar)
+
+    stop_stream()
+    _stream = KlineStream(
+        exchange, symbols, tf, url=url, on_bar=handle_bar,
+        backfill=lambda sym, interval, start: fetch(sym, interval, start=start),
+    ).start()
+    return _stream
+
+
+def stop_stream():
+    global _stream
+    if _stream is not None:
+        _stream.stop()
+        _stream = None
+
+
+def _stream_lookup(sym, tf):
+    stream = _stream
+    if stream is None or stream.tf != tf:
+        return None
+    df = stream.candles(sym)
+    if df is None or len(df) < STREAM_MIN_ROWS:
+        return None
+    # свечи стрима — тот же ряд, что REST этой биржи
+    df.attrs["source"] = stream.exchange
+    return df
+
+
 # =============================
 # MAIN PUBLIC FUNCTION
 # =============================
 def get_ohlcv(symbol, timeframe):
     """
     Главная точка входа для анализатора.
-    Порядок:
+    Если запущен стрим (start_stream) и его свечи свежие — отдаём их.
+    Иначе порядок:
     1) CoinGecko
     2) Binance
     3) Bybit
+
+    Следующий источник стартует, если предыдущий не ответил
+    за OHLCV_HEDGE_DELAY секунд (см. _fetch_hedged).
+
+    Свечи копятся в локальном хранилище (OHLCV_STORE_DIR): Binance и Bybit
+    отдают только новые свечи, окно для анализа читается с диска.
+
+    Ответ кэшируется до закрытия текущей свечи: повторные вызовы
+    внутри свечи возвращают тот же DataFrame (не изменять его на месте).
     """
     sym = symbol.upper()
     tf = timeframe
 
     print("[DATASOURCE] REQUEST:", sym, tf)
 
-    # 1. CoinGecko (основной)
-    df = get_ohlcv_coingecko(sym, tf)
-    if df is not None and len(df) >= 20:
+    df = _stream_lookup(sym, tf)
+    if df is not None:
         return df
 
-    time.sleep(1)
-
-    # 2. Binance (если поддерживает символ)
-    df = get_klines_binance(sym, tf)
-    if df is not None and len(df) >= 50:
+    df = _cache_lookup(sym, tf)
+    if df is not None:
         return df
 
-    time.sleep(1)
-
-    # 3. Bybit (резерв)
-    df = get_klines_bybit(sym, tf)
-    if df is not None and len(df) >= 50:
+    df = _fetch_hedged(sym, tf, OHLCV_HEDGE_DELAY)
+    if df is not None:
         return df
 
     print("[DATASOURCE] ALL SOURCES FAILED:", sym, tf)
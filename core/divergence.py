@@ -1,6 +1,9 @@
 import numpy as np
 import pandas as pd
 
+from core.features import features
+from core.indicators import obv, rsi as rsi_series
+
 
 def RSI(series, period=14):
     """Стандартный RSI"""
@@ -16,16 +19,8 @@ def RSI(series, period=14):
 
 
 def OBV(df):
-    """On-Balance Volume"""
-    obv = [0]
-    for i in range(1, len(df)):
-        if df.close.iloc[i] > df.close.iloc[i - 1]:
-            obv.append(obv[-1] + df.volume.iloc[i])
-        elif df.close.iloc[i] < df.close.iloc[i - 1]:
-            obv.append(obv[-1] - df.volume.iloc[i])
-        else:
-            obv.append(obv[-1])
-    return pd.Series(obv, index=df.index)
+    """On-Balance Volume (индекс как у df)"""
+    return pd.Series(obv(df).to_numpy(), index=df.index)
 
 
 def detect_divergence(df):
@@ -37,8 +32,10 @@ def detect_divergence(df):
     """
 
     close = df.close
-    rsi = RSI(close)
-    obv = OBV(df)
+    fx = features(df)
+    # RSI общий с calculate_indicators (тот же ряд по значениям, индекс — позиционный)
+    rsi = fx.get(("rsi", 14), rsi_series, close, 14)
+    obv = fx.get("obv", OBV, df)
 
     # проверяем последние 5 свечей
     window = 5
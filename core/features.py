@@ -0,0 +1,51 @@
+import threading
+import weakref
+
+
+class FeatureFrame:
+    """
+    Промежуточные ряды одного DataFrame (RSI, EMA, MFI, VWAP ...).
+    Каждый ряд считается при первом обращении и дальше берётся из памяти,
+    поэтому модули core/ могут запрашивать одно и то же без пересчёта.
+    Предполагается, что df после анализа не меняют на месте.
+    """
+
+    def __init__(self, df):
+        self._df = weakref.ref(df)
+        self._values = {}
+
+    @property
+    def df(self):
+        return self._df()
+
+    def get(self, key, fn, *args, **kwargs):
+        """Значение по ключу; при первом обращении считается как fn(*args, **kwargs)."""
+        try:
+            return self._values[key]
+        except KeyError:
+            value = fn(*args, **kwargs)
+            self._values[key] = value
+            return value
+
+    def keys(self):
+        return list(self._values)
+
+
+_frames = {}
+_lock = threading.Lock()
+
+
+def features(df):
+    """
+    FeatureFrame для df: один на объект DataFrame, живёт пока жив df.
+    """
+    key = id(df)
+    with _lock:
+        fx = _frames.get(key)
+        if fx is not None and fx.df is df:
+            return fx
+
+        fx = FeatureFrame(df)
+        _frames[key] = fx
+        weakref.finalize(df, _frames.pop, key, None)
+        return fx
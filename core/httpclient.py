@@ -0,0 +1,278 @@
+import os
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from core.metrics import counter, histogram
+
+# =============================
+# НАСТРОЙКИ ПУЛА
+# =============================
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))   # соединений на хост
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))         # повторы на 5xx/обрыв
+
+# (connect, read) в секундах
+DEFAULT_TIMEOUT = (5, 20)
+HOST_TIMEOUTS = {
+    "api.coingecko.com": (5, 20),
+    "api.binance.com": (5, 10),
+    "api.bybit.com": (5, 15),
+    "api.telegram.org": (5, 15),
+}
+
+# (запросов в секунду, ёмкость корзины)
+RATE_LIMITS = {
+    "api.coingecko.com": (float(os.getenv("COINGECKO_RPM", "30")) / 60.0, 5),
+    "api.binance.com": (20.0, 40),
+    "api.bybit.com": (10.0, 20),
+    "api.telegram.org": (1.0, 3),
+}
+MAX_429_RETRIES = int(os.getenv("HTTP_429_RETRIES", "5"))
+
+_sessions = {}
+_lock = threading.Lock()
+
+HTTP_LATENCY = histogram(
+    "http_request_duration_seconds", "Время ответа внешнего API (без ожидания лимитера)", ("host", "endpoint"))
+HTTP_RESPONSES = counter(
+    "http_responses_total", "Ответы внешних API по статусу (error — обрыв/таймаут)", ("host", "endpoint", "status"))
+HTTP_LIMITER_WAIT = histogram(
+    "http_rate_limit_wait_seconds", "Ожидание токена в лимитере перед запросом", ("host",))
+
+
+# =============================
+# TOKEN BUCKET
+# =============================
+class TokenBucket:
+    """
+    tokens — уровень корзины на момент updated.
+    Уровень может уходить в минус: это очередь уже забронированных запросов,
+    каждый следующий ждёт на 1/rate дольше. После 429 updated переносится
+    в будущее (Retry-After), до этого момента корзина не наполняется.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self):
+        """Забронировать токен. Возвращает, сколько секунд подождать перед запросом."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.updated - now)
+            if self.tokens < 0:
+                wait += -self.tokens / self.rate
+            return wait
+
+    def penalize(self, seconds):
+        """Сервер ответил 429: не отправлять ничего ещё seconds секунд."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, now + seconds)
+
+    def level(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "tokens": round(self.tokens, 3),
+                "capacity": self.capacity,
+                "rate": self.rate,
+                "blocked_for": round(max(0.0, self.updated - now), 3),
+            }
+
+
+class RateLimiter:
+    """Корзины по хостам; хосты без лимита пропускаются сразу."""
+
+    def __init__(self, limits):
+        self._buckets = {host: TokenBucket(rate, cap) for host, (rate, cap) in limits.items()}
+
+    def reserve(self, url):
+        bucket = self._buckets.get(_host(url))
+        return bucket.reserve() if bucket else 0.0
+
+    def acquire(self, url):
+        wait = self.reserve(url)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def set_limit(self, host, rate, capacity):
+        """Задать (или заменить) лимит хоста — например, для локальной заглушки."""
+        self._buckets[host] = TokenBucket(rate, capacity)
+
+    def penalize(self, url, seconds):
+        bucket = self._buckets.get(_host(url))
+        if bucket:
+            bucket.penalize(seconds)
+
+    def levels(self):
+        return {host: bucket.level() for host, bucket in self._buckets.items()}
+
+
+rate_limiter = RateLimiter(RATE_LIMITS)
+
+
+def retry_after_seconds(headers, body=None, attempt=0):
+    """
+    Пауза после 429: заголовок Retry-After (секунды или HTTP-дата),
+    parameters.retry_after из JSON Telegram, иначе экспоненциальный backoff.
+    """
+    value = headers.get("Retry-After") if headers else None
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+
+    if isinstance(body, dict):
+        params = body.get("parameters")
+        if isinstance(params, dict) and params.get("retry_after"):
+            try:
+                return float(params["retry_after"])
+            except (TypeError, ValueError):
+                pass
+
+    return min(60.0, 2.0 ** (attempt + 1))
+
+
+def rate_limit_levels():
+    """Текущий уровень корзин по хостам."""
+    return rate_limiter.levels()
+
+
+def _host(url):
+    return urlsplit(url).netloc
+
+
+# id монеты и токен бота в путь метрики не попадают
+_ENDPOINT_PATTERNS = (
+    (re.compile(r"/bot[^/]+/"), "/bot{token}/"),
+    (re.compile(r"/coins/[^/]+/"), "/coins/{id}/"),
+)
+
+
+def endpoint_label(url):
+    path = urlsplit(url).path
+    for pattern, repl in _ENDPOINT_PATTERNS:
+        path = pattern.sub(repl, path)
+    return path
+
+
+def observe_request(url, status, seconds):
+    """Записать время и статус ответа (общая точка для requests и aiohttp)."""
+    host = _host(url)
+    endpoint = endpoint_label(url)
+    HTTP_LATENCY.observe(seconds, host=host, endpoint=endpoint)
+    HTTP_RESPONSES.inc(host=host, endpoint=endpoint, status=status)
+
+
+def _make_session():
+    # POST не повторяем по статусу — Telegram иначе может прислать дубль.
+    # Ошибки соединения повторяются для любых методов: запрос ещё не ушёл.
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def session_for(url):
+    """Keep-alive сессия для хоста из url (одна на хост, общая для всех модулей)."""
+    host = _host(url)
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _make_session()
+            _sessions[host] = session
+        return session
+
+
+def timeout_for(url):
+    return HOST_TIMEOUTS.get(_host(url), DEFAULT_TIMEOUT)
+
+
+def _json_or_none(resp):
+    try:
+        return resp.json()
+    except ValueError:
+        return None
+
+
+def http_request(method, url, timeout=None, max_429_retries=None, **kwargs):
+    """
+    Запрос через общий пул и лимитер хоста.
+    На 429 запрос не теряется: ждём Retry-After и повторяем (до MAX_429_RETRIES).
+    max_429_retries=0 — отдать 429 вызывающему сразу (у него своя очередь повторов).
+    """
+    if max_429_retries is None:
+        max_429_retries = MAX_429_RETRIES
+    if timeout is None:
+        timeout = timeout_for(url)
+    session = session_for(url)
+
+    attempt = 0
+    while True:
+        HTTP_LIMITER_WAIT.observe(rate_limiter.acquire(url), host=_host(url))
+        started = time.perf_counter()
+        try:
+            resp = session.request(method, url, timeout=timeout, **kwargs)
+        except Exception:
+            observe_request(url, "error", time.perf_counter() - started)
+            raise
+        observe_request(url, resp.status_code, time.perf_counter() - started)
+        if resp.status_code != 429 or attempt >= max_429_retries:
+            return resp
+
+        pause = retry_after_seconds(resp.headers, _json_or_none(resp), attempt)
+        print(f"[HTTP] 429 {_host(url)}: retry in {pause:.1f}s", flush=True)
+        rate_limiter.penalize(url, pause)
+        attempt += 1
+
+
+def http_get(url, params=None, **kwargs):
+    return http_request("GET", url, params=params, **kwargs)
+
+
+def http_post(url, data=None, **kwargs):
+    return http_request("POST", url, data=data, **kwargs)
+
+
+def close_sessions():
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,503 @@
+import copy
+import json
+import math
+import os
+import threading
+from collections import deque
+
+import numpy as np
+
+from core.indicators import ema, supertrend, true_range
+
+# ---------------------------------------------------------
+# Потоковые версии индикаторов из core/indicators.py.
+# Каждая хранит O(1) состояния и обновляется одной закрытой свечой,
+# результат совпадает с calculate_indicators с точностью до float.
+# ---------------------------------------------------------
+
+NAN = float("nan")
+
+
+def _num(x):
+    return NAN if x is None else float(x)
+
+
+# ---------------------------------------------------------
+# 1. EMA (как ewm(span, adjust=False))
+# ---------------------------------------------------------
+
+class EMA:
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self.value = NAN
+
+    def update(self, x):
+        if math.isnan(x):
+            return self.value
+        if math.isnan(self.value):
+            self.value = x
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * x
+        return self.value
+
+    def state(self):
+        return {"period": self.period, "value": self.value}
+
+    @classmethod
+    def from_state(cls, s):
+        obj = cls(s["period"])
+        obj.value = _num(s["value"])
+        return obj
+
+
+# ---------------------------------------------------------
+# 2. Скользящее среднее (как rolling(period).mean())
+# ---------------------------------------------------------
+
+class RollingMean:
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+
+    def update(self, x):
+        self.window.append(x)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.window) < self.period:
+            return NAN
+        return sum(self.window) / self.period
+
+    def state(self):
+        return {"period": self.period, "window": list(self.window)}
+
+    @classmethod
+    def from_state(cls, s):
+        obj = cls(s["period"])
+        obj.window.extend(_num(x) for x in s["window"])
+        return obj
+
+
+# ---------------------------------------------------------
+# 3. MACD
+# ---------------------------------------------------------
+
+class MACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = EMA(signal)
+        self.line = NAN
+
+    def update(self, close):
+        self.line = self.fast.update(close) - self.slow.update(close)
+        self.signal.update(self.line)
+        return self.hist
+
+    @property
+    def hist(self):
+        return self.line - self.signal.value
+
+    def state(self):
+        return {
+            "fast": self.fast.state(),
+            "slow": self.slow.state(),
+            "signal": self.signal.state(),
+            "line": self.line,
+        }
+
+    @classmethod
+    def from_state(cls, s):
+        obj = cls()
+        obj.fast = EMA.from_state(s["fast"])
+        obj.slow = EMA.from_state(s["slow"])
+        obj.signal = EMA.from_state(s["signal"])
+        obj.line = _num(s["line"])
+        return obj
+
+
+# ---------------------------------------------------------
+# 4. RSI (средние прибылей/убытков за period, как indicators.rsi)
+# ---------------------------------------------------------
+
+class RSI:
+    def __init__(self, period=14):
+        self.gain = RollingMean(period)
+        self.loss = RollingMean(period)
+        self.prev_close = NAN
+
+    def update(self, close):
+        delta = close - self.prev_close
+        # первая свеча (delta = NaN) даёт 0 и 0 — как np.where в indicators.rsi
+        self.gain.update(delta if delta > 0 else 0.0)
+        self.loss.update(-delta if delta < 0 else 0.0)
+        self.prev_close = close
+        return self.value
+
+    @property
+    def value(self):
+        avg_gain = self.gain.value
+        avg_loss = self.loss.value
+        if math.isnan(avg_gain) or math.isnan(avg_loss):
+            return NAN
+        if avg_loss == 0:
+            return NAN if avg_gain == 0 else 100.0
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def state(self):
+        return {"gain": self.gain.state(), "loss": self.loss.state(), "prev_close": self.prev_close}
+
+    @classmethod
+    def from_state(cls, s):
+        obj = cls()
+        obj.gain = RollingMean.from_state(s["gain"])
+        obj.loss = RollingMean.from_state(s["loss"])
+        obj.prev_close = _num(s["prev_close"])
+        return obj
+
+
+# ---------------------------------------------------------
+# 5. ATR
+# ---------------------------------------------------------
+
+class ATR:
+    def __init__(self, period=14):
+        self.tr = RollingMean(period)
+        self.prev_close = NAN
+
+    def update(self, high, low, close):
+        ranges = [high - low, abs(high - self.prev_close), abs(low - self.prev_close)]
+        # как max(axis=1) в pandas: NaN пропускаются
+        ranges = [r for r in ranges if not math.isnan(r)]
+        self.tr.update(max(ranges) if ranges else NAN)
+        self.prev_close = close
+        return self.value
+
+    @property
+    def value(self):
+        return self.tr.value
+
+    def state(self):
+        return {"tr": self.tr.state(), "prev_close": self.prev_close}
+
+    @classmethod
+    def from_state(cls, s):
+        obj = cls()
+        obj.tr = RollingMean.from_state(s["tr"])
+        obj.prev_close = _num(s["prev_close"])
+        return obj
+
+
+# ---------------------------------------------------------
+# 6. SuperTrend
+# ---------------------------------------------------------
+
+class SuperTrend:
+    def __init__(self, period=10, multiplier=3):
+        self.multiplier = multiplier
+        self.atr = ATR(period)
+        self.upper = NAN
+        self.lower = NAN
+        self.value = 0.0
+
+    def update(self, high, low, close):
+        atr_value = self.atr.update(high, low, close)
+        hl2 = (high + low) / 2
+        upper = hl2 + self.multiplier * atr_value
+        lower = hl2 - self.multiplier * atr_value
+
+        # пробой полос прошлой свечи
+        if close > self.upper:
+            self.value = lower
+        elif close < self.lower:
+            self.value = upper
+
+        self.upper = upper
+        self.lower = lower
+        return self.value
+
+    def state(self):
+        return {
+            "multiplier": self.multiplier,
+            "atr": self.atr.state(),
+            "upper": self.upper,
+            "lower": self.lower,
+            "value": self.value,
+        }
+
+    @classmethod
+    def from_state(cls, s):
+        obj = cls(multiplier=s["multiplier"])
+        obj.atr = ATR.from_state(s["atr"])
+        obj.upper = _num(s["upper"])
+        obj.lower = _num(s["lower"])
+        obj.value = _num(s["value"])
+        return obj
+
+
+# ---------------------------------------------------------
+# 7. Движок для одного символа/таймфрейма
+# ---------------------------------------------------------
+
+class IndicatorEngine:
+    """
+    Потоковый аналог calculate_indicators: на каждую закрытую свечу —
+    постоянная работа, независимо от длины истории.
+    Свечи с timestamp не новее последней обработанной пропускаются.
+    """
+
+    def __init__(self):
+        self.ema20 = EMA(20)
+        self.ema50 = EMA(50)
+        self.macd = MACD()
+        self.rsi = RSI(14)
+        self.supertrend = SuperTrend(10, 3)
+        self.last_ts = None
+        self.bars = 0
+
+    def update(self, ts, high, low, close):
+        if self.last_ts is not None and ts <= self.last_ts:
+            return self.values()
+
+        self._apply(high, low, close)
+        self.last_ts = ts.item() if hasattr(ts, "item") else ts
+        self.bars += 1
+        return self.values()
+
+    def _apply(self, high, low, close):
+        high, low, close = float(high), float(low), float(close)
+        self.ema20.update(close)
+        self.ema50.update(close)
+        self.macd.update(close)
+        self.rsi.update(close)
+        self.supertrend.update(high, low, close)
+
+    @property
+    def last_close(self):
+        """Закрытие последней принятой свечи (для сверки с окном)."""
+        return self.rsi.prev_close
+
+    def preview(self, high, low, close):
+        """Значения с ещё не закрытой свечой — состояние движка не меняется."""
+        engine = copy.deepcopy(self)
+        engine._apply(high, low, close)
+        return engine.values()
+
+    def warmup(self, df):
+        """Прогнать историю (df с колонками high/low/close, индекс — timestamp)."""
+        for ts, high, low, close in zip(df.index, df["high"], df["low"], df["close"]):
+            self.update(ts, high, low, close)
+        return self.values()
+
+    def seed(self, df):
+        """
+        То же, что warmup пустого движка, но векторно: состояние снимается
+        с рядов core/indicators.py на последней свече df. Длинная история
+        стоит как один calculate_indicators, а не цикл по свечам.
+        """
+        if len(df) == 0:
+            return self.values()
+        close = df["close"].astype(float)
+
+        self.ema20.value = float(ema(close, 20).iloc[-1])
+        self.ema50.value = float(ema(close, 50).iloc[-1])
+
+        fast = ema(close, 12)
+        slow = ema(close, 26)
+        line = fast - slow
+        self.macd.fast.value = float(fast.iloc[-1])
+        self.macd.slow.value = float(slow.iloc[-1])
+        self.macd.signal.value = float(ema(line, 9).iloc[-1])
+        self.macd.line = float(line.iloc[-1])
+
+        # окна скользящих средних — хвосты тех же рядов, что считает update
+        delta = close.diff().to_numpy()
+        period = self.rsi.gain.period
+        self.rsi.gain.window.extend(np.where(delta > 0, delta, 0.0)[-period:].tolist())
+        self.rsi.loss.window.extend(np.where(delta < 0, -delta, 0.0)[-period:].tolist())
+        self.rsi.prev_close = float(close.iloc[-1])
+
+        st = self.supertrend
+        tr = true_range(df).to_numpy(dtype=float)
+        st.atr.tr.window.extend(tr[-st.atr.tr.period:].tolist())
+        st.atr.prev_close = float(close.iloc[-1])
+        hl2 = (float(df["high"].iloc[-1]) + float(df["low"].iloc[-1])) / 2
+        st.upper = hl2 + st.multiplier * st.atr.value
+        st.lower = hl2 - st.multiplier * st.atr.value
+        st.value = float(supertrend(df, st.atr.tr.period, st.multiplier).iloc[-1])
+
+        ts = df.index[-1]
+        self.last_ts = ts.item() if hasattr(ts, "item") else ts
+        self.bars = len(df)
+        return self.values()
+
+    def values(self):
+        """Результат в формате calculate_indicators."""
+        if self.ema20.value > self.ema50.value:
+            trend = "up"
+        elif self.ema20.value < self.ema50.value:
+            trend = "down"
+        else:
+            trend = "sideways"
+
+        return {
+            "trend": trend,
+            "macd_hist": float(self.macd.hist),
+            "rsi": float(self.rsi.value),
+            "supertrend": float(self.supertrend.value),
+        }
+
+    def snapshot(self):
+        """Состояние в виде dict (можно сохранить в JSON)."""
+        return {
+            "ema20": self.ema20.state(),
+            "ema50": self.ema50.state(),
+            "macd": self.macd.state(),
+            "rsi": self.rsi.state(),
+            "supertrend": self.supertrend.state(),
+            "last_ts": self.last_ts,
+            "bars": self.bars,
+        }
+
+    @classmethod
+    def restore(cls, snap):
+        engine = cls()
+        engine.ema20 = EMA.from_state(snap["ema20"])
+        engine.ema50 = EMA.from_state(snap["ema50"])
+        engine.macd = MACD.from_state(snap["macd"])
+        engine.rsi = RSI.from_state(snap["rsi"])
+        engine.supertrend = SuperTrend.from_state(snap["supertrend"])
+        engine.last_ts = snap.get("last_ts")
+        engine.bars = snap.get("bars", 0)
+        return engine
+
+
+# ---------------------------------------------------------
+# 8. Движки по (source, symbol, tf) для анализатора
+# ---------------------------------------------------------
+# Движок получает только закрытые свечи, которых ещё не видел (из окна
+# get_ohlcv или из стрима), последняя свеча окна — незакрытая — идёт
+# через preview(). Первое окно прогоняется целиком (seed).
+#
+# get_ohlcv отдаёт ряд того источника, что выиграл запрос (df.attrs["source"]),
+# у CoinGecko и бирж разные свечи — движок у каждого источника свой.
+# Окно без источника, с шагом свечей не tf или не совпавшее с движком
+# на его последней свече — считается по окну (None), движок при
+# расхождении начинается заново.
+#
+# Движок помнит историю с первого окна, а calculate_indicators считает
+# EMA / MACD заново от начала скользящего окна: разница затухает как
+# (1 - alpha)^длина окна (на окне в 200 свечей MACD расходится на ~1e-6,
+# см. benchmarks/bench_incremental.py). RSI, ATR и SuperTrend совпадают точно.
+#
+# Состояние переживает рестарт: save_engines() / load_engines(), JSON.
+
+INDICATOR_STATE_PATH = os.getenv(
+    "INDICATOR_STATE_PATH", os.path.join(os.getenv("STATE_DIR", "."), "indicator_engines.json")
+)
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def sync(engine, df):
+    """
+    Догнать движок по окну df (последняя строка — незакрытая свеча)
+    и вернуть значения в формате calculate_indicators.
+    None — окно старее движка (например, кэш отстал от стрима).
+    """
+    closed = df.iloc[:-1]
+    forming = df.iloc[-1]
+    if engine.last_ts is not None and df.index[-1] <= engine.last_ts:
+        return None
+
+    if engine.last_ts is None:
+        engine.seed(closed)
+    else:
+        engine.warmup(closed[closed.index > engine.last_ts])
+    return engine.preview(forming["high"], forming["low"], forming["close"])
+
+
+def _continues(engine, df):
+    """Окно продолжает историю движка: свеча engine.last_ts в окне, закрытие то же."""
+    if engine.last_ts is None:
+        return True
+    if engine.last_ts not in df.index:
+        return False
+    close = float(df["close"].loc[engine.last_ts])
+    return math.isclose(close, engine.last_close, rel_tol=1e-9, abs_tol=1e-12)
+
+
+def indicators_for(symbol, tf, df, step):
+    """
+    calculate_indicators(df) через движок (source, symbol, tf); step — секунд в свече tf.
+    None — посчитать по окну.
+    """
+    source = df.attrs.get("source")
+    if source is None or len(df) < 2:
+        return None
+    # CoinGecko /ohlc отдаёт свечи своей гранулярности, стрим — с дырами до добора
+    if not (np.diff(np.asarray(df.index, dtype=np.float64)) == step).all():
+        return None
+
+    key = (source, symbol.upper(), tf)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is not None and engine.last_ts is not None and df.index[-1] <= engine.last_ts:
+            return None     # окно старее движка (кэш отстал от стрима)
+        # простой дольше окна или ряд источника разошёлся с движком — начать заново
+        if engine is None or not _continues(engine, df):
+            engine = _engines[key] = IndicatorEngine()
+        return sync(engine, df)
+
+
+def feed_bar(source, symbol, tf, bar, step):
+    """
+    Закрытая свеча стрима биржи source: bar = (ts, open, high, low, close, volume, closed).
+    Берётся только следующая по порядку свеча уже прогретого движка той же
+    биржи — дыры добирает indicators_for из окна get_ohlcv.
+    """
+    ts, _, high, low, close, _, closed = bar
+    if not closed:
+        return
+    with _engines_lock:
+        engine = _engines.get((source, symbol.upper(), tf))
+        if engine is not None and engine.last_ts is not None and ts - engine.last_ts == step:
+            engine.update(ts, high, low, close)
+
+
+def save_engines(path=None):
+    path = path or INDICATOR_STATE_PATH
+    with _engines_lock:
+        data = [{"source": src, "symbol": s, "tf": tf, "engine": e.snapshot()} for (src, s, tf), e in _engines.items()]
+    if not data:
+        return 0
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = path + ".tmp"
+        # NaN (движок ещё не прогрет) json пишет как NaN и читает обратно
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("[INDICATORS] engine state save error:", e, flush=True)
+        return 0
+    return len(data)
+
+
+def load_engines(path=None):
+    path = path or INDICATOR_STATE_PATH
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        engines = {(item["source"], item["symbol"], item["tf"]): IndicatorEngine.restore(item["engine"]) for item in data}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print("[INDICATORS] engine state unreadable:", e, flush=True)
+        return 0
+    with _engines_lock:
+        _engines.update(engines)
+    return len(engines)
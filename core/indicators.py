@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 
+from core.features import features
+
 # ---------------------------------------------------------
 # 1. SMA / EMA
 # ---------------------------------------------------------
@@ -51,12 +53,14 @@ def stochastic(df, k_period=14, d_period=3):
 # 5. ATR (VOLATILITY)
 # ---------------------------------------------------------
 
-def atr(df, period=14):
+def true_range(df):
     high_low = df["high"] - df["low"]
     high_close = (df["high"] - df["close"].shift()).abs()
     low_close = (df["low"] - df["close"].shift()).abs()
-    tr = pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
-    return tr.rolling(period).mean()
+    return pd.concat([high_low, high_close, low_close], axis=1).max(axis=1)
+
+def atr(df, period=14):
+    return true_range(df).rolling(period).mean()
 
 # ---------------------------------------------------------
 # 6. ADX (trend strength)
@@ -100,15 +104,15 @@ def vwap(df):
 # ---------------------------------------------------------
 
 def obv(df):
-    obv = [0]
-    for i in range(1, len(df)):
-        if df["close"].iloc[i] > df["close"].iloc[i-1]:
-            obv.append(obv[-1] + df["volume"].iloc[i])
-        elif df["close"].iloc[i] < df["close"].iloc[i-1]:
-            obv.append(obv[-1] - df["volume"].iloc[i])
-        else:
-            obv.append(obv[-1])
-    return pd.Series(obv)
+    close = df["close"].to_numpy(dtype=float)
+    volume = df["volume"].to_numpy(dtype=float)
+
+    # +объём на росте, -объём на падении, 0 если цена не изменилась
+    up = close[1:] > close[:-1]
+    down = close[1:] < close[:-1]
+    step = np.where(up, volume[1:], np.where(down, -volume[1:], 0.0))
+
+    return pd.Series(np.concatenate(([0.0], np.cumsum(step))))
 
 # ---------------------------------------------------------
 # 10. MOMENTUM
@@ -133,28 +137,38 @@ def supertrend(df, period=10, multiplier=3):
     atr_value = atr(df, period)
     hl2 = (df["high"] + df["low"]) / 2
 
-    upperband = hl2 + multiplier * atr_value
-    lowerband = hl2 - multiplier * atr_value
+    upperband = (hl2 + multiplier * atr_value).to_numpy(dtype=float)
+    lowerband = (hl2 - multiplier * atr_value).to_numpy(dtype=float)
+    close = df["close"].to_numpy(dtype=float)
+
+    n = len(close)
+    if n == 0:
+        return pd.Series([0])
+
+    # линия меняется только на пробое полосы прошлой свечи,
+    # иначе тянется предыдущее значение (первое — 0)
+    brk_up = close[1:] > upperband[:-1]
+    brk_down = ~brk_up & (close[1:] < lowerband[:-1])
+
+    values = np.zeros(n)
+    values[1:] = np.where(brk_up, lowerband[1:], upperband[1:])
+
+    changed = np.ones(n, dtype=bool)
+    changed[1:] = brk_up | brk_down
 
-    st = [0]
-    for i in range(1, len(df)):
-        if df["close"].iloc[i] > upperband.iloc[i-1]:
-            st.append(lowerband.iloc[i])
-        elif df["close"].iloc[i] < lowerband.iloc[i-1]:
-            st.append(upperband.iloc[i])
-        else:
-            st.append(st[i-1])
-    return pd.Series(st)
+    last = np.maximum.accumulate(np.where(changed, np.arange(n), 0))
+    return pd.Series(values[last])
 # ---------------------------------------------------------
 # 13. Unified indicator analysis for analyzer.py
 # ---------------------------------------------------------
 
 def calculate_indicators(df):
     close = df["close"]
+    fx = features(df)
 
     # MA Trend
-    ema20 = ema(close, 20)
-    ema50 = ema(close, 50)
+    ema20 = fx.get(("ema", 20), ema, close, 20)
+    ema50 = fx.get(("ema", 50), ema, close, 50)
 
     if ema20.iloc[-1] > ema50.iloc[-1]:
         trend = "up"
@@ -164,13 +178,13 @@ def calculate_indicators(df):
         trend = "sideways"
 
     # MACD
-    macd_line, signal_line, histogram = macd(close)
+    macd_line, signal_line, histogram = fx.get(("macd", 12, 26, 9), macd, close)
 
-    # RSI
-    rsi_value = rsi(close).iloc[-1]
+    # RSI (тот же ряд читает divergence)
+    rsi_value = fx.get(("rsi", 14), rsi, close, 14).iloc[-1]
 
     # Supertrend
-    st = supertrend(df).iloc[-1]
+    st = fx.get(("supertrend", 10, 3), supertrend, df).iloc[-1]
 
     return {
         "trend": trend,
@@ -1,22 +1,18 @@
 import pandas as pd
 import numpy as np
 
+from core.features import features
+
 
 def mfi(df, period=14):
     """Money Flow Index"""
-    typical_price = (df.high + df.low + df.close) / 3
-    money_flow = typical_price * df.volume
-
-    positive_flow = []
-    negative_flow = []
+    typical_price = ((df.high + df.low + df.close) / 3).to_numpy(dtype=float)
+    money_flow = typical_price * df.volume.to_numpy(dtype=float)
 
-    for i in range(1, len(typical_price)):
-        if typical_price.iloc[i] > typical_price.iloc[i - 1]:
-            positive_flow.append(money_flow.iloc[i])
-            negative_flow.append(0)
-        else:
-            positive_flow.append(0)
-            negative_flow.append(money_flow.iloc[i])
+    # поток свечи идёт в плюс, если typical price вырос, иначе в минус
+    rising = typical_price[1:] > typical_price[:-1]
+    positive_flow = np.where(rising, money_flow[1:], 0.0)
+    negative_flow = np.where(rising, 0.0, money_flow[1:])
 
     pos_mf = pd.Series(positive_flow).rolling(period).sum()
     neg_mf = pd.Series(negative_flow).rolling(period).sum()
@@ -63,10 +59,11 @@ def moneyflow_signal(df):
     - neutral
     """
 
-    mfi_val = mfi(df).iloc[-1]
-    vwap_val = vwap(df).iloc[-1]
+    fx = features(df)
+    mfi_val = fx.get(("mfi", 14), mfi, df).iloc[-1]
+    vwap_val = fx.get("vwap", vwap, df).iloc[-1]
     price = df.close.iloc[-1]
-    mp = money_pressure(df)
+    mp = fx.get(("money_pressure", 20), money_pressure, df)
 
     # Сильный сигнал на покупку
     if mfi_val > 60 and price > vwap_val and mp == "positive":
@@ -94,11 +91,12 @@ def analyze_moneyflow(df):
     """
 
     try:
-        mfi_val = mfi(df).iloc[-1]
-        vwap_val = vwap(df).iloc[-1]
+        fx = features(df)
+        mfi_val = fx.get(("mfi", 14), mfi, df).iloc[-1]
+        vwap_val = fx.get("vwap", vwap, df).iloc[-1]
         price = df.close.iloc[-1]
-        mp = money_pressure(df)  # positive / negative / neutral
-        signal = moneyflow_signal(df)
+        mp = fx.get(("money_pressure", 20), money_pressure, df)  # positive / negative / neutral
+        signal = moneyflow_signal(df)  # берёт mfi/vwap/pressure из того же FeatureFrame
 
         # Логика направления потока
         if mp == "positive" or mfi_val > 55:
@@ -0,0 +1,220 @@
+import os
+import queue
+import threading
+import time
+
+from core.httpclient import TokenBucket, http_post, retry_after_seconds
+from core.metrics import counter, gauge
+
+# =============================
+# НАСТРОЙКИ
+# =============================
+# Telegram: не больше ~1 сообщения в секунду в чат и ~20 в минуту в группу
+TELEGRAM_CHAT_RPM = float(os.getenv("TELEGRAM_CHAT_RPM", "20"))
+TELEGRAM_CHAT_BURST = int(os.getenv("TELEGRAM_CHAT_BURST", "3"))
+TELEGRAM_RETRIES = int(os.getenv("TELEGRAM_RETRIES", "5"))
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", "1000"))
+# 1 — алерты одного цикла уходят одним сообщением (flush в конце цикла)
+TELEGRAM_COALESCE = os.getenv("TELEGRAM_COALESCE", "0") == "1"
+# склеенное сообщение уходит не позже, даже если flush не вызвали (цикл упал)
+TELEGRAM_COALESCE_MAX_WAIT = float(os.getenv("TELEGRAM_COALESCE_MAX_WAIT", "30"))
+
+MAX_MESSAGE_LEN = 4096
+COALESCE_SEPARATOR = "\n\n━━━━━━━━━━\n\n"
+
+MESSAGES = counter("telegram_messages_total", "Сообщения Telegram по исходу", ("result",))
+QUEUE_DEPTH = gauge("telegram_queue_depth", "Сообщений в очереди на отправку")
+
+
+def split_text(text, limit=MAX_MESSAGE_LEN):
+    """Куски не длиннее limit; режем по переводу строки, если он есть."""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind("\n", 0, limit)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip("\n")
+    if text:
+        parts.append(text)
+    return parts
+
+
+def pack_messages(texts, limit=MAX_MESSAGE_LEN, separator=COALESCE_SEPARATOR):
+    """Склеить тексты в как можно меньше сообщений не длиннее limit."""
+    packed = []
+    current = ""
+    for text in texts:
+        for part in split_text(text, limit):
+            if not current:
+                current = part
+            elif len(current) + len(separator) + len(part) <= limit:
+                current += separator + part
+            else:
+                packed.append(current)
+                current = part
+    if current:
+        packed.append(current)
+    return packed
+
+
+class TelegramNotifier:
+    """
+    Очередь исходящих сообщений с фоновым отправителем.
+    send() только кладёт текст в очередь и сразу возвращается; поток-отправитель
+    держит темп по каждому чату (TokenBucket), повторяет 429/5xx/обрывы
+    с паузой и режет тексты длиннее 4096 символов.
+    """
+
+    def __init__(self, url, chat_id,
+                 chat_rpm=TELEGRAM_CHAT_RPM,
+                 chat_burst=TELEGRAM_CHAT_BURST,
+                 retries=TELEGRAM_RETRIES,
+                 queue_size=TELEGRAM_QUEUE_SIZE,
+                 coalesce=TELEGRAM_COALESCE,
+                 coalesce_max_wait=TELEGRAM_COALESCE_MAX_WAIT):
+        self.url = url
+        self.chat_id = chat_id
+        self.chat_rate = chat_rpm / 60.0
+        self.chat_burst = chat_burst
+        self.retries = retries
+        self.coalesce = coalesce
+        self.coalesce_max_wait = coalesce_max_wait
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._buckets = {}
+        self._pending = {}
+        self._pending_since = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    # ---------- производители ----------
+
+    def send(self, text, chat_id=None, coalesce=False):
+        """
+        Поставить сообщение в очередь. Никогда не блокирует.
+        coalesce=True — отложить до flush() и склеить с другими (если включено).
+        False — очередь переполнена, сообщение отброшено.
+        """
+        chat_id = chat_id or self.chat_id
+        if coalesce and self.coalesce:
+            with self._lock:
+                self._pending.setdefault(chat_id, []).append(text)
+                if self._pending_since is None:
+                    self._pending_since = time.monotonic()
+            self._ensure_started()
+            return True
+
+        ok = True
+        for part in split_text(text):
+            ok = self._enqueue(chat_id, part) and ok
+        return ok
+
+    def flush(self):
+        """Отправить отложенные (coalesce) сообщения — вызывается в конце цикла."""
+        with self._lock:
+            pending, self._pending, self._pending_since = self._pending, {}, None
+        for chat_id, texts in pending.items():
+            for message in pack_messages(texts):
+                self._enqueue(chat_id, message)
+
+    def wait_idle(self, timeout=None):
+        """Дождаться, пока очередь опустеет. True — успели за timeout."""
+        q = self._queue
+        with q.all_tasks_done:
+            return q.all_tasks_done.wait_for(lambda: q.unfinished_tasks == 0, timeout)
+
+    def stop(self, timeout=10):
+        self.flush()
+        if self._thread and self._thread.is_alive():
+            self.wait_idle(timeout)
+
+    # ---------- отправитель ----------
+
+    def _enqueue(self, chat_id, text):
+        try:
+            self._queue.put_nowait((chat_id, text))
+        except queue.Full:
+            MESSAGES.inc(result="dropped")
+            print("[TELEGRAM] queue full, message dropped", flush=True)
+            return False
+        QUEUE_DEPTH.set(self._queue.qsize())
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="telegram-sender", daemon=True)
+                self._thread.start()
+
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _flush_stale(self):
+        since = self._pending_since
+        if since is not None and time.monotonic() - since >= self.coalesce_max_wait:
+            self.flush()
+
+    def _run(self):
+        while True:
+            try:
+                chat_id, text = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                self._flush_stale()
+                continue
+            try:
+                self._deliver(chat_id, text)
+            except Exception as e:
+                MESSAGES.inc(result="failed")
+                print("[TELEGRAM] send error:", e, flush=True)
+            finally:
+                self._queue.task_done()
+                QUEUE_DEPTH.set(self._queue.qsize())
+            self._flush_stale()
+
+    def _deliver(self, chat_id, text):
+        bucket = self._bucket(chat_id)
+        for attempt in range(self.retries + 1):
+            wait = bucket.reserve()
+            if wait > 0:
+                time.sleep(wait)
+
+            resp = None
+            try:
+                # 429 не повторяем внутри http_post: паузу выждет корзина чата
+                resp = http_post(self.url, data={"chat_id": chat_id, "text": text, "parse_mode": "HTML"},
+                                 max_429_retries=0)
+            except Exception as e:
+                print("[TELEGRAM] request error:", e, flush=True)
+
+            if resp is not None and resp.status_code == 200:
+                MESSAGES.inc(result="sent")
+                return True
+
+            # 4xx (кроме 429) — повтор не поможет: неверный HTML, чат, токен
+            if resp is not None and resp.status_code != 429 and resp.status_code < 500:
+                MESSAGES.inc(result="rejected")
+                print(f"[TELEGRAM] HTTP {resp.status_code}: {resp.text[:200]}", flush=True)
+                return False
+
+            if attempt == self.retries:
+                break
+
+            MESSAGES.inc(result="retried")
+            if resp is not None and resp.status_code == 429:
+                try:
+                    body = resp.json()
+                except ValueError:
+                    body = None
+                # пауза ляжет на корзину чата — следующий reserve() её выждет
+                bucket.penalize(retry_after_seconds(resp.headers, body, attempt))
+            else:
+                time.sleep(min(60.0, 2.0 ** attempt))
+
+        MESSAGES.inc(result="failed")
+        print("[TELEGRAM] giving up after retries", flush=True)
+        return False
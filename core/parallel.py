@@ -0,0 +1,162 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from core.analyzer import analyze_frame
+from core.datasource import get_ohlcv
+
+# =============================
+# АНАЛИЗ В ПУЛЕ ПРОЦЕССОВ
+# =============================
+# analyze_symbol после загрузки свечей — чистый CPU (pandas и циклы Python
+# в SuperTrend / OBV / MFI), потоки упираются в GIL. Здесь задачи
+# (symbol, tf) раскладываются по процессам по числу доступных ядер.
+#
+# Свечи всех задач кладутся одним блоком shared memory (float64, строки
+# [timestamp, open, high, low, close, volume] подряд). В процесс уходят
+# только имя блока и (смещение, длина) — DataFrame строится поверх общего
+# буфера, без pickle свечей. Результаты отдаются по мере готовности.
+
+COLUMNS = ("open", "high", "low", "close", "volume")
+ROW_WIDTH = 1 + len(COLUMNS)
+
+FETCH_WORKERS = 8           # потоков на get_ohlcv (сеть)
+TASKS_PER_WORKER = 4        # задач на процесс: мельче — ровнее загрузка, крупнее — меньше накладных
+
+
+def available_cores():
+    """Ядра, доступные процессу (учитывает taskset / cgroup cpuset)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class SharedFrames:
+    """
+    Свечи нескольких рядов в одном блоке shared memory.
+    with SharedFrames(frames) as shared: shared.name, shared.rows, shared.slices[i] = (start, n)
+    """
+
+    def __init__(self, frames):
+        self.rows = sum(len(df) for df in frames)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, self.rows) * ROW_WIDTH * 8)
+        self.name = self.shm.name
+        buf = np.ndarray((self.rows, ROW_WIDTH), dtype=np.float64, buffer=self.shm.buf)
+
+        self.slices = []
+        pos = 0
+        for df in frames:
+            n = len(df)
+            buf[pos:pos + n, 0] = df.index.to_numpy(dtype=np.float64)
+            buf[pos:pos + n, 1:] = df[list(COLUMNS)].to_numpy(dtype=np.float64)
+            self.slices.append((pos, n))
+            pos += n
+        del buf     # иначе close() не отпустит буфер
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------
+# Процесс-исполнитель
+# ---------------------------------------------------------
+_attached = {}
+
+
+def _attach(name):
+    # resource_tracker у процессов пула общий с родителем (fork и spawn),
+    # регистрацию блока снимает unlink() в родителе — здесь только close()
+    shm = _attached.get(name)
+    if shm is None:
+        # блок прошлого вызова больше не нужен
+        for old in list(_attached):
+            _attached.pop(old).close()
+        shm = _attached[name] = shared_memory.SharedMemory(name=name)
+    return shm
+
+
+def frame_from_shared(name, rows, start, n):
+    """DataFrame как у get_ohlcv поверх общего блока (одна копия в памяти процесса, без pickle)."""
+    block = np.ndarray((rows, ROW_WIDTH), dtype=np.float64, buffer=_attach(name).buf)
+    part = block[start:start + n]
+    return pd.DataFrame(
+        part[:, 1:].copy(),
+        index=pd.Index(part[:, 0].astype(np.int64), name="timestamp"),
+        columns=list(COLUMNS),
+    )
+
+
+def _analyze_chunk(name, rows, items):
+    """items: [(index задачи, start, n)] → [(index задачи, результат)]."""
+    return [(i, analyze_frame(frame_from_shared(name, rows, start, n))) for i, start, n in items]
+
+
+# ---------------------------------------------------------
+# Публичные функции
+# ---------------------------------------------------------
+
+def _fetch(job):
+    symbol, tf = job
+    try:
+        return get_ohlcv(symbol, tf)
+    except Exception as e:
+        return e
+
+
+def analyze_parallel(jobs, workers=None, frames=None, chunk=None, fetch_workers=FETCH_WORKERS):
+    """
+    jobs — [(symbol, tf), ...]. Генератор ((symbol, tf), результат) в порядке
+    готовности; результат — как у analyze_symbol.
+    frames — {(symbol, tf): DataFrame}, если свечи уже на руках;
+    остальные загружаются get_ohlcv в потоках (сеть, кэш до закрытия свечи).
+    """
+    jobs = list(dict.fromkeys((s.upper(), tf) for s, tf in jobs))
+    frames = {(s.upper(), tf): df for (s, tf), df in (frames or {}).items()}
+    workers = workers or available_cores()
+
+    # 1. свечи: недостающие — параллельно, это ожидание сети
+    missing = [job for job in jobs if job not in frames]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(fetch_workers, len(missing)), thread_name_prefix="analyze-fetch") as pool:
+            for job, df in zip(missing, pool.map(_fetch, missing)):
+                frames[job] = df
+
+    ready = []
+    for job in jobs:
+        df = frames.get(job)
+        if isinstance(df, Exception):
+            yield job, {"error": str(df)}
+        elif df is None or len(df) < 20:
+            yield job, {"error": "Недостаточно данных"}
+        else:
+            ready.append(job)
+    if not ready:
+        return
+
+    # 2. один блок shared memory на все ряды, задачи — пачками индексов
+    with SharedFrames([frames[job] for job in ready]) as shared:
+        items = [(i, start, n) for i, (start, n) in enumerate(shared.slices)]
+        size = chunk or max(1, len(items) // (workers * TASKS_PER_WORKER))
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [pool.submit(_analyze_chunk, shared.name, shared.rows, part) for part in chunks]
+            for future in as_completed(futures):
+                for i, result in future.result():
+                    yield ready[i], result
+
+
+def analyze_all(jobs, workers=None, frames=None):
+    """analyze_parallel целиком: {(symbol, tf): результат}."""
+    return dict(analyze_parallel(jobs, workers=workers, frames=frames))
@@ -1,5 +1,8 @@
 import pandas as pd
 
+from core.features import features
+from core.indicators import sma
+
 def detect_market_phase(df):
     """
     Определяем фазу рынка:
@@ -10,10 +13,11 @@ def detect_market_phase(df):
     """
 
     close = df["close"]
+    fx = features(df)
 
     # Скользящие средние
-    sma20 = close.rolling(20).mean()
-    sma50 = close.rolling(50).mean()
+    sma20 = fx.get(("sma", 20), sma, close, 20)
+    sma50 = fx.get(("sma", 50), sma, close, 50)
 
     last = len(close) - 1
 
@@ -0,0 +1,213 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+from core.metrics import counter, histogram
+
+# =============================
+# ПЛАНИРОВЩИК ЗАДАЧ
+# =============================
+# Каждая задача — своё расписание (триггер) и свой поток на запуск.
+# Время — unix-секунды; расписание считается от часов, а не от конца
+# прошлого запуска, поэтому не «уплывает» на длительность цикла.
+#
+# Догон (catch_up): если плановый момент уже прошёл (рестарт, долгий
+# предыдущий запуск, сон машины), задача всё равно запускается — при
+# условии, что опоздание не больше catch_up. Несколько пропущенных
+# запусков подряд схлопываются в один, за самый поздний слот.
+#
+# Джиттер: к плановому моменту добавляется случайная задержка 0..jitter,
+# чтобы задачи разных ботов не били в API в одну и ту же секунду.
+
+EPOCH = datetime(1970, 1, 1)
+
+# запуск позже плана меньше чем на столько — не считается пропуском даже при catch_up=0
+MISFIRE_GRACE_SEC = 5.0
+# дольше не спим — переживаем перевод часов и сон машины
+MAX_IDLE_SEC = 60.0
+
+JOB_RUNS = counter("scheduler_job_runs_total", "Запуски задач планировщика по исходу", ("job", "result"))
+JOB_LAG = histogram("scheduler_job_lag_seconds", "Опоздание запуска относительно расписания", ("job",),
+                    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0))
+
+
+def to_datetime(ts, utc_offset_hours=0):
+    """unix-время → naive datetime в поясе UTC+utc_offset_hours."""
+    return EPOCH + timedelta(seconds=ts, hours=utc_offset_hours)
+
+
+def to_timestamp(dt, utc_offset_hours=0):
+    return (dt - timedelta(hours=utc_offset_hours) - EPOCH).total_seconds()
+
+
+# ---------------------------------------------------------
+# Триггеры
+# ---------------------------------------------------------
+# previous(t) — последний плановый момент не позже t
+# next(t)     — первый плановый момент строго позже t
+
+class Every:
+    """Каждые period секунд по границам эпохи (границы свечей) + offset."""
+
+    def __init__(self, period, offset=0.0):
+        self.period = float(period)
+        self.offset = float(offset)
+
+    def previous(self, t):
+        return (t - self.offset) // self.period * self.period + self.offset
+
+    def next(self, t):
+        return self.previous(t) + self.period
+
+
+class At:
+    """
+    В hour:minute по времени UTC+utc_offset_hours: каждый день,
+    либо раз в неделю, если задан weekday (0 — понедельник).
+    """
+
+    def __init__(self, hour, minute=0, weekday=None, utc_offset_hours=0):
+        self.hour = hour
+        self.minute = minute
+        self.weekday = weekday
+        self.utc_offset_hours = utc_offset_hours
+        self.step = timedelta(days=1 if weekday is None else 7)
+
+    def previous(self, t):
+        local = to_datetime(t, self.utc_offset_hours)
+        slot = local.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if self.weekday is not None:
+            slot -= timedelta(days=(slot.weekday() - self.weekday) % 7)
+        if slot > local:
+            slot -= self.step
+        return to_timestamp(slot, self.utc_offset_hours)
+
+    def next(self, t):
+        return self.previous(t) + self.step.total_seconds()
+
+
+# ---------------------------------------------------------
+# Задачи
+# ---------------------------------------------------------
+
+class Job:
+
+    def __init__(self, name, fn, trigger, catch_up=0.0, jitter=0.0):
+        self.name = name
+        self.fn = fn                # fn(slot) — slot: плановое unix-время запуска
+        self.trigger = trigger
+        self.catch_up = catch_up    # сек: насколько можно опоздать и всё же запуститься
+        self.jitter = jitter        # сек: случайная добавка к плановому моменту
+        self.slot = None            # ближайший плановый момент
+        self.due = None             # slot + джиттер — когда реально запускать
+        self.thread = None
+
+
+class Scheduler:
+    """
+    sched.add("radar", fn, Every(600, offset=20), catch_up=300, jitter=5)
+    sched.run_forever()   # блокирует; stop() из другого потока
+    Задача, предыдущий запуск которой ещё идёт, пропускает слот (без наложений).
+    """
+
+    def __init__(self, on_error=None, clock=time.time):
+        self.jobs = []
+        self.on_error = on_error    # on_error(job_name, exc)
+        self.clock = clock
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def add(self, name, fn, trigger, catch_up=0.0, jitter=0.0):
+        job = Job(name, fn, trigger, catch_up, jitter)
+        with self._lock:
+            self.jobs.append(job)
+            self._plan_first(job, self.clock())
+        return job
+
+    def _plan(self, job, slot):
+        job.slot = slot
+        job.due = slot + (random.uniform(0.0, job.jitter) if job.jitter else 0.0)
+
+    def _plan_first(self, job, now):
+        # при старте догоняем слот, пропущенный пока бот не работал
+        prev = job.trigger.previous(now)
+        if job.catch_up and now - prev <= job.catch_up:
+            self._plan(job, prev)
+        else:
+            self._plan(job, job.trigger.next(now))
+
+    def _tolerance(self, job):
+        return max(job.catch_up, MISFIRE_GRACE_SEC) + job.jitter
+
+    def _fire(self, job, now):
+        # пропущенные подряд слоты схлопываются в последний
+        slot = max(job.slot, job.trigger.previous(now))
+        lag = now - slot
+
+        if lag > self._tolerance(job):
+            JOB_RUNS.inc(job=job.name, result="missed")
+            print(f"[SCHED] {job.name}: slot missed by {lag:.0f}s", flush=True)
+        elif job.thread is not None and job.thread.is_alive():
+            JOB_RUNS.inc(job=job.name, result="overlap")
+            print(f"[SCHED] {job.name}: previous run still active, slot skipped", flush=True)
+        else:
+            JOB_LAG.observe(max(0.0, lag), job=job.name)
+            job.thread = threading.Thread(target=self._run, args=(job, slot), name=f"job-{job.name}", daemon=True)
+            job.thread.start()
+
+        self._plan(job, job.trigger.next(slot))
+
+    def _run(self, job, slot):
+        try:
+            job.fn(slot)
+            JOB_RUNS.inc(job=job.name, result="ok")
+        except Exception as e:
+            JOB_RUNS.inc(job=job.name, result="error")
+            print(f"[SCHED] {job.name} error:", e, flush=True)
+            if self.on_error:
+                try:
+                    self.on_error(job.name, e)
+                except Exception as hook_error:
+                    print("[SCHED] on_error failed:", hook_error, flush=True)
+
+    def run_now(self, name, fn=None):
+        """
+        Внеочередной запуск задачи (расписание не сдвигается); fn — вместо job.fn.
+        False — нет такой задачи или она ещё работает.
+        """
+        with self._lock:
+            job = next((j for j in self.jobs if j.name == name), None)
+            if job is None:
+                return False
+            if job.thread is not None and job.thread.is_alive():
+                JOB_RUNS.inc(job=job.name, result="overlap")
+                return False
+            run = Job(job.name, fn or job.fn, job.trigger)
+            job.thread = threading.Thread(target=self._run, args=(run, self.clock()), name=f"job-{name}", daemon=True)
+            job.thread.start()
+            return True
+
+    def run_pending(self):
+        """Запустить всё, что пора. Возвращает секунды до следующего запуска."""
+        with self._lock:
+            now = self.clock()
+            for job in self.jobs:
+                if job.due <= now:
+                    self._fire(job, now)
+            if not self.jobs:
+                return MAX_IDLE_SEC
+            return max(0.0, min(job.due for job in self.jobs) - self.clock())
+
+    def run_forever(self):
+        self._stop.clear()
+        while not self._stop.is_set():
+            self._stop.wait(min(self.run_pending(), MAX_IDLE_SEC))
+
+    def stop(self):
+        self._stop.set()
+
+    def next_runs(self):
+        """{имя: плановое unix-время ближайшего запуска}."""
+        with self._lock:
+            return {job.name: job.slot for job in self.jobs}
@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import threading
+
+# =============================
+# STATE В SQLITE (WAL)
+# =============================
+# Тот же dict, что раньше лежал в crypto_radar_state.json, по строкам:
+#   coins(id, data) — одна строка на монету (state["coins"][id])
+#   kv(key, value)  — остальные ключи верхнего уровня (stats, market_regime, ...)
+# Значения — JSON. save() пишет только строки, изменившиеся с прошлого
+# load()/save(), одной транзакцией: после падения в базе либо старое
+# состояние целиком, либо новое.
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+class StateStore:
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self.legacy_json = legacy_json
+        self._lock = threading.Lock()
+        # что лежит в базе сейчас: {("kv", key) | ("coin", id): json}
+        self._saved = {}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS coins (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def _is_empty(self):
+        row = self._conn.execute(
+            "SELECT (SELECT COUNT(*) FROM kv) + (SELECT COUNT(*) FROM coins)"
+        ).fetchone()
+        return row[0] == 0
+
+    def _migrate_legacy(self):
+        """Первый запуск: перенести прежний JSON-файл (сам файл не трогаем)."""
+        if not self.legacy_json or not os.path.exists(self.legacy_json):
+            return
+        try:
+            with open(self.legacy_json, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print("[STATE] legacy json unreadable:", e, flush=True)
+            return
+        if not isinstance(data, dict):
+            return
+        self._write(data)
+        coins = data.get("coins")
+        print(f"[STATE] migrated {self.legacy_json}: {len(coins) if isinstance(coins, dict) else 0} coins", flush=True)
+
+    def load(self):
+        with self._lock:
+            if self._is_empty():
+                self._migrate_legacy()
+
+            state = {}
+            saved = {}
+            for key, value in self._conn.execute("SELECT key, value FROM kv"):
+                state[key] = json.loads(value)
+                saved[("kv", key)] = value
+
+            coins = {}
+            for cid, data in self._conn.execute("SELECT id, data FROM coins"):
+                coins[cid] = json.loads(data)
+                saved[("coin", cid)] = data
+            if coins or "coins" not in state:
+                state["coins"] = coins
+
+            self._saved = saved
+            return state
+
+    def save(self, data):
+        """Записать изменения относительно базы. Возвращает число изменённых строк."""
+        with self._lock:
+            return self._write(data)
+
+    def _write(self, data):
+        rows = {}
+        coins = data.get("coins")
+        for key, value in data.items():
+            if key == "coins" and isinstance(coins, dict):
+                continue
+            rows[("kv", key)] = _dump(value)
+        if isinstance(coins, dict):
+            for cid, value in coins.items():
+                rows[("coin", str(cid))] = _dump(value)
+
+        changed = [(k, v) for k, v in rows.items() if self._saved.get(k) != v]
+        removed = [k for k in self._saved if k not in rows]
+        if not changed and not removed:
+            return 0
+
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for (table, key), value in changed:
+                if table == "kv":
+                    conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value))
+                else:
+                    conn.execute("INSERT OR REPLACE INTO coins (id, data) VALUES (?, ?)", (key, value))
+            for table, key in removed:
+                if table == "kv":
+                    conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                else:
+                    conn.execute("DELETE FROM coins WHERE id = ?", (key,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        for k, v in changed:
+            self._saved[k] = v
+        for k in removed:
+            del self._saved[k]
+        return len(changed) + len(removed)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
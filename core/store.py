@@ -0,0 +1,132 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# =============================
+# ЛОКАЛЬНОЕ ХРАНИЛИЩЕ СВЕЧЕЙ
+# =============================
+# Один файл на ряд: <root>/<source>/<SYMBOL>_<tf>.f64
+# Внутри — подряд записанные строки float64:
+#   timestamp, open, high, low, close, volume
+# Файл только дописывается; исключение — последняя строка,
+# её перезаписываем, пока свеча не закрылась.
+
+COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+ROW_BYTES = len(COLUMNS) * 8
+
+
+class CandleStore:
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, source, symbol, tf):
+        return os.path.join(self.root, source, f"{symbol.upper()}_{tf}.f64")
+
+    def rows(self, source, symbol, tf):
+        path = self.path(source, symbol, tf)
+        if not os.path.exists(path):
+            return 0
+        # недописанный хвост (обрыв при записи) не считаем
+        return os.path.getsize(path) // ROW_BYTES
+
+    def last_ts(self, source, symbol, tf):
+        """Timestamp последней сохранённой свечи (сек) или None."""
+        n = self.rows(source, symbol, tf)
+        if n == 0:
+            return None
+        with open(self.path(source, symbol, tf), "rb") as f:
+            f.seek((n - 1) * ROW_BYTES)
+            row = np.frombuffer(f.read(ROW_BYTES), dtype=np.float64)
+        return int(row[0])
+
+    def _memmap(self, source, symbol, tf, limit=None):
+        n = self.rows(source, symbol, tf)
+        if n == 0:
+            return np.empty((0, len(COLUMNS)))
+        mm = np.memmap(self.path(source, symbol, tf), dtype=np.float64, mode="r", shape=(n, len(COLUMNS)))
+        return mm if limit is None else mm[max(0, n - limit):]
+
+    def open_arrays(self, source, symbol, tf, limit=None):
+        """
+        Колонки ряда как read-only numpy.memmap: {"timestamp": ..., "open": ..., ...}.
+        Ничего не копируется и не десериализуется: страницы файла общие
+        для всех процессов, открывших тот же ряд. Длина фиксируется в момент
+        открытия — новые свечи видны после повторного вызова.
+        """
+        mm = self._memmap(source, symbol, tf, limit)
+        return {col: mm[:, i] for i, col in enumerate(COLUMNS)}
+
+    def frame(self, source, symbol, tf, limit=None):
+        """
+        DataFrame поверх memmap без копирования (индекс timestamp — float64).
+        Только для чтения. Последняя строка может перезаписаться,
+        пока её свеча не закрылась.
+        """
+        mm = self._memmap(source, symbol, tf, limit)
+        df = pd.DataFrame(mm[:, 1:], columns=list(COLUMNS[1:]), copy=False)
+        df.index = pd.Index(mm[:, 0], name="timestamp", copy=False)
+        return df
+
+    def read(self, source, symbol, tf, limit=None):
+        """
+        Последние limit свечей (все, если None) как DataFrame с индексом timestamp.
+        Независимая копия: её можно кэшировать, даже если хвост файла потом перезапишется.
+        """
+        n = self.rows(source, symbol, tf)
+        start = 0 if limit is None else max(0, n - limit)
+        if n == 0:
+            data = np.empty((0, len(COLUMNS)))
+        else:
+            data = np.fromfile(
+                self.path(source, symbol, tf),
+                dtype=np.float64,
+                count=(n - start) * len(COLUMNS),
+                offset=start * ROW_BYTES,
+            ).reshape(-1, len(COLUMNS))
+
+        df = pd.DataFrame(data[:, 1:], columns=list(COLUMNS[1:]))
+        df.index = pd.Index(data[:, 0].astype("int64"), name="timestamp")
+        return df
+
+    def merge(self, source, symbol, tf, df):
+        """
+        Дописать свечи из df (индекс — timestamp в секундах).
+        Свеча с тем же timestamp, что и последняя сохранённая, перезаписывает её,
+        более старые игнорируются. Возвращает число записанных строк.
+        """
+        if df is None or len(df) == 0:
+            return 0
+
+        new = np.column_stack([
+            np.asarray(df.index, dtype=np.float64),
+            *(df[col].to_numpy(dtype=np.float64) for col in COLUMNS[1:]),
+        ])
+        new = new[np.argsort(new[:, 0], kind="stable")]
+        # дубликаты timestamp внутри ответа — берём последний
+        keep = np.append(new[1:, 0] != new[:-1, 0], True)
+        new = new[keep]
+
+        path = self.path(source, symbol, tf)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            last = self.last_ts(source, symbol, tf)
+            n = self.rows(source, symbol, tf)
+
+            with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+                f.truncate(n * ROW_BYTES)
+                if last is None:
+                    rows = new
+                    f.seek(0)
+                else:
+                    rows = new[new[:, 0] >= last]
+                    if len(rows) and int(rows[0, 0]) == last:
+                        f.seek((n - 1) * ROW_BYTES)
+                    else:
+                        f.seek(n * ROW_BYTES)
+                f.write(rows.tobytes())
+
+        return len(rows)
@@ -0,0 +1,342 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import aiohttp
+import pandas as pd
+
+from core.metrics import counter, gauge
+
+# =============================
+# WEBSOCKET-СВЕЧИ (Bybit / Binance)
+# =============================
+# Подписка на kline-стрим по списку символов; последние window свечей
+# каждого символа держим в памяти. Обрыв или тишина — переподключение
+# с растущей паузой. Если после обрыва (или при первом запуске) в ряду
+# дыра, недостающие свечи добираются по REST через backfill(symbol, tf, start).
+# Стрим живёт в своём потоке со своим event loop.
+
+STREAM_URLS = {
+    "bybit": "wss://stream.bybit.com/v5/public/linear",
+    "binance": "wss://stream.binance.com:9443/ws",
+}
+
+# названия интервалов в топиках бирж
+INTERVALS = {
+    "bybit": {"1m": "1", "3m": "3", "5m": "5", "15m": "15", "30m": "30", "1h": "60", "4h": "240", "1d": "D"},
+    "binance": {tf: tf for tf in ("1m", "3m", "5m", "15m", "30m", "1h", "4h", "1d")},
+}
+
+TF_SECONDS = {"1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800, "1h": 3600, "4h": 14400, "1d": 86400}
+
+STREAM_WINDOW = int(os.getenv("STREAM_WINDOW", "200"))          # свечей на символ в памяти
+STREAM_STALE_SEC = float(os.getenv("STREAM_STALE_SEC", "90"))   # столько без сообщений — переподключаемся
+STREAM_PING_SEC = 20                                            # Bybit просит ping раз в 20 сек
+STREAM_BACKOFF_MAX = 60.0
+BACKFILL_RETRY_SEC = 10.0                                       # REST не удался — повтор не раньше
+SUBSCRIBE_CHUNK = 10                                            # топиков в одном subscribe
+
+STREAM_MESSAGES = counter("stream_messages_total", "Сообщения kline-стрима", ("exchange",))
+STREAM_RECONNECTS = counter("stream_reconnects_total", "Переподключения kline-стрима", ("exchange",))
+STREAM_BACKFILLS = counter("stream_backfills_total", "REST-добор свечей после дыр", ("exchange", "result"))
+STREAM_CONNECTED = gauge("stream_connected", "Kline-стрим подключён (1/0)", ("exchange",))
+
+
+# ---------------------------------------------------------
+# Протоколы бирж
+# ---------------------------------------------------------
+# bar = (ts_open_sec, open, high, low, close, volume, closed)
+
+def subscribe_messages(exchange, symbols, tf):
+    interval = INTERVALS[exchange][tf]
+    messages = []
+    for i in range(0, len(symbols), SUBSCRIBE_CHUNK):
+        chunk = symbols[i:i + SUBSCRIBE_CHUNK]
+        if exchange == "bybit":
+            messages.append({"op": "subscribe", "args": [f"kline.{interval}.{s}" for s in chunk]})
+        else:
+            messages.append({"method": "SUBSCRIBE", "params": [f"{s.lower()}@kline_{interval}" for s in chunk], "id": i + 1})
+    return messages
+
+
+def parse_bybit(msg):
+    topic = msg.get("topic") or ""
+    if not topic.startswith("kline."):
+        return []   # ответы на subscribe / pong
+    symbol = topic.rsplit(".", 1)[-1]
+    bars = []
+    for k in msg.get("data") or []:
+        bars.append((symbol, (
+            int(k["start"]) // 1000,
+            float(k["open"]), float(k["high"]), float(k["low"]), float(k["close"]),
+            float(k["volume"]),
+            bool(k.get("confirm")),
+        )))
+    return bars
+
+
+def parse_binance(msg):
+    if "data" in msg:
+        msg = msg["data"]   # комбинированный стрим /stream?streams=...
+    if msg.get("e") != "kline":
+        return []
+    k = msg["k"]
+    return [(k["s"], (
+        int(k["t"]) // 1000,
+        float(k["o"]), float(k["h"]), float(k["l"]), float(k["c"]),
+        float(k["v"]),
+        bool(k["x"]),
+    ))]
+
+
+PARSERS = {"bybit": parse_bybit, "binance": parse_binance}
+
+
+# ---------------------------------------------------------
+# Свечи в памяти
+# ---------------------------------------------------------
+
+class CandleBuffer:
+    """Последние window свечей одного символа: {ts: (o, h, l, c, v)}."""
+
+    def __init__(self, step, window=STREAM_WINDOW):
+        self.step = step
+        self.window = window
+        self.rows = {}
+        self.updated = 0.0      # time.time() последнего обновления из стрима
+        # откуда добирать по REST: None — ряд непрерывен, 0 — истории ещё нет,
+        # иначе ts первой пропущенной (или недополученной) свечи
+        self.missing_from = None
+        self.last_closed = False    # пришло ли закрытие последней свечи
+
+    def last_ts(self):
+        return max(self.rows) if self.rows else None
+
+    def update(self, bar):
+        """Записать свечу из стрима (текущую — поверх прошлого обновления)."""
+        ts, o, h, l, c, v, closed = bar
+        last = self.last_ts()
+        if last is None:
+            self.missing_from = 0
+        elif ts > last:
+            # закрытие прошлой свечи не дошло (обрыв) — в ней промежуточные значения
+            start = last if not self.last_closed else last + self.step
+            if ts > start and (self.missing_from is None or start < self.missing_from):
+                self.missing_from = start
+        if last is None or ts >= last:
+            self.last_closed = closed
+        self.rows[ts] = (o, h, l, c, v)
+        self.updated = time.time()
+        self._trim()
+
+    def merge(self, df):
+        """Свечи из REST. Текущую свечу стрима не трогаем — она свежее."""
+        last = self.last_ts()
+        for ts, row in zip(df.index, df[["open", "high", "low", "close", "volume"]].itertuples(index=False)):
+            ts = int(ts)
+            if last is not None and ts >= last:
+                continue
+            self.rows[ts] = tuple(float(x) for x in row)
+        self._trim()
+        if not self.has_gaps():
+            self.missing_from = None
+
+    def _trim(self):
+        extra = len(self.rows) - self.window
+        if extra > 0:
+            for ts in sorted(self.rows)[:extra]:
+                del self.rows[ts]
+
+    def has_gaps(self):
+        ts = sorted(self.rows)
+        return any(b - a != self.step for a, b in zip(ts, ts[1:]))
+
+    def frame(self):
+        ts = sorted(self.rows)
+        df = pd.DataFrame([self.rows[t] for t in ts], columns=["open", "high", "low", "close", "volume"],
+                          index=pd.Index(ts, name="timestamp"), dtype=float)
+        return df
+
+
+# ---------------------------------------------------------
+# Стрим
+# ---------------------------------------------------------
+
+class KlineStream:
+    """
+    stream = KlineStream("bybit", ["BTCUSDT", "ETHUSDT"], "1h", backfill=fetch).start()
+    stream.candles("BTCUSDT")   # DataFrame как у get_ohlcv или None (нет связи / данные устарели)
+
+    backfill(symbol, tf, start) — REST-загрузчик (start=None — полное окно);
+    on_bar(symbol, bar) — вызывается из потока стрима на каждое обновление свечи,
+    должен быстро возвращаться.
+    """
+
+    def __init__(self, exchange, symbols, tf="1h", url=None, window=STREAM_WINDOW,
+                 backfill=None, on_bar=None, stale_sec=STREAM_STALE_SEC):
+        if exchange not in STREAM_URLS:
+            raise ValueError(f"неизвестная биржа: {exchange}")
+        self.exchange = exchange
+        self.url = url or STREAM_URLS[exchange]
+        self.symbols = list(dict.fromkeys(s.upper() for s in symbols))
+        self.tf = tf
+        self.step = TF_SECONDS[tf]
+        self.backfill = backfill
+        self.on_bar = on_bar
+        self.stale_sec = stale_sec
+        self.buffers = {s: CandleBuffer(self.step, window) for s in self.symbols}
+        self.connected = False
+
+        self._parse = PARSERS[exchange]
+        self._lock = threading.Lock()
+        self._backfilling = set()
+        self._backfill_tried = {}
+        self._thread = None
+        self._loop = None
+        self._stop = None
+
+    # ---------- чтение ----------
+
+    def candles(self, symbol):
+        symbol = symbol.upper()
+        buf = self.buffers.get(symbol)
+        if buf is None or not self.connected:
+            return None
+        with self._lock:
+            if not buf.rows or buf.missing_from is not None or time.time() - buf.updated > self.stale_sec:
+                return None
+            return buf.frame()
+
+    # ---------- жизненный цикл ----------
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"stream-{self.exchange}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        loop, stop = self._loop, self._stop
+        if loop is not None and stop is not None:
+            loop.call_soon_threadsafe(stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        try:
+            asyncio.run(self._main())
+        except Exception as e:
+            print(f"[STREAM] {self.exchange} stopped:", e, flush=True)
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        attempt = 0
+        async with aiohttp.ClientSession() as session:
+            while not self._stop.is_set():
+                try:
+                    if await self._session(session):
+                        attempt = 0
+                except Exception as e:
+                    print(f"[STREAM] {self.exchange} error:", e, flush=True)
+                self._set_connected(False)
+                if self._stop.is_set():
+                    break
+
+                # пауза 1, 2, 4 ... 60 сек, с разбросом — чтобы не ломиться всем сразу
+                delay = min(STREAM_BACKOFF_MAX, 2.0 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                STREAM_RECONNECTS.inc(exchange=self.exchange)
+                print(f"[STREAM] {self.exchange} reconnect in {delay:.1f}s", flush=True)
+                try:
+                    await asyncio.wait_for(self._stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _session(self, session):
+        """Одно подключение. True — успели получить данные (сбросить паузу)."""
+        got_data = False
+        async with session.ws_connect(self.url, heartbeat=STREAM_PING_SEC, receive_timeout=self.stale_sec) as ws:
+            for message in subscribe_messages(self.exchange, self.symbols, self.tf):
+                await ws.send_json(message)
+            self._set_connected(True)
+            print(f"[STREAM] {self.exchange} connected: {len(self.symbols)} symbols {self.tf}", flush=True)
+
+            pinger = asyncio.create_task(self._ping(ws)) if self.exchange == "bybit" else None
+            stopper = asyncio.create_task(self._close_on_stop(ws))
+            try:
+                async for msg in ws:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    if self._handle(json.loads(msg.data)):
+                        got_data = True
+            finally:
+                stopper.cancel()
+                if pinger:
+                    pinger.cancel()
+        return got_data
+
+    async def _ping(self, ws):
+        # у Bybit свой ping поверх WebSocket (без него сервер рвёт соединение)
+        while not ws.closed:
+            await asyncio.sleep(STREAM_PING_SEC)
+            await ws.send_json({"op": "ping"})
+
+    async def _close_on_stop(self, ws):
+        await self._stop.wait()
+        await ws.close()
+
+    def _set_connected(self, value):
+        self.connected = value
+        STREAM_CONNECTED.set(1 if value else 0, exchange=self.exchange)
+
+    # ---------- сообщения ----------
+
+    def _handle(self, payload):
+        bars = self._parse(payload) if isinstance(payload, dict) else []
+        for symbol, bar in bars:
+            buf = self.buffers.get(symbol)
+            if buf is None:
+                continue
+            STREAM_MESSAGES.inc(exchange=self.exchange)
+            with self._lock:
+                buf.update(bar)
+                missing_from = buf.missing_from
+            if missing_from is not None:
+                self._request_backfill(symbol, missing_from or None)
+            if self.on_bar:
+                try:
+                    self.on_bar(symbol, bar)
+                except Exception as e:
+                    print("[STREAM] on_bar error:", e, flush=True)
+        return bool(bars)
+
+    def _request_backfill(self, symbol, start):
+        if self.backfill is None or symbol in self._backfilling:
+            return
+        now = time.time()
+        if now - self._backfill_tried.get(symbol, 0.0) < BACKFILL_RETRY_SEC:
+            return
+        self._backfill_tried[symbol] = now
+        self._backfilling.add(symbol)
+        asyncio.get_running_loop().run_in_executor(None, self._backfill, symbol, start)
+
+    def _backfill(self, symbol, start):
+        # REST в пуле потоков — поток стрима не ждёт ответа
+        try:
+            df = self.backfill(symbol, self.tf, start)
+            if df is None or len(df) == 0:
+                STREAM_BACKFILLS.inc(exchange=self.exchange, result="empty")
+                return
+            with self._lock:
+                buf = self.buffers[symbol]
+                buf.merge(df)
+                complete = buf.missing_from is None
+            STREAM_BACKFILLS.inc(exchange=self.exchange, result="ok" if complete else "partial")
+        except Exception as e:
+            STREAM_BACKFILLS.inc(exchange=self.exchange, result="error")
+            print(f"[STREAM] backfill {symbol} error:", e, flush=True)
+        finally:
+            self._backfilling.discard(symbol)
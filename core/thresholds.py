@@ -0,0 +1,18 @@
+# =============================
+# ПОРОГИ РАДАРА
+# =============================
+# Общие для бота (main.py) и бэктеста (backtest.py): бэктест проверяет
+# те же правила, не импортируя main со всей его инициализацией.
+
+# фильтры/пороговые
+FLAT_RANGE_MAX = 1.5                   # % диапазон флета для "подготовки"
+OVERHEAT_4H = 6.0                      # перегрев по 4ч
+COOLDOWN_MIN = 90                      # анти-спам на монету
+
+# AGGRESSIVE (раньше SAFE)
+AGG_VOL_MIN = 1.6                      # объём ≥ x1.6
+AGG_IMPULSE_FACTOR = 0.7               # доля от динамического порога
+
+# SAFE (строже)
+SAFE_MIN_STRENGTH = 4                  # сила для SAFE
+CONFIRM_WINDOW_HOURS = 6               # окно "AGG → SAFE подтверждён"
@@ -1,5 +1,7 @@
 import pandas as pd
 
+from core.features import features
+
 def calculate_volatility(df, period=20):
     """Обычная историческая волатильность"""
     returns = df['close'].pct_change()
@@ -21,7 +23,7 @@ def detect_volatility_zone(vol):
 def analyze_volatility(df):
     """Основная функция, которую импортирует analyzer.py"""
 
-    vol = calculate_volatility(df)
+    vol = features(df).get(("volatility", 20), calculate_volatility, df)
 
     return {
         "volatility_value": float(vol.iloc[-1]),
@@ -1,15 +1,34 @@
 import os
 import time
 import json
-import requests
+import asyncio
+import aiohttp
+import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
-import statistics
 import threading
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 from contextlib import asynccontextmanager
 
+from core.httpclient import http_get, rate_limiter, retry_after_seconds, observe_request, MAX_429_RETRIES
+from core.notifier import TelegramNotifier
+from core.statestore import StateStore
+from core.scheduler import Scheduler, Every, At, to_datetime
+from core.cache import report_cache
+from core.datasource import start_stream, stop_stream
+from core.incremental import load_engines, save_engines
+from core.thresholds import (
+    FLAT_RANGE_MAX,
+    OVERHEAT_4H,
+    COOLDOWN_MIN,
+    AGG_VOL_MIN,
+    AGG_IMPULSE_FACTOR,
+    SAFE_MIN_STRENGTH,
+    CONFIRM_WINDOW_HOURS,
+)
+from core.metrics import counter, gauge, histogram, render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print(">>> LIFESPAN STARTED", flush=True)
@@ -29,6 +48,11 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 CHAT_ID = os.getenv("CHAT_ID")
 
+# адреса API (для локального стенда — см. benchmarks/stub_server.py)
+COINGECKO_BASE = os.getenv("COINGECKO_BASE", "https://api.coingecko.com/api/v3")
+BYBIT_BASE = os.getenv("BYBIT_BASE", "https://api.bybit.com")
+TELEGRAM_API = os.getenv("TELEGRAM_API", "https://api.telegram.org")
+
 # Europe/Warsaw = UTC+1 зимой. Ты просил 7:30 — делаем по Варшаве.
 WARSAW_OFFSET_HOURS = 1
 
@@ -36,18 +60,19 @@ WARSAW_OFFSET_HOURS = 1
 CHECK_INTERVAL_SEC = 60 * 10            # цикл 10 минут
 COINS_LIMIT = 80
 
-# фильтры/пороговые
-FLAT_RANGE_MAX = 1.5                   # % диапазон флета для "подготовки"
-OVERHEAT_4H = 6.0                      # перегрев по 4ч
-COOLDOWN_MIN = 90                      # анти-спам на монету
+# пакетная загрузка графиков
+CHART_CONCURRENCY = int(os.getenv("CHART_CONCURRENCY", "8"))   # одновременных запросов
+CHART_REQUEST_TIMEOUT = 20             # дедлайн одного запроса, сек
+CHART_BATCH_DEADLINE = 300             # дедлайн всей пачки, сек (лимит CoinGecko ~30/мин)
 
-# AGGRESSIVE (раньше SAFE)
-AGG_VOL_MIN = 1.6                      # объём ≥ x1.6
-AGG_IMPULSE_FACTOR = 0.7               # доля от динамического порога
+# фильтры/пороговые, AGGRESSIVE и SAFE — core/thresholds.py (общие с backtest.py)
 
-# SAFE (строже)
-SAFE_MIN_STRENGTH = 4                  # сила для SAFE
-CONFIRM_WINDOW_HOURS = 6               # окно "AGG → SAFE подтверждён"
+# воронка радара: графики грузим только для монет, которые могут дать сигнал.
+# Любой сигнал требует |изменение 1ч| ≥ 0.6% (порог AGG; SAFE — ≥ dyn_thr ≥ 0.8%),
+# по /coins/markets отсекаем с запасом: 1ч на графике и у CoinGecko считаются
+# от разных точек
+RADAR_FUNNEL = os.getenv("RADAR_FUNNEL", "1") == "1"
+RADAR_FUNNEL_MIN_1H = float(os.getenv("RADAR_FUNNEL_MIN_1H", "0.3"))
 
 # отчёты
 FORECAST_HOUR = 7
@@ -58,23 +83,73 @@ WEEKLY_REPORT_WEEKDAY = 0              # понедельник
 WEEKLY_REPORT_HOUR = 10
 WEEKLY_REPORT_MINUTE = 0
 
+# расписание (core/scheduler.py): радар — на границах CHECK_INTERVAL_SEC,
+# срез рынка — после закрытия часовой свечи, отчёты — по Варшаве
+CANDLE_CLOSE_DELAY_SEC = int(os.getenv("CANDLE_CLOSE_DELAY_SEC", "20"))   # дать API отдать закрытую свечу
+RADAR_JITTER_SEC = float(os.getenv("RADAR_JITTER_SEC", "5"))
+RADAR_CATCH_UP_SEC = CHECK_INTERVAL_SEC // 2   # опоздал больше — ждём следующий тик
+REPORT_CATCH_UP_MIN = int(os.getenv("REPORT_CATCH_UP_MIN", "120"))   # пропущенный отчёт догоняем в этом окне
+
+# свечи по WebSocket (core/stream.py): всплеск объёма в текущей свече
+# топ-перпа запускает радар сразу, не дожидаясь тика
+STREAM_EXCHANGE = os.getenv("STREAM_EXCHANGE", "")     # bybit | binance; пусто — выключено
+STREAM_URL = os.getenv("STREAM_URL") or None           # для локального стенда (benchmarks/ws_stub.py)
+STREAM_TRIGGER_GAP_SEC = 120                           # внеочередной радар не чаще
+
+# OI-срез: один запрос tickers на весь список + история OI в state
+OI_UNIVERSE = int(os.getenv("OI_UNIVERSE", "20"))      # сколько крупнейших перпов учитывать
+OI_HISTORY_HOURS = 3                                   # сколько хранить точки OI
+OI_DELTA_MIN_AGE_SEC = 45 * 60                         # «час назад» — точка в этом окне
+OI_DELTA_MAX_AGE_SEC = 90 * 60
+OI_FALLBACK_MAX = 20                                   # без истории — поштучно, не больше стольких
+
 # хранение состояния (желательно на persistent volume)
 STATE_DIR = os.getenv("STATE_DIR", ".")
 STATE_FILE = os.path.join(STATE_DIR, "crypto_radar_state.json")
+STATE_DB = os.path.join(STATE_DIR, "crypto_radar_state.db")
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")   # sqlite | json (прежний файл)
+
+# ===== METRICS (/metrics) =====
+STAGE_SECONDS = histogram("radar_stage_duration_seconds", "Длительность этапов цикла", ("stage",))
+STATE_SAVE_SECONDS = histogram("state_save_duration_seconds", "Время записи state")
+CYCLES = counter("radar_cycles_total", "Циклы радара по исходу", ("result",))
+RADAR_COINS = counter("radar_coins_total", "Монеты радара по исходу", ("result",))
+RADAR_LAST_CYCLE = gauge("radar_last_cycle_coins", "Монеты радара по исходу за последний цикл", ("result",))
+
+RADAR_RESULTS = ("invalid", "filtered", "no_chart", "cooldown", "no_signal", "duplicate", "alert")
 
 # ===== TELEGRAM =====
-def send_telegram(text: str):
-    try:
-        requests.post(
-            f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage",
-            data={"chat_id": CHAT_ID, "text": text, "parse_mode": "HTML"},
-            timeout=15
-        )
-    except:
-        pass
+# отправка в фоне: радар и /webhook не ждут ответа Telegram
+notifier = TelegramNotifier(f"{TELEGRAM_API}/bot{BOT_TOKEN}/sendMessage", CHAT_ID)
+
+def send_telegram(text: str, coalesce=False):
+    """
+    Поставить сообщение в очередь (не блокирует).
+    coalesce=True — алерт цикла; при TELEGRAM_COALESCE=1 склеивается с остальными до flush.
+    """
+    return notifier.send(text, coalesce=coalesce)
 
 # ===== STATE IO =====
+# sqlite: пишутся только изменённые монеты и ключи, транзакцией (core/statestore.py);
+# при первом запуске state переносится из прежнего JSON-файла
+_state_store = None
+_state_store_lock = threading.Lock()
+
+def state_store():
+    global _state_store
+    with _state_store_lock:
+        if _state_store is None:
+            _state_store = StateStore(STATE_DB, legacy_json=STATE_FILE)
+        return _state_store
+
 def load_state():
+    if STATE_BACKEND == "sqlite":
+        try:
+            return state_store().load()
+        except Exception as e:
+            print("[STATE] load error:", e, flush=True)
+            return {}
+
     if not os.path.exists(STATE_FILE):
         return {}
     try:
@@ -88,25 +163,40 @@ def load_state():
         return {}
 
 def save_state(data):
-    try:
-        os.makedirs(STATE_DIR, exist_ok=True)
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except:
-        pass
+    with STATE_SAVE_SECONDS.time():
+        if STATE_BACKEND == "sqlite":
+            try:
+                state_store().save(data)
+            except Exception as e:
+                print("[STATE] save error:", e, flush=True)
+            return
+
+        try:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            # запись во временный файл + rename: при падении остаётся прежний state целиком
+            tmp = STATE_FILE + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, STATE_FILE)
+        except:
+            pass
 
 # ===== DATA (COINGECKO) =====
 def get_top_coins():
-    url = "https://api.coingecko.com/api/v3/coins/markets"
+    url = f"{COINGECKO_BASE}/coins/markets"
     params = {
         "vs_currency": "usd",
         "order": "market_cap_desc",
         "per_page": COINS_LIMIT,
         "page": 1,
-        "sparkline": False
+        "sparkline": False,
+        # изменения за 1ч/24ч — для предфильтра радара (radar_shortlist)
+        "price_change_percentage": "1h,24h"
     }
     try:
-        r = requests.get(url, params=params, timeout=30)
+        r = http_get(url, params=params, timeout=30)
         data = r.json()
         # защита: должны получить list[dict], а не строку/словарь ошибки
         if not isinstance(data, list):
@@ -115,9 +205,9 @@ def get_top_coins():
     except:
         return []
 
-def get_btc_trend():
+def get_btc_trend(snapshot=None):
     try:
-        prices, _ = get_market_chart("bitcoin")
+        prices, _ = chart_for("bitcoin", snapshot)
         if prices is None:
             return "RANGE"
 
@@ -133,7 +223,7 @@ def get_btc_trend():
     except:
         return "RANGE"
 
-def calculate_volatility_mode(coins_sample):
+def calculate_volatility_mode(coins_sample, snapshot=None):
 
     vol_sum = 0
     count = 0
@@ -143,7 +233,7 @@ def calculate_volatility_mode(coins_sample):
         if not cid:
             continue
 
-        prices, _ = get_market_chart(cid)
+        prices, _ = chart_for(cid, snapshot)
         if prices is None:
             continue
 
@@ -162,28 +252,186 @@ def calculate_volatility_mode(coins_sample):
     else:
         return "NORMAL"
 
+def market_chart_url(coin_id):
+    return f"{COINGECKO_BASE}/coins/{coin_id}/market_chart"
+
+MARKET_CHART_PARAMS = {"vs_currency": "usd", "days": 2}
+
+def parse_market_chart(data):
+    # data должен быть dict
+    if not isinstance(data, dict):
+        return None, None
+    prices = [p[1] for p in data.get("prices", [])]
+    vols = [v[1] for v in data.get("total_volumes", [])]
+    if len(prices) < 24 or len(vols) < 24:
+        return None, None
+    return pd.Series(prices), pd.Series(vols)
+
 def get_market_chart(coin_id):
     """
     Берём 2 дня: хватает для 1h/4h логики.
     """
     try:
-        url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
-        params = {"vs_currency": "usd", "days": 2}
-        data = requests.get(url, params=params, timeout=20).json()
-        # data должен быть dict
-        if not isinstance(data, dict):
+        r = http_get(market_chart_url(coin_id), params=MARKET_CHART_PARAMS)
+        if r.status_code != 200:
+            print(f"[CHARTS] HTTP {r.status_code}: {coin_id}", flush=True)
             return None, None
-        prices = [p[1] for p in data.get("prices", [])]
-        vols = [v[1] for v in data.get("total_volumes", [])]
-        if len(prices) < 24 or len(vols) < 24:
-            return None, None
-        return pd.Series(prices), pd.Series(vols)
+        return parse_market_chart(r.json())
     except:
         return None, None
 
-def get_btc_trend():
+# ===== BATCH CHARTS (aiohttp) =====
+async def _fetch_chart_async(session, sem, coin_id):
+    url = market_chart_url(coin_id)
+    async with sem:
+        for attempt in range(MAX_429_RETRIES + 1):
+            # тот же лимитер, что и у синхронных запросов
+            await asyncio.sleep(rate_limiter.reserve(url))
+            started = time.perf_counter()
+            try:
+                async with session.get(url, params=MARKET_CHART_PARAMS) as r:
+                    if r.status == 200:
+                        data = await r.json(content_type=None)
+                        observe_request(url, r.status, time.perf_counter() - started)
+                        return parse_market_chart(data)
+                    observe_request(url, r.status, time.perf_counter() - started)
+                    if r.status != 429:
+                        print(f"[CHARTS] HTTP {r.status}: {coin_id}", flush=True)
+                        return None, None
+                    pause = retry_after_seconds(r.headers, None, attempt)
+            except Exception:
+                observe_request(url, "error", time.perf_counter() - started)
+                return None, None
+            rate_limiter.penalize(url, pause)
+    return None, None
+
+async def _fetch_charts_async(coin_ids, concurrency, request_timeout, deadline):
+    timeout = aiohttp.ClientTimeout(total=request_timeout)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        sem = asyncio.Semaphore(concurrency)
+        tasks = {
+            asyncio.create_task(_fetch_chart_async(session, sem, cid)): cid
+            for cid in coin_ids
+        }
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+            print(f"[CHARTS] DEADLINE: {len(pending)} of {len(tasks)} not loaded", flush=True)
+        return {tasks[task]: task.result() for task in done}
+
+def fetch_charts(coin_ids,
+                 concurrency=CHART_CONCURRENCY,
+                 request_timeout=CHART_REQUEST_TIMEOUT,
+                 deadline=CHART_BATCH_DEADLINE):
+    """
+    Параллельная загрузка графиков: {coin_id: (prices, volumes)}.
+    Не больше concurrency запросов одновременно, каждый со своим дедлайном.
+    Если пачка не уложилась в deadline — возвращаем то, что успели;
+    недогруженных монет в результате нет.
+    Вызывать из потока без event loop (радар работает в отдельном потоке).
+    """
+    coin_ids = list(dict.fromkeys(coin_ids))
+    if not coin_ids:
+        return {}
+    try:
+        return asyncio.run(_fetch_charts_async(coin_ids, concurrency, request_timeout, deadline))
+    except Exception as e:
+        print("[CHARTS] BATCH ERROR:", e, flush=True)
+        return {}
+
+# ===== CYCLE SNAPSHOT =====
+class MarketSnapshot:
+    """
+    Срез рынка на один тик: топ монет и графики.
+    Каждый coin_id запрашивается у CoinGecko не больше одного раза за срез,
+    все потребители (режим, риск, волатильность, радар) получают те же pd.Series.
+    Задачи одного тика идут в разных потоках — загрузка под замком, и пока
+    одна задача грузит пачку, другая ждёт её и берёт готовое.
+    """
+
+    def __init__(self):
+        self._top_coins = None
+        self._charts = {}
+        self._lock = threading.RLock()
+        self.requests = 0
+        self.hits = 0
+
+    def top_coins(self):
+        with self._lock:
+            if self._top_coins is None:
+                self._top_coins = get_top_coins()
+            return self._top_coins
+
+    def chart(self, coin_id):
+        with self._lock:
+            if coin_id in self._charts:
+                self.hits += 1
+                return self._charts[coin_id]
+            self.requests += 1
+            # неудачный ответ тоже запоминаем — повторять в этом срезе нет смысла
+            self._charts[coin_id] = get_market_chart(coin_id)
+            return self._charts[coin_id]
+
+    def evict(self, coin_id):
+        """Забыть график монеты — следующий chart() загрузит его заново."""
+        with self._lock:
+            self._charts.pop(coin_id, None)
+
+    def coin_by_symbol(self, symbol):
+        """Монета топа по тикеру перпа (SOLUSDT → symbol "sol"), крупнейшая из совпавших."""
+        base = symbol.upper()
+        if base.endswith("USDT"):
+            base = base[:-4]
+        for coin in self.top_coins():
+            if isinstance(coin, dict) and str(coin.get("symbol", "")).upper() == base:
+                return coin
+        return None
+
+    def prefetch(self, coin_ids):
+        """Загрузить пачкой все ещё не загруженные графики."""
+        with self._lock:
+            missing = [cid for cid in dict.fromkeys(coin_ids) if cid and cid not in self._charts]
+            if not missing:
+                return
+            charts = fetch_charts(missing)
+            if not charts:
+                # пачка не удалась целиком — останется поштучная загрузка через chart()
+                return
+            self.requests += len(missing)
+            for cid in missing:
+                # не уложились в дедлайн — пропускаем монету в этом срезе, а не ждём её
+                self._charts[cid] = charts.get(cid, (None, None))
+
+# общий срез для задач, стартовавших в одном интервале радара
+# (на закрытии часа радар и часовой срез рынка грузят графики один раз)
+_snapshot = None
+_snapshot_key = None
+_snapshot_lock = threading.Lock()
+
+def market_snapshot():
+    global _snapshot, _snapshot_key
+    key = int(time.time() // CHECK_INTERVAL_SEC)
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot_key != key:
+            _snapshot = MarketSnapshot()
+            _snapshot_key = key
+        return _snapshot
+
+def top_coin_ids(coins, limit=None):
+    ids = [c.get("id") for c in coins if isinstance(c, dict) and c.get("id")]
+    return ids if limit is None else ids[:limit]
+
+def chart_for(coin_id, snapshot=None):
+    if snapshot is None:
+        return get_market_chart(coin_id)
+    return snapshot.chart(coin_id)
+
+def get_btc_trend(snapshot=None):
     try:
-        prices, _ = get_market_chart("bitcoin")
+        prices, _ = chart_for("bitcoin", snapshot)
         if prices is None:
             return "RANGE"
 
@@ -200,30 +448,89 @@ def get_btc_trend():
         return "RANGE"
 
 def pct_change(series, h):
-    if len(series) < h + 1:
+    values = np.asarray(series, dtype=float)
+    if len(values) < h + 1:
         return 0.0
-    base = series.iloc[-(h + 1)]
+    base = values[-(h + 1)]
     if base == 0:
         return 0.0
-    return (series.iloc[-1] - base) / base * 100.0
+    return float((values[-1] - base) / base * 100.0)
 
 def dynamic_threshold(series):
     """
     Динамический порог: 2× среднее абсолютное изменение.
     """
     try:
-        changes = []
-        for i in range(1, len(series)):
-            prev = series.iloc[i - 1]
-            if prev == 0:
-                continue
-            changes.append(abs((series.iloc[i] - prev) / prev * 100))
-        if len(changes) < 10:
+        values = np.asarray(series, dtype=float)
+        prev = values[:-1]
+        cur = values[1:]
+        mask = prev != 0
+        if mask.sum() < 10:
             return 1.0
-        return max(statistics.mean(changes) * 2, 0.8)
+        changes = np.abs((cur[mask] - prev[mask]) / prev[mask] * 100)
+        return max(float(changes.mean()) * 2, 0.8)
     except:
         return 1.0
 
+# ===== BATCH (монеты × время) =====
+def stack_series(series_list):
+    """
+    Матрица (монеты × время). Ряды выровнены по последней точке,
+    короткие ряды дополнены слева NaN.
+    """
+    width = max((len(s) for s in series_list), default=0)
+    matrix = np.full((len(series_list), width), np.nan)
+    for i, s in enumerate(series_list):
+        values = np.asarray(s, dtype=float)
+        if len(values):
+            matrix[i, width - len(values):] = values
+    return matrix
+
+def pct_changes(matrix, h):
+    """pct_change для каждой строки матрицы."""
+    matrix = np.asarray(matrix, dtype=float)
+    if matrix.shape[1] < h + 1:
+        return np.zeros(matrix.shape[0])
+    base = matrix[:, -(h + 1)]
+    last = matrix[:, -1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chg = (last - base) / base * 100.0
+    # короткий ряд (NaN слева) или нулевая база — как в pct_change
+    return np.where(np.isnan(base) | (base == 0), 0.0, chg)
+
+def dynamic_thresholds(matrix):
+    """dynamic_threshold для всех строк матрицы за один проход (NaN — пропуски)."""
+    matrix = np.asarray(matrix, dtype=float)
+    prev = matrix[:, :-1]
+    cur = matrix[:, 1:]
+    valid = ~np.isnan(prev) & ~np.isnan(cur) & (prev != 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = np.where(valid, np.abs((cur - prev) / prev * 100), 0.0)
+    count = valid.sum(axis=1)
+    mean = changes.sum(axis=1) / np.maximum(count, 1)
+    return np.where(count < 10, 1.0, np.maximum(mean * 2, 0.8))
+
+def radar_features(snapshot, ids):
+    """
+    {coin_id: (chg_1h, chg_4h, dyn_thr)} по всем загруженным графикам одним вызовом.
+    """
+    charted = []
+    for cid in ids:
+        prices, _ = snapshot.chart(cid)
+        if prices is not None:
+            charted.append((cid, prices))
+    if not charted:
+        return {}
+
+    matrix = stack_series([p for _, p in charted])
+    chg_1h = pct_changes(matrix, 1)
+    chg_4h = pct_changes(matrix, 4)
+    thr = dynamic_thresholds(matrix)
+    return {
+        cid: (float(chg_1h[i]), float(chg_4h[i]), float(thr[i]))
+        for i, (cid, _) in enumerate(charted)
+    }
+
 # ===== MEMO + CONCLUSION =====
 def memo_intraday():
     return (
@@ -250,7 +557,7 @@ def conclusion_for_agg():
     return "🔴 <b>НЕ ВХОД</b>\n(ранний радар: наблюдать и ждать структуру)"
 
 # ===== MARKET MODE (для утреннего прогноза, простая оценка) =====
-def market_mode_snapshot(coins_sample):
+def market_mode_snapshot(coins_sample, snapshot=None):
     """
     Простой срез: сколько монет в плюсе/минусе по 4ч и есть ли 'широкий рынок'.
     """
@@ -261,7 +568,7 @@ def market_mode_snapshot(coins_sample):
         cid = c.get("id")
         if not cid:
             continue
-        prices, vols = get_market_chart(cid)
+        prices, vols = chart_for(cid, snapshot)
         if prices is None:
             continue
         chg4 = pct_change(prices, 4)
@@ -280,8 +587,19 @@ def market_mode_snapshot(coins_sample):
 def warsaw_now():
     return datetime.utcnow() + timedelta(hours=WARSAW_OFFSET_HOURS)
 
-def should_fire_at(now_dt, hour, minute):
-    return now_dt.hour == hour and now_dt.minute == minute
+def warsaw_time(ts):
+    """unix-время (слот планировщика) → время по Варшаве."""
+    return to_datetime(ts, WARSAW_OFFSET_HOURS)
+
+def report_due(now_dt, hour, minute, weekday=None):
+    """
+    Отчёт пора слать: с hour:minute прошло не больше REPORT_CATCH_UP_MIN
+    (цикл, перешагнувший ровно эту минуту, отчёт не теряет).
+    """
+    if weekday is not None and now_dt.weekday() != weekday:
+        return False
+    slot = now_dt.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return timedelta(0) <= now_dt - slot <= timedelta(minutes=REPORT_CATCH_UP_MIN)
 
 
 
@@ -316,28 +634,31 @@ def analyze_htf_trend(prices: pd.Series):
 
 # ===== BYBIT OI ANALYSIS =====
 
-BYBIT_BASE = "https://api.bybit.com"
-
-def get_top20_usdt_perps():
+def get_usdt_perp_tickers():
+    """
+    Тикеры всех USDT-перпов одним запросом, по обороту (сначала крупные).
+    В каждом уже есть openInterest, lastPrice и prevPrice1h.
+    """
     try:
-        r = requests.get(
+        r = http_get(
             f"{BYBIT_BASE}/v5/market/tickers",
-            params={"category": "linear"},
-            timeout=20
+            params={"category": "linear"}
         ).json()
         items = r.get("result", {}).get("list", [])
         usdt = [x for x in items if x.get("symbol","").endswith("USDT")]
         usdt.sort(key=lambda x: float(x.get("turnover24h", 0)), reverse=True)
-        return [x["symbol"] for x in usdt[:20]]
+        return usdt
     except:
         return []
 
+def get_top20_usdt_perps():
+    return [x["symbol"] for x in get_usdt_perp_tickers()[:20]]
+
 def get_oi_and_price_1h(symbol):
     try:
-        oi = requests.get(
+        oi = http_get(
             f"{BYBIT_BASE}/v5/market/open-interest",
-            params={"category":"linear","symbol":symbol,"intervalTime":"1h","limit":2},
-            timeout=20
+            params={"category":"linear","symbol":symbol,"intervalTime":"1h","limit":2}
         ).json().get("result", {}).get("list", [])
 
         if len(oi) < 2:
@@ -347,10 +668,9 @@ def get_oi_and_price_1h(symbol):
         oi_prev = float(oi[1]["openInterest"])
         oi_delta = (oi_now - oi_prev) / oi_prev * 100 if oi_prev else 0
 
-        kl = requests.get(
+        kl = http_get(
             f"{BYBIT_BASE}/v5/market/kline",
-            params={"category":"linear","symbol":symbol,"interval":"60","limit":2},
-            timeout=20
+            params={"category":"linear","symbol":symbol,"interval":"60","limit":2}
         ).json().get("result", {}).get("list", [])
 
         if len(kl) < 2:
@@ -391,14 +711,72 @@ def smart_money_signal(symbol):
 
     return None
 
-def aggregate_oi_bias():
-    symbols = get_top20_usdt_perps()
-    long_build = short_build = long_squeeze = short_squeeze = 0
+def oi_hour_ago(entries, now_ts):
+    """OI примерно час назад из истории [[ts, oi], ...] (ближайший к 60 мин в окне) или None."""
+    best = None
+    for ts, oi in entries or []:
+        age = now_ts - ts
+        if OI_DELTA_MIN_AGE_SEC <= age <= OI_DELTA_MAX_AGE_SEC and oi:
+            if best is None or abs(age - 3600) < abs(now_ts - best[0] - 3600):
+                best = (ts, oi)
+    return best[1] if best else None
+
+def collect_oi_deltas(history, now_ts=None):
+    """
+    {symbol: {"oi_delta", "price_delta"}} для OI_UNIVERSE крупнейших перпов
+    и обновлённая история OI {symbol: [[ts, oi], ...]} (исходную не меняет).
 
-    for s in symbols:
-        data = get_oi_and_price_1h(s)
-        if not data:
+    Один запрос tickers: цена за час — lastPrice против prevPrice1h,
+    OI — текущий против записанного в истории час назад. Поштучно
+    (open-interest + kline) спрашиваем только символы без истории — после
+    рестарта или новые в списке.
+    """
+    now_ts = now_ts or time.time()
+    tickers = get_usdt_perp_tickers()[:OI_UNIVERSE]
+
+    new_history = {}
+    for sym, entries in (history or {}).items():
+        kept = [e for e in entries if now_ts - e[0] <= OI_HISTORY_HOURS * 3600]
+        if kept:
+            new_history[sym] = kept
+
+    deltas = {}
+    missing = []
+    for t in tickers:
+        sym = t.get("symbol")
+        try:
+            oi_now = float(t.get("openInterest") or 0)
+            last = float(t.get("lastPrice") or 0)
+            prev = float(t.get("prevPrice1h") or 0)
+        except (TypeError, ValueError):
+            continue
+        if not sym or not oi_now:
             continue
+
+        oi_prev = oi_hour_ago(new_history.get(sym), now_ts)
+        new_history.setdefault(sym, []).append([now_ts, oi_now])
+
+        if oi_prev is None or not prev:
+            missing.append(sym)
+            continue
+        deltas[sym] = {
+            "oi_delta": (oi_now - oi_prev) / oi_prev * 100,
+            "price_delta": (last - prev) / prev * 100,
+        }
+
+    for sym in missing[:OI_FALLBACK_MAX]:
+        data = get_oi_and_price_1h(sym)
+        if data:
+            deltas[sym] = data
+
+    return deltas, len(tickers), new_history
+
+def aggregate_oi_bias(history=None):
+    """(вывод по OI, обновлённая история OI) — см. collect_oi_deltas."""
+    deltas, total, history = collect_oi_deltas(history)
+    long_build = short_build = long_squeeze = short_squeeze = 0
+
+    for data in deltas.values():
         p = data["price_delta"]
         o = data["oi_delta"]
 
@@ -411,21 +789,21 @@ def aggregate_oi_bias():
         elif p < 0 and o < 0:
             long_squeeze += 1
 
-    total = max(1, len(symbols))
+    total = max(1, total)
 
     if long_build / total > 0.35:
-        return "Наращиваются лонги"
+        return "Наращиваются лонги", history
     if short_build / total > 0.35:
-        return "Наращиваются шорты"
+        return "Наращиваются шорты", history
     if short_squeeze / total > 0.35:
-        return "Идёт вынос шортов"
+        return "Идёт вынос шортов", history
     if long_squeeze / total > 0.35:
-        return "Идёт вынос лонгов"
+        return "Идёт вынос лонгов", history
 
-    return "Баланс позиций"
+    return "Баланс позиций", history
 
 # ===== GLOBAL MARKET REGIME =====
-def calculate_market_regime(coins):
+def calculate_market_regime(coins, snapshot=None):
     """
     Определяет общий режим рынка на основе 4ч движения топ-монет.
     """
@@ -442,7 +820,7 @@ def calculate_market_regime(coins):
         if not cid:
             continue
 
-        prices, _ = get_market_chart(cid)
+        prices, _ = chart_for(cid, snapshot)
         if prices is None:
             continue
 
@@ -469,12 +847,12 @@ def calculate_market_regime(coins):
         return "🟡 RANGE MARKET"
 
 # ===== RISK SCORE ENGINE =====
-def calculate_risk_score(state, coins_sample):
+def calculate_risk_score(state, coins_sample, snapshot=None):
 
     score = 50  # базовая нейтральная точка
 
     # 1️⃣ BTC тренд
-    btc_trend = get_btc_trend()
+    btc_trend = get_btc_trend(snapshot)
 
     if btc_trend == "LONG":
         score += 10
@@ -508,7 +886,7 @@ def calculate_risk_score(state, coins_sample):
         if not cid:
             continue
 
-        prices, _ = get_market_chart(cid)
+        prices, _ = chart_for(cid, snapshot)
         if prices is None:
             continue
 
@@ -535,9 +913,11 @@ def calculate_risk_score(state, coins_sample):
     return score
 
 # ===== MAIN =====
-def run_bot():
-    state = load_state()
-
+def init_state(state):
+    """
+    Проверенный state и ссылки на его coins / stats
+    (задачи меняют их на месте).
+    """
     # ===== ЗАЩИТА STATE (ключевое — убирает 'str'.get) =====
     if not isinstance(state, dict):
         state = {}
@@ -552,7 +932,8 @@ def run_bot():
     #   "stats": { "day":"YYYY-MM-DD", "agg":0, "safe":0, "confirmed":0, "week":"YYYY-WW", "w_agg":0, "w_safe":0, "w_confirmed":0 },
     #   "last_forecast_day":"YYYY-MM-DD",
     #   "last_daily_day":"YYYY-MM-DD",
-    #   "last_weekly_week":"YYYY-WW"
+    #   "last_weekly_week":"YYYY-WW",
+    #   "oi_history": { "BTCUSDT": [[unix_ts, open_interest], ...] }   # точки OI за OI_HISTORY_HOURS
     # }
 
     coins_state = state.get("coins", {})
@@ -569,6 +950,508 @@ def run_bot():
             "w_confirmed": 0
         }
 
+    # задачи пишут state в разное время — coins / stats всегда внутри него
+    state["coins"] = coins_state
+    state["stats"] = stats
+    return state, coins_state, stats
+
+# ===== JOBS =====
+# Задачи планировщика (run_bot) и последовательный run_cycle вызывают одно и то же:
+# job(state, coins_state, stats, now, snapshot), now — время по Варшаве.
+# Сеть — вне state_lock, изменения state и запись — под ним.
+state_lock = threading.RLock()
+
+def rollover_stats(stats, now):
+    """Новый день / неделя — обнулить счётчики."""
+    day_key = now.strftime("%Y-%m-%d")
+    week_key = now.strftime("%G-%V")
+
+    if stats.get("day") != day_key:
+        stats["day"] = day_key
+        stats["agg"] = 0
+        stats["safe"] = 0
+        stats["confirmed"] = 0
+
+    if stats.get("week") != week_key:
+        stats["week"] = week_key
+        stats["w_agg"] = 0
+        stats["w_safe"] = 0
+        stats["w_confirmed"] = 0
+
+def market_intel_job(state, coins_state, stats, now, snapshot):
+    """HOURLY MARKET INTELLIGENCE — раз в час, после закрытия свечи."""
+    current_hour = now.strftime("%Y-%m-%d %H")
+    if current_hour == state.get("last_oi_hour"):
+        return
+
+    with STAGE_SECONDS.time(stage="hourly_prefetch"):
+        coins_sample = snapshot.top_coins()
+        snapshot.prefetch(["bitcoin"] + top_coin_ids(coins_sample[:50]))
+    with STAGE_SECONDS.time(stage="regime"):
+        regime = calculate_market_regime(coins_sample, snapshot)
+
+    with STAGE_SECONDS.time(stage="oi_bias"):
+        oi_bias, oi_history = aggregate_oi_bias(state.get("oi_history"))
+
+    # calculate_risk_score читает режим и OI bias из state — нужны свежие
+    with state_lock:
+        state["market_regime"] = regime
+        state["last_oi_bias"] = oi_bias
+        state["oi_history"] = oi_history
+
+    with STAGE_SECONDS.time(stage="risk_score"):
+        risk_score = calculate_risk_score(state, coins_sample, snapshot)
+    with STAGE_SECONDS.time(stage="vol_mode"):
+        vol_mode = calculate_volatility_mode(coins_sample, snapshot)
+
+    send_telegram(
+        "📊 <b>MARKET INTELLIGENCE</b>\n\n"
+        f"Режим рынка: {regime}\n"
+        f"Открытый интерес: {oi_bias}\n"
+        f"Volatility: {vol_mode}\n"
+        f"Risk Score: <b>{risk_score}/100</b>\n"
+    )
+
+    with state_lock:
+        state["vol_mode"] = vol_mode
+        state["last_oi_hour"] = current_hour
+        save_state(state)
+
+def forecast_job(state, coins_state, stats, now, snapshot):
+    """Утренний прогноз (07:30 Warsaw)."""
+    day_key = now.strftime("%Y-%m-%d")
+    if not report_due(now, FORECAST_HOUR, FORECAST_MINUTE) or state.get("last_forecast_day") == day_key:
+        return
+
+    with STAGE_SECONDS.time(stage="forecast"):
+        coins = snapshot.top_coins()
+        snapshot.prefetch(top_coin_ids(coins[:60]))
+        mode = market_mode_snapshot(coins, snapshot)
+
+    hint = "Тактика: SAFE — основной, AGGRESSIVE — только как радар."
+    if mode.startswith("🟢"):
+        hint = "Тактика: смотри AGGRESSIVE, жди SAFE, работай выборочно."
+    elif mode.startswith("🔴"):
+        hint = "Тактика: осторожно. Пропуск — ок. Только самые чистые SAFE."
+
+    msg = (
+        "🧭 <b>ПРОГНОЗ ДНЯ</b>\n\n"
+        f"Режим рынка: <b>{mode}</b>\n"
+        f"{hint}\n\n"
+        "⛔ Если за 10 минут нет ясности — SKIP."
+    )
+    send_telegram(msg)
+
+    with state_lock:
+        state["last_forecast_day"] = day_key
+        save_state(state)
+
+def daily_report_job(state, coins_state, stats, now, snapshot):
+    """Дневной отчёт (20:30 Warsaw)."""
+    day_key = now.strftime("%Y-%m-%d")
+    with state_lock:
+        if not report_due(now, DAILY_REPORT_HOUR, DAILY_REPORT_MINUTE) or state.get("last_daily_day") == day_key:
+            return
+        rollover_stats(stats, now)
+
+        agg = stats.get("agg", 0)
+        safe = stats.get("safe", 0)
+        conf = stats.get("confirmed", 0)
+
+        quality = "🟡 НЕЙТРАЛЬНОЕ"
+        rate = (conf / agg * 100.0) if agg > 0 else 0.0
+        if agg >= 6 and rate >= 30:
+            quality = "🟢 ХОРОШЕЕ"
+        elif agg >= 6 and rate < 15:
+            quality = "🔴 ШУМНОЕ"
+
+        send_telegram(
+            "📊 <b>ИТОГ ДНЯ (AGGRESSIVE → SAFE)</b>\n\n"
+            f"AGGRESSIVE: {agg}\n"
+            f"SAFE: {safe}\n"
+            f"Подтверждений: {conf}\n\n"
+            f"Качество рынка: <b>{quality}</b>\n"
+        )
+        state["last_daily_day"] = day_key
+        state["yesterday_quality"] = quality
+        state["stats"] = stats
+        save_state(state)
+
+def weekly_report_job(state, coins_state, stats, now, snapshot):
+    """Недельный отчёт (Пн 10:00 Warsaw)."""
+    week_key = now.strftime("%G-%V")
+    with state_lock:
+        if (not report_due(now, WEEKLY_REPORT_HOUR, WEEKLY_REPORT_MINUTE, WEEKLY_REPORT_WEEKDAY) or
+                state.get("last_weekly_week") == week_key):
+            return
+        rollover_stats(stats, now)
+
+        send_telegram(
+            "📈 <b>СТАТИСТИКА НЕДЕЛИ</b>\n\n"
+            f"AGGRESSIVE: {stats.get('w_agg', 0)}\n"
+            f"SAFE: {stats.get('w_safe', 0)}\n"
+            f"Подтверждений: {stats.get('w_confirmed', 0)}\n"
+        )
+        state["last_weekly_week"] = week_key
+        state["stats"] = stats
+        save_state(state)
+
+def radar_shortlist(coins, coins_state, results, now_ts=None):
+    """
+    Этап 1 радара — только по полям /coins/markets, без графиков.
+    До загрузки графика не доходят повторы в списке, монеты на cooldown
+    и (RADAR_FUNNEL) монеты, сдвинувшиеся за час меньше RADAR_FUNNEL_MIN_1H.
+    Нет поля изменения — монета проходит.
+    """
+    now_ts = now_ts or datetime.utcnow().timestamp()
+    shortlist = []
+    seen = set()
+
+    for coin in coins:
+        cid = coin.get("id") if isinstance(coin, dict) else None
+        if not cid:
+            results["invalid"] += 1
+            continue
+        if cid in seen:
+            continue
+        seen.add(cid)
+
+        cs = coins_state.get(cid)
+        last_sent_ts = cs.get("last_sent_ts", 0) if isinstance(cs, dict) else 0
+        if last_sent_ts and (now_ts - last_sent_ts) < (COOLDOWN_MIN * 60):
+            results["cooldown"] += 1
+            continue
+
+        chg_1h = coin.get("price_change_percentage_1h_in_currency")
+        if RADAR_FUNNEL and isinstance(chg_1h, (int, float)) and abs(chg_1h) < RADAR_FUNNEL_MIN_1H:
+            results["filtered"] += 1
+            continue
+
+        shortlist.append(coin)
+
+    return shortlist
+
+def radar_job(state, coins_state, stats, now, snapshot):
+    """Основной радар — каждые CHECK_INTERVAL_SEC: предфильтр, графики шорт-листа, оценка."""
+    radar_results = dict.fromkeys(RADAR_RESULTS, 0)
+    with STAGE_SECONDS.time(stage="radar_prefetch"):
+        coins = radar_shortlist(snapshot.top_coins(), coins_state, radar_results)
+        snapshot.prefetch(top_coin_ids(coins))
+        features = radar_features(snapshot, top_coin_ids(coins))
+
+    with state_lock:
+        rollover_stats(stats, now)
+        radar_pass(state, coins_state, stats, coins, features, snapshot, radar_results)
+
+def stream_radar_job(state, coins_state, stats, now, snapshot, symbol):
+    """
+    Внеочередной радар по одной монете — всплеск объёма в свече стрима.
+    Срез тика остаётся, заново грузится только график этой монеты.
+    """
+    coin = snapshot.coin_by_symbol(symbol)
+    if coin is None:
+        print(f"[STREAM] {symbol}: not in top coins, skipped", flush=True)
+        return
+    cid = coin["id"]
+    snapshot.evict(cid)
+    features = radar_features(snapshot, [cid])
+
+    with state_lock:
+        rollover_stats(stats, now)
+        radar_pass(state, coins_state, stats, [coin], features, snapshot, report_cycle=False)
+
+def radar_pass(state, coins_state, stats, coins, features, snapshot, radar_results=None, report_cycle=True):
+    """
+    Проход радара по загруженным графикам: алерты, coins_state, stats, запись state.
+    report_cycle=False — внеочередной проход (метрики «последнего цикла» не трогаем).
+    """
+    radar_started = time.perf_counter()
+    if radar_results is None:
+        radar_results = dict.fromkeys(RADAR_RESULTS, 0)
+    now_ts = datetime.utcnow().timestamp()
+
+    for coin in coins:
+        # защита: coin должен быть dict
+        if not isinstance(coin, dict):
+            radar_results["invalid"] += 1
+            continue
+
+        cid = coin.get("id")
+        sym = coin.get("symbol", "").upper()
+        if not cid:
+            radar_results["invalid"] += 1
+            continue
+
+        prices, volumes = snapshot.chart(cid)
+        htf_bias = analyze_htf_trend(prices)         
+        if prices is None:
+            radar_results["no_chart"] += 1
+            continue
+
+        cs = coins_state.get(cid, {})
+        if not isinstance(cs, dict):
+            cs = {}
+
+        last_sent_ts = cs.get("last_sent_ts", 0)
+        if last_sent_ts and (now_ts - last_sent_ts) < (COOLDOWN_MIN * 60):
+            radar_results["cooldown"] += 1
+            continue
+
+        # расчёты
+        price_range = (prices.max() - prices.min()) / prices.mean() * 100.0 if prices.mean() else 0.0
+        vol_avg = volumes[:-12].mean() if len(volumes) > 12 else volumes.mean()
+        vol_now = volumes.iloc[-1]
+        vol_mult = (vol_now / vol_avg) if vol_avg and vol_avg > 0 else 0.0
+
+        if cid in features:
+            chg_1h, chg_4h, dyn_thr = features[cid]
+        else:
+            chg_1h = pct_change(prices, 1)
+            chg_4h = pct_change(prices, 4)
+            dyn_thr = dynamic_threshold(prices)
+
+        signal_direction = "LONG" if chg_1h >= 0 else "SHORT"
+
+        # направление (грубо) — нужно для "подтверждён"
+        direction = "UP" if chg_1h >= 0 else "DOWN"
+
+        stage = None
+        reasons = []
+        strength = 0
+
+        # сила от объёма
+        if vol_mult >= 1.6:
+            strength += 1
+        if vol_mult >= 2.0:
+            strength += 1
+        if vol_mult >= 3.0:
+            strength += 1
+
+        # подготовка
+        if vol_mult >= 2.0 and price_range <= FLAT_RANGE_MAX:
+            stage = "ПОДГОТОВКА"
+            reasons += ["Цена во флете", f"Объём x{vol_mult:.1f}"]
+            strength += 1
+
+        # запуск
+        launch_impulse = abs(chg_1h) >= dyn_thr
+        if vol_mult >= 3.0 and launch_impulse:
+            stage = "ЗАПУСК"
+            reasons += [f"Импульс 1ч {chg_1h:.2f}%", "Есть объём"]
+            strength += 1
+
+        # перегрев
+        if abs(chg_4h) >= OVERHEAT_4H:
+            stage = "ПЕРЕГРЕВ"
+            reasons += [f"Импульс 4ч {chg_4h:.2f}%", "Риск выдоха"]
+            strength += 1
+
+        # подтверждение 1h + 4h в одну сторону
+        if chg_1h * chg_4h > 0:
+            strength += 1
+            reasons.append("1h + 4h в одну сторону")
+
+        # --------- AGGRESSIVE условия (раньше SAFE) ----------
+        agg_impulse = abs(chg_1h) >= max(dyn_thr * AGG_IMPULSE_FACTOR, 0.6)
+        is_aggressive = (vol_mult >= AGG_VOL_MIN and agg_impulse and stage != "ПЕРЕГРЕВ")
+
+        # --------- SAFE условия (строже + HTF фильтр) ----------
+        is_safe = (
+            stage == "ЗАПУСК"
+            and strength >= SAFE_MIN_STRENGTH
+            and abs(chg_4h) < OVERHEAT_4H
+        )
+
+        # ===== GLOBAL MARKET FILTER =====
+        market_regime = state.get("market_regime", "🟡 RANGE MARKET")
+        
+        if is_safe:
+            if "LONG MARKET" in market_regime and signal_direction == "SHORT":
+                is_safe = False
+            elif "SHORT MARKET" in market_regime and signal_direction == "LONG":
+                is_safe = False
+        
+     
+        
+        # SAFE разрешаем только если совпадает с HTF
+        if is_safe:
+            if htf_bias != signal_direction:
+                is_safe = False
+
+        risk_score = state.get("risk_score", 50)
+
+        # 🚨 Risk OFF — режем агрессию
+        if risk_score < 40:
+            is_aggressive = False
+        
+        # 🚨 Полный Risk OFF — SAFE тоже режем
+        if risk_score < 30:
+            is_safe = False
+        
+        # 🔥 Risk ON — усиливаем SAFE
+        if risk_score > 65 and is_safe:
+            strength += 1
+
+        vol_mode = state.get("vol_mode", "NORMAL")
+
+        if vol_mode == "HIGH" and risk_score < 55:
+            is_aggressive = False
+        
+        if vol_mode == "LOW":
+            is_aggressive = False
+
+        if not is_aggressive and not is_safe:
+            radar_results["no_signal"] += 1
+            continue
+
+        # выбираем тип: SAFE приоритетнее
+        sig_type = "SAFE" if is_safe else "AGG"
+
+        # анти-дубликат: если одинаковое уже было
+        if cs.get("last_type") == sig_type and cs.get("last_stage") == stage and cs.get("last_strength") == strength:
+            radar_results["duplicate"] += 1
+            continue
+
+        # --- логика подтверждения ---
+        confirmed_tag = ""
+        confirmed = False
+        if sig_type == "SAFE":
+            last_agg_ts = cs.get("last_agg_ts", 0)
+            last_agg_dir = cs.get("last_agg_dir")
+            if last_agg_ts and (now_ts - last_agg_ts) <= (CONFIRM_WINDOW_HOURS * 3600) and last_agg_dir == direction:
+                confirmed = True
+                confirmed_tag = "\n<b>AGGRESSIVE → SAFE подтверждён</b>"
+
+        # сформировать сообщение
+        emoji = {"ПОДГОТОВКА": "🟢", "ЗАПУСК": "🟡", "ПЕРЕГРЕВ": "🔴"}.get(stage, "⚪")
+        fire = "🔥" * max(1, min(strength, 5))
+        strength_norm = max(1, min(strength, 5))
+
+        if sig_type == "AGG":
+            title = f"⚠️ <b>AGGRESSIVE</b> — ранний радар"
+            conclusion = conclusion_for_agg()
+        else:
+            title = f"✅ <b>SAFE</b>{confirmed_tag}"
+            conclusion = conclusion_for_safe()
+
+        msg = (
+            f"{title}\n"
+            f"📈 HTF: <b>{htf_bias}</b>\n"
+            f"🧮 Risk: <b>{risk_score}/100</b>\n"
+            f"{emoji} <b>{sym}</b>\n"
+            f"Стадия: <b>{stage}</b>\n"
+            f"Сила: {fire} ({strength_norm}/5)\n\n"
+            f"1ч: {chg_1h:.2f}% | 4ч: {chg_4h:.2f}%\n"
+            f"Объём: x{vol_mult:.1f}\n\n"
+            f"Причины:\n• " + "\n• ".join(reasons) +
+            f"\n\n{memo_intraday()}\n\n"
+            f"🧠 <b>ВЫВОД</b>:\n{conclusion}"
+        )
+
+        send_telegram(msg, coalesce=True)
+        radar_results["alert"] += 1
+
+        # обновить стейт монеты
+        cs["last_sent_ts"] = now_ts
+        cs["last_type"] = sig_type
+        cs["last_stage"] = stage
+        cs["last_strength"] = strength_norm
+
+        # сохранить AGG “якорь” для будущего подтверждения
+        if sig_type == "AGG":
+            cs["last_agg_ts"] = now_ts
+            cs["last_agg_dir"] = direction
+
+        coins_state[cid] = cs
+
+        # обновить статистику
+        if sig_type == "AGG":
+            stats["agg"] = stats.get("agg", 0) + 1
+            stats["w_agg"] = stats.get("w_agg", 0) + 1
+        else:
+            stats["safe"] = stats.get("safe", 0) + 1
+            stats["w_safe"] = stats.get("w_safe", 0) + 1
+            if confirmed:
+                stats["confirmed"] = stats.get("confirmed", 0) + 1
+                stats["w_confirmed"] = stats.get("w_confirmed", 0) + 1
+
+    STAGE_SECONDS.observe(time.perf_counter() - radar_started, stage="radar")
+    for result, n in radar_results.items():
+        RADAR_COINS.inc(n, result=result)
+        if report_cycle:
+            RADAR_LAST_CYCLE.set(n, result=result)
+
+    # графики среза: requests — загружены, hits — повторные обращения в цикле
+    if report_cycle:
+        report_cache("snapshot", snapshot.hits, snapshot.requests)
+
+    # алерты цикла — одним сообщением (если включено склеивание)
+    notifier.flush()
+
+    # сохранить состояние
+    state["coins"] = coins_state
+    state["stats"] = stats
+    save_state(state)
+
+def run_cycle(state, coins_state, stats, now=None):
+    """
+    Все задачи по очереди в одном потоке: часовой срез рынка, прогноз
+    и отчёты (если подошло время), радар. Для прогонов и бенчмарка
+    (benchmarks/bench_cycle.py); бот запускает задачи планировщиком.
+    now — время по Варшаве (по умолчанию текущее).
+    """
+    cycle_started = time.perf_counter()
+    now = now or warsaw_now()
+    snapshot = MarketSnapshot()
+
+    for job in (market_intel_job, forecast_job, daily_report_job, weekly_report_job, radar_job):
+        job(state, coins_state, stats, now, snapshot)
+
+    STAGE_SECONDS.observe(time.perf_counter() - cycle_started, stage="cycle")
+
+# ===== SCHEDULER =====
+def on_job_error(name, e):
+    if name == "radar":
+        CYCLES.inc(result="error")
+    send_telegram(f"❌ <b>BOT ERROR</b> ({name}): {e}")
+
+scheduler = Scheduler(on_error=on_job_error)
+
+# ===== STREAM =====
+_stream = None
+_stream_triggered = {}      # symbol → ts свечи, по которой радар уже запускали
+_stream_last_trigger = 0.0
+_stream_radar = None        # symbol → задача внеочередного радара по монете (задаётся в run_bot)
+
+def on_stream_bar(symbol, bar):
+    """Поток стрима: объём текущей свечи уже ≥ AGG_VOL_MIN средних — радар по этой монете вне очереди."""
+    global _stream_last_trigger
+    ts, volume = bar[0], bar[5]
+    if _stream is None or _stream_radar is None or _stream_triggered.get(symbol) == ts:
+        return
+
+    df = _stream.candles(symbol)
+    if df is None or len(df) < 25:
+        return
+    vol_avg = df["volume"].iloc[-25:-1].mean()
+    if not vol_avg or volume < vol_avg * AGG_VOL_MIN:
+        return
+
+    _stream_triggered[symbol] = ts
+    now = time.time()
+    if now - _stream_last_trigger < STREAM_TRIGGER_GAP_SEC:
+        return
+    if scheduler.run_now("radar", _stream_radar(symbol)):
+        _stream_last_trigger = now
+        print(f"[STREAM] volume spike {symbol} x{volume / vol_avg:.1f} → radar", flush=True)
+
+def run_bot():
+    global _stream, _stream_radar
+    state, coins_state, stats = init_state(load_state())
+    restored = load_engines()
+    if restored:
+        print(f"[INDICATORS] restored {restored} engines", flush=True)
+
     # стартовое сообщение один раз за сутки — через state-файл (чтобы не спамило при рестартах)
     today = warsaw_now().strftime("%Y-%m-%d")
     if state.get("start_day") != today:
@@ -578,320 +1461,42 @@ def run_bot():
 
     save_state({"coins": coins_state, "stats": stats, **{k: v for k, v in state.items() if k not in ("coins", "stats")}})
 
-    while True:
-        try:
-            now = warsaw_now()
-            day_key = now.strftime("%Y-%m-%d")
-            week_key = now.strftime("%G-%V")
-
-            # ===== HOURLY MARKET INTELLIGENCE =====
-            current_hour = now.strftime("%Y-%m-%d %H")
-
-            if current_hour != state.get("last_oi_hour"):
-            
-                coins_sample = get_top_coins()
-                regime = calculate_market_regime(coins_sample)
-                state["market_regime"] = regime
-            
-                oi_bias = aggregate_oi_bias()
-                state["last_oi_bias"] = oi_bias
-            
-                risk_score = calculate_risk_score(state, coins_sample)
-                vol_mode = calculate_volatility_mode(coins_sample)
-                state["vol_mode"] = vol_mode
-            
-                send_telegram(
-                    "📊 <b>MARKET INTELLIGENCE</b>\n\n"
-                    f"Режим рынка: {regime}\n"
-                    f"Открытый интерес: {oi_bias}\n"
-                    f"Volatility: {vol_mode}\n"
-                    f"Risk Score: <b>{risk_score}/100</b>\n"
-                )
-            
-                state["last_oi_hour"] = current_hour
-                save_state(state)
-
-        
-
-            # rollover day/week in stats
-            if stats.get("day") != day_key:
-                stats["day"] = day_key
-                stats["agg"] = 0
-                stats["safe"] = 0
-                stats["confirmed"] = 0
-
-            if stats.get("week") != week_key:
-                stats["week"] = week_key
-                stats["w_agg"] = 0
-                stats["w_safe"] = 0
-                stats["w_confirmed"] = 0
-
-            # ===== утренний прогноз (07:30 Warsaw) =====
-            if should_fire_at(now, FORECAST_HOUR, FORECAST_MINUTE) and state.get("last_forecast_day") != day_key:
-                coins = get_top_coins()
-                mode = market_mode_snapshot(coins)
-
-                hint = "Тактика: SAFE — основной, AGGRESSIVE — только как радар."
-                if mode.startswith("🟢"):
-                    hint = "Тактика: смотри AGGRESSIVE, жди SAFE, работай выборочно."
-                elif mode.startswith("🔴"):
-                    hint = "Тактика: осторожно. Пропуск — ок. Только самые чистые SAFE."
-
-                msg = (
-                    "🧭 <b>ПРОГНОЗ ДНЯ</b>\n\n"
-                    f"Режим рынка: <b>{mode}</b>\n"
-                    f"{hint}\n\n"
-                    "⛔ Если за 10 минут нет ясности — SKIP."
-                )
-                send_telegram(msg)
-                state["last_forecast_day"] = day_key
-
-            
-
-            # ===== дневной отчёт (20:30 Warsaw) =====
-            if should_fire_at(now, DAILY_REPORT_HOUR, DAILY_REPORT_MINUTE) and state.get("last_daily_day") != day_key:
-                agg = stats.get("agg", 0)
-                safe = stats.get("safe", 0)
-                conf = stats.get("confirmed", 0)
-
-                quality = "🟡 НЕЙТРАЛЬНОЕ"
-                rate = (conf / agg * 100.0) if agg > 0 else 0.0
-                if agg >= 6 and rate >= 30:
-                    quality = "🟢 ХОРОШЕЕ"
-                elif agg >= 6 and rate < 15:
-                    quality = "🔴 ШУМНОЕ"
-
-                send_telegram(
-                    "📊 <b>ИТОГ ДНЯ (AGGRESSIVE → SAFE)</b>\n\n"
-                    f"AGGRESSIVE: {agg}\n"
-                    f"SAFE: {safe}\n"
-                    f"Подтверждений: {conf}\n\n"
-                    f"Качество рынка: <b>{quality}</b>\n"
-                )
-                state["last_daily_day"] = day_key
-                state["yesterday_quality"] = quality
-
-            # ===== недельный отчёт (Пн 10:00 Warsaw) =====
-            if (now.weekday() == WEEKLY_REPORT_WEEKDAY and
-                should_fire_at(now, WEEKLY_REPORT_HOUR, WEEKLY_REPORT_MINUTE) and
-                state.get("last_weekly_week") != week_key):
-
-                send_telegram(
-                    "📈 <b>СТАТИСТИКА НЕДЕЛИ</b>\n\n"
-                    f"AGGRESSIVE: {stats.get('w_agg', 0)}\n"
-                    f"SAFE: {stats.get('w_safe', 0)}\n"
-                    f"Подтверждений: {stats.get('w_confirmed', 0)}\n"
-                )
-                state["last_weekly_week"] = week_key
-
-            # ===== основной радар =====
-            coins = get_top_coins()
-            now_ts = datetime.utcnow().timestamp()
-
-            for coin in coins:
-                # защита: coin должен быть dict
-                if not isinstance(coin, dict):
-                    continue
-
-                cid = coin.get("id")
-                sym = coin.get("symbol", "").upper()
-                if not cid:
-                    continue
-
-                prices, volumes = get_market_chart(cid)
-                htf_bias = analyze_htf_trend(prices)         
-                if prices is None:
-                    continue
-
-                cs = coins_state.get(cid, {})
-                if not isinstance(cs, dict):
-                    cs = {}
-
-                last_sent_ts = cs.get("last_sent_ts", 0)
-                if last_sent_ts and (now_ts - last_sent_ts) < (COOLDOWN_MIN * 60):
-                    continue
-
-                # расчёты
-                price_range = (prices.max() - prices.min()) / prices.mean() * 100.0 if prices.mean() else 0.0
-                vol_avg = volumes[:-12].mean() if len(volumes) > 12 else volumes.mean()
-                vol_now = volumes.iloc[-1]
-                vol_mult = (vol_now / vol_avg) if vol_avg and vol_avg > 0 else 0.0
-
-                chg_1h = pct_change(prices, 1)
-                chg_4h = pct_change(prices, 4)
-                dyn_thr = dynamic_threshold(prices)
-
-                signal_direction = "LONG" if chg_1h >= 0 else "SHORT"
-
-                # направление (грубо) — нужно для "подтверждён"
-                direction = "UP" if chg_1h >= 0 else "DOWN"
-
-                stage = None
-                reasons = []
-                strength = 0
-
-                # сила от объёма
-                if vol_mult >= 1.6:
-                    strength += 1
-                if vol_mult >= 2.0:
-                    strength += 1
-                if vol_mult >= 3.0:
-                    strength += 1
-
-                # подготовка
-                if vol_mult >= 2.0 and price_range <= FLAT_RANGE_MAX:
-                    stage = "ПОДГОТОВКА"
-                    reasons += ["Цена во флете", f"Объём x{vol_mult:.1f}"]
-                    strength += 1
-
-                # запуск
-                launch_impulse = abs(chg_1h) >= dyn_thr
-                if vol_mult >= 3.0 and launch_impulse:
-                    stage = "ЗАПУСК"
-                    reasons += [f"Импульс 1ч {chg_1h:.2f}%", "Есть объём"]
-                    strength += 1
-
-                # перегрев
-                if abs(chg_4h) >= OVERHEAT_4H:
-                    stage = "ПЕРЕГРЕВ"
-                    reasons += [f"Импульс 4ч {chg_4h:.2f}%", "Риск выдоха"]
-                    strength += 1
-
-                # подтверждение 1h + 4h в одну сторону
-                if chg_1h * chg_4h > 0:
-                    strength += 1
-                    reasons.append("1h + 4h в одну сторону")
-
-                # --------- AGGRESSIVE условия (раньше SAFE) ----------
-                agg_impulse = abs(chg_1h) >= max(dyn_thr * AGG_IMPULSE_FACTOR, 0.6)
-                is_aggressive = (vol_mult >= AGG_VOL_MIN and agg_impulse and stage != "ПЕРЕГРЕВ")
-
-                # --------- SAFE условия (строже + HTF фильтр) ----------
-                is_safe = (
-                    stage == "ЗАПУСК"
-                    and strength >= SAFE_MIN_STRENGTH
-                    and abs(chg_4h) < OVERHEAT_4H
-                )
-
-                # ===== GLOBAL MARKET FILTER =====
-                market_regime = state.get("market_regime", "🟡 RANGE MARKET")
-                
-                if is_safe:
-                    if "LONG MARKET" in market_regime and signal_direction == "SHORT":
-                        is_safe = False
-                    elif "SHORT MARKET" in market_regime and signal_direction == "LONG":
-                        is_safe = False
-                
-             
-                
-                # SAFE разрешаем только если совпадает с HTF
-                if is_safe:
-                    if htf_bias != signal_direction:
-                        is_safe = False
-
-                risk_score = state.get("risk_score", 50)
-
-                # 🚨 Risk OFF — режем агрессию
-                if risk_score < 40:
-                    is_aggressive = False
-                
-                # 🚨 Полный Risk OFF — SAFE тоже режем
-                if risk_score < 30:
-                    is_safe = False
-                
-                # 🔥 Risk ON — усиливаем SAFE
-                if risk_score > 65 and is_safe:
-                    strength += 1
-
-                vol_mode = state.get("vol_mode", "NORMAL")
-
-                if vol_mode == "HIGH" and risk_score < 55:
-                    is_aggressive = False
-                
-                if vol_mode == "LOW":
-                    is_aggressive = False
-
-                if not is_aggressive and not is_safe:
-                    continue
-
-                # выбираем тип: SAFE приоритетнее
-                sig_type = "SAFE" if is_safe else "AGG"
-
-                # анти-дубликат: если одинаковое уже было
-                if cs.get("last_type") == sig_type and cs.get("last_stage") == stage and cs.get("last_strength") == strength:
-                    continue
-
-                # --- логика подтверждения ---
-                confirmed_tag = ""
-                confirmed = False
-                if sig_type == "SAFE":
-                    last_agg_ts = cs.get("last_agg_ts", 0)
-                    last_agg_dir = cs.get("last_agg_dir")
-                    if last_agg_ts and (now_ts - last_agg_ts) <= (CONFIRM_WINDOW_HOURS * 3600) and last_agg_dir == direction:
-                        confirmed = True
-                        confirmed_tag = "\n<b>AGGRESSIVE → SAFE подтверждён</b>"
-
-                # сформировать сообщение
-                emoji = {"ПОДГОТОВКА": "🟢", "ЗАПУСК": "🟡", "ПЕРЕГРЕВ": "🔴"}.get(stage, "⚪")
-                fire = "🔥" * max(1, min(strength, 5))
-                strength_norm = max(1, min(strength, 5))
-
-                if sig_type == "AGG":
-                    title = f"⚠️ <b>AGGRESSIVE</b> — ранний радар"
-                    conclusion = conclusion_for_agg()
-                else:
-                    title = f"✅ <b>SAFE</b>{confirmed_tag}"
-                    conclusion = conclusion_for_safe()
-
-                msg = (
-                    f"{title}\n"
-                    f"📈 HTF: <b>{htf_bias}</b>\n"
-                    f"🧮 Risk: <b>{risk_score}/100</b>\n"
-                    f"{emoji} <b>{sym}</b>\n"
-                    f"Стадия: <b>{stage}</b>\n"
-                    f"Сила: {fire} ({strength_norm}/5)\n\n"
-                    f"1ч: {chg_1h:.2f}% | 4ч: {chg_4h:.2f}%\n"
-                    f"Объём: x{vol_mult:.1f}\n\n"
-                    f"Причины:\n• " + "\n• ".join(reasons) +
-                    f"\n\n{memo_intraday()}\n\n"
-                    f"🧠 <b>ВЫВОД</b>:\n{conclusion}"
-                )
-
-                send_telegram(msg)
-
-                # обновить стейт монеты
-                cs["last_sent_ts"] = now_ts
-                cs["last_type"] = sig_type
-                cs["last_stage"] = stage
-                cs["last_strength"] = strength_norm
-
-                # сохранить AGG “якорь” для будущего подтверждения
-                if sig_type == "AGG":
-                    cs["last_agg_ts"] = now_ts
-                    cs["last_agg_dir"] = direction
-
-                coins_state[cid] = cs
-
-                # обновить статистику
-                if sig_type == "AGG":
-                    stats["agg"] = stats.get("agg", 0) + 1
-                    stats["w_agg"] = stats.get("w_agg", 0) + 1
-                else:
-                    stats["safe"] = stats.get("safe", 0) + 1
-                    stats["w_safe"] = stats.get("w_safe", 0) + 1
-                    if confirmed:
-                        stats["confirmed"] = stats.get("confirmed", 0) + 1
-                        stats["w_confirmed"] = stats.get("w_confirmed", 0) + 1
-
-            # сохранить состояние
-            state["coins"] = coins_state
-            state["stats"] = stats
-            save_state(state)
-
-        except Exception as e:
-            send_telegram(f"❌ <b>BOT ERROR</b>: {e}")
-
-        time.sleep(CHECK_INTERVAL_SEC)
+    def scheduled(job):
+        # слот планировщика → время по Варшаве; срез рынка общий для задач одного тика
+        def run(slot):
+            job(state, coins_state, stats, warsaw_time(slot), market_snapshot())
+        return run
+
+    def radar_tick(slot):
+        radar_job(state, coins_state, stats, warsaw_time(slot), market_snapshot())
+        CYCLES.inc(result="ok")
+        # движки индикаторов analyze_symbol — чтобы после рестарта не прогревать заново
+        save_engines()
+
+    # каждая задача — свой поток: срез рынка и отчёты не задерживают радар после закрытия свечи
+    scheduler.add("radar", radar_tick, Every(CHECK_INTERVAL_SEC, CANDLE_CLOSE_DELAY_SEC),
+                  catch_up=RADAR_CATCH_UP_SEC, jitter=RADAR_JITTER_SEC)
+    scheduler.add("market_intel", scheduled(market_intel_job), Every(3600, CANDLE_CLOSE_DELAY_SEC),
+                  catch_up=3600 - CANDLE_CLOSE_DELAY_SEC)
+    scheduler.add("forecast", scheduled(forecast_job),
+                  At(FORECAST_HOUR, FORECAST_MINUTE, utc_offset_hours=WARSAW_OFFSET_HOURS),
+                  catch_up=REPORT_CATCH_UP_MIN * 60)
+    scheduler.add("daily_report", scheduled(daily_report_job),
+                  At(DAILY_REPORT_HOUR, DAILY_REPORT_MINUTE, utc_offset_hours=WARSAW_OFFSET_HOURS),
+                  catch_up=REPORT_CATCH_UP_MIN * 60)
+    scheduler.add("weekly_report", scheduled(weekly_report_job),
+                  At(WEEKLY_REPORT_HOUR, WEEKLY_REPORT_MINUTE, WEEKLY_REPORT_WEEKDAY, WARSAW_OFFSET_HOURS),
+                  catch_up=REPORT_CATCH_UP_MIN * 60)
+
+    if STREAM_EXCHANGE:
+        # радар по монете всплеска на срезе текущего тика (его графики не перезагружаются)
+        _stream_radar = lambda symbol: lambda slot: stream_radar_job(
+            state, coins_state, stats, warsaw_time(slot), market_snapshot(), symbol)
+        _stream = start_stream(STREAM_EXCHANGE, get_top20_usdt_perps(), "1h", url=STREAM_URL, on_bar=on_stream_bar)
+
+    for name, slot in scheduler.next_runs().items():
+        print(f"[SCHED] {name}: next {warsaw_time(slot):%Y-%m-%d %H:%M:%S} Warsaw", flush=True)
+    scheduler.run_forever()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -903,9 +1508,19 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    # новых запусков не будет; доотправить очередь Telegram перед остановкой
+    scheduler.stop()
+    stop_stream()
+    notifier.stop()
+
 app = FastAPI(lifespan=lifespan)
 
 
+@app.get("/metrics")
+def metrics():
+    return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.post("/webhook")
 async def tradingview_webhook(request: Request):
     data = await request.json()
@@ -24,11 +24,15 @@ def _get_rb_params():
     }
 
 
-def range_breakout_5m(df: pd.DataFrame):
+def range_breakout_5m(df: pd.DataFrame, params=None):
+    """
+    Пробой флета на 5m. params — dict как у _get_rb_params
+    (по умолчанию берётся оттуда; sweep.py передаёт свои).
+    """
     if df is None or len(df) < 21:
         return None
 
-    p = _get_rb_params()
+    p = params or _get_rb_params()
     flat_candles = int(p["FLAT_CANDLES"])
     max_range_pct = float(p["MAX_RANGE_PCT"])
     min_candle_move = float(p["MIN_CANDLE_MOVE"])
@@ -38,7 +42,9 @@ def range_breakout_5m(df: pd.DataFrame):
     if len(df) < flat_candles + 1:
         return None
 
-    recent = df.iloc[-flat_candles:]
+    # флет — свечи перед последней: сама свеча пробоя в диапазон не входит,
+    # иначе её close никогда не выходит за high/low окна
+    recent = df.iloc[-flat_candles - 1:-1]
 
     high = float(recent["high"].max())
     low = float(recent["low"].min())
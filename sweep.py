@@ -0,0 +1,334 @@
+"""
+Перебор параметров range_breakout_5m и wave3_setup на истории 5m свечей
+из локального хранилища.
+
+Признаки, не зависящие от параметров (диапазоны окон, средние объёмы,
+импульс свечи), считаются по всем барам сразу и один раз на процесс;
+каждая комбинация — это несколько сравнений массивов.
+Процессы открывают ряды из хранилища как memmap сами: свечи не
+пиклятся и не копируются в задачи, задача — только список параметров.
+
+Запуск из корня репозитория:
+    python sweep.py rb --source binance --symbols BTCUSDT,ETHUSDT
+    python sweep.py wave3 --source binance --samples 500 --top 30
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from core.datasource import OHLCV_STORE_DIR
+from core.store import CandleStore
+
+# =============================
+# СЕТКИ ПАРАМЕТРОВ
+# =============================
+RB_GRID = {
+    "FLAT_CANDLES": [10, 15, 20, 30, 40],
+    "MAX_RANGE_PCT": [1.5, 2.0, 2.5, 3.0, 4.0],
+    "MIN_CANDLE_MOVE": [0.3, 0.6, 0.9, 1.2],
+    "MAX_CANDLE_MOVE": [3.0, 5.0],
+    "VOL_MULT": [1.2, 1.5, 1.8, 2.5],
+}
+
+WAVE3_GRID = {
+    "impulse_min_pct": [3.0, 4.0, 6.0, 8.0],
+    "pullback_max": [0.3, 0.5, 0.7],
+    "flat_max_range": [1.5, 2.5, 4.0],
+    "volume_mult": [1.2, 1.8, 2.5],
+}
+
+HORIZON = 12             # бары 5m → 1 час
+MIN_SIGNALS = 20         # меньше сигналов — в рейтинг не попадает
+
+
+def grid_combos(grid, samples=None, seed=42):
+    """Все комбинации сетки или samples случайных без повторов."""
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+    if samples and samples < len(combos):
+        combos = random.Random(seed).sample(combos, samples)
+    return combos
+
+
+# =============================
+# ОКНА ПО ВСЕМ БАРАМ
+# =============================
+def _window(values, start, stop, reduce):
+    """
+    reduce по срезу values[start:stop] ряда, заканчивающегося на баре t —
+    для каждого t (start < stop ≤ 0, как prices[-90:-50]; stop=0 — до конца).
+    Бары без полного окна — NaN.
+    """
+    n = len(values)
+    length = stop - start
+    out = np.full(n, np.nan)
+    # окно для бара t начинается с t+1+start: первый бар с полным окном — first
+    first = -1 - start
+    if n < length or n <= first:
+        return out
+    reduced = reduce(sliding_window_view(values, length), axis=-1)
+    out[first:] = reduced[:n - first]
+    return out
+
+
+def _forward(close, horizon):
+    out = np.full(len(close), np.nan)
+    if horizon < len(close):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[:-horizon] = (close[horizon:] - close[:-horizon]) / close[:-horizon] * 100.0
+    return out
+
+
+def _first_of_run(mask):
+    """Сетап, держащийся несколько баров подряд, — один сигнал (первый бар)."""
+    prev = np.zeros_like(mask)
+    prev[1:] = mask[:-1]
+    return mask & ~prev
+
+
+# =============================
+# RANGE BREAKOUT 5M (как signals.range_breakout_5m)
+# =============================
+class RangeBreakoutFeatures:
+
+    MIN_BARS = 21           # короче range_breakout_5m не смотрит
+
+    def __init__(self, cols, horizon=HORIZON):
+        self.high = np.asarray(cols["high"], dtype=float)
+        self.low = np.asarray(cols["low"], dtype=float)
+        self.close = np.asarray(cols["close"], dtype=float)
+        self.volume = np.asarray(cols["volume"], dtype=float)
+        self.bars = np.arange(len(self.close))
+
+        prev_close = np.full(len(self.close), np.nan)
+        prev_close[1:] = self.close[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.candle_move = np.abs((self.close - prev_close) / prev_close * 100.0)
+        self.prev_ok = prev_close != 0
+
+        self.forward = _forward(self.close, horizon)
+        self._flat = {}
+
+    def flat(self, n):
+        """high/low/средний объём n свечей перед текущей — для каждого бара."""
+        if n not in self._flat:
+            self._flat[n] = (
+                _window(self.high, -n - 1, -1, np.max),
+                _window(self.low, -n - 1, -1, np.min),
+                _window(self.volume, -n - 1, -1, np.mean),
+            )
+        return self._flat[n]
+
+    def hits(self, p):
+        """(бары, где range_breakout_5m(df[:t+1], p) срабатывает; пробой вверх)."""
+        n = int(p["FLAT_CANDLES"])
+        high, low, avg_volume = self.flat(n)
+        mid = (high + low) / 2.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            range_pct = (high - low) / mid * 100.0
+            volume_x = self.volume / avg_volume
+
+        up = self.close > high
+        down = self.close < low
+        hit = (
+            (self.bars >= max(20, n))
+            & (mid != 0)
+            & (range_pct <= float(p["MAX_RANGE_PCT"]))
+            & self.prev_ok
+            & (self.candle_move >= float(p["MIN_CANDLE_MOVE"]))
+            & (self.candle_move <= float(p["MAX_CANDLE_MOVE"]))
+            & (avg_volume > 0)
+            & (volume_x >= float(p["VOL_MULT"]))
+            & (up | down)
+        )
+        return hit, up
+
+    def evaluate(self, p):
+        hit, up = self.hits(p)
+        hit = _first_of_run(hit)
+        # пробой вниз торгуется в шорт
+        return self.forward[hit] * np.where(up[hit], 1.0, -1.0)
+
+
+# =============================
+# WAVE 3 (как signals.wave3_setup по close/volume)
+# =============================
+class Wave3Features:
+
+    MIN_BARS = 100          # короче wave3_setup не смотрит
+
+    def __init__(self, cols, horizon=HORIZON):
+        close = np.asarray(cols["close"], dtype=float)
+        volume = np.asarray(cols["volume"], dtype=float)
+        n = len(close)
+
+        base = np.full(n, np.nan)
+        base[89:] = close[:n - 89] if n > 89 else []
+        peak = _window(close, -90, -50, np.max)
+        pullback_low = _window(close, -50, -30, np.min)
+        flat_hi = _window(close, -30, 0, np.max)
+        flat_lo = _window(close, -30, 0, np.min)
+        avg_vol = _window(volume, -90, -30, np.mean)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.impulse_pct = (peak - base) / base * 100.0
+            self.pullback_pct = (peak - pullback_low) / (peak - base)
+            flat_mid = (flat_hi + flat_lo) / 2.0
+            self.range_pct = np.abs((flat_hi - flat_lo) / flat_mid * 100.0)
+            self.volume_x = volume / avg_vol
+
+        self.valid = (
+            (np.arange(n) >= 99)
+            & (peak > base) & (base != 0)
+            & (flat_mid != 0)
+            & (avg_vol > 0)
+        )
+        self.forward = _forward(close, horizon)
+
+    def hits(self, p):
+        """Бары, где wave3_setup(close[:t+1], volume[:t+1], **p) срабатывает."""
+        return (
+            self.valid
+            & (self.impulse_pct >= float(p["impulse_min_pct"]))
+            & (self.pullback_pct <= float(p["pullback_max"]))
+            & (self.range_pct <= float(p["flat_max_range"]))
+            & (self.volume_x >= float(p["volume_mult"]))
+        )
+
+    def evaluate(self, p):
+        return self.forward[_first_of_run(self.hits(p))]
+
+
+STRATEGIES = {
+    "rb": (RB_GRID, RangeBreakoutFeatures),
+    "wave3": (WAVE3_GRID, Wave3Features),
+}
+
+
+# =============================
+# ПРОЦЕССЫ
+# =============================
+_worker = {}
+
+
+def _init_worker(store_root, source, symbols, tf, strategy, horizon):
+    """Каждый процесс открывает ряды сам (memmap) и считает свои признаки."""
+    store = CandleStore(store_root)
+    _, feature_cls = STRATEGIES[strategy]
+    frames = []
+    for sym in symbols:
+        cols = store.open_arrays(source, sym, tf)
+        # на коротком ряду стратегия не срабатывает ни на одном баре
+        if len(cols["close"]) >= feature_cls.MIN_BARS:
+            frames.append(feature_cls(cols, horizon))
+    _worker["frames"] = frames
+
+
+def _score(returns):
+    returns = returns[~np.isnan(returns)]
+    if len(returns) == 0:
+        return {"signals": 0, "hit_rate": None, "avg_ret": None, "total_ret": 0.0}
+    return {
+        "signals": int(len(returns)),
+        "hit_rate": float((returns > 0).mean()),
+        "avg_ret": float(returns.mean()),
+        "total_ret": float(returns.sum()),
+    }
+
+
+def _run_chunk(combos):
+    out = []
+    for p in combos:
+        rets = [f.evaluate(p) for f in _worker["frames"]]
+        out.append({"params": p, **_score(np.concatenate(rets) if rets else np.empty(0))})
+    return out
+
+
+def run_sweep(store_root, source, symbols, strategy, combos, tf="5m",
+              horizon=HORIZON, workers=None):
+    """Оценить все комбинации; результаты в порядке combos."""
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, len(combos) // (workers * 4))
+    chunks = [combos[i:i + chunk] for i in range(0, len(combos), chunk)]
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(store_root, source, symbols, tf, strategy, horizon),
+    ) as pool:
+        for part in pool.map(_run_chunk, chunks):
+            results.extend(part)
+    return results
+
+
+def rank(results, key="avg_ret", min_signals=MIN_SIGNALS):
+    eligible = [r for r in results if r["signals"] >= min_signals and r[key] is not None]
+    return sorted(eligible, key=lambda r: r[key], reverse=True)
+
+
+def format_table(ranked, top=20):
+    if not ranked:
+        return "нет комбинаций с достаточным числом сигналов"
+    keys = list(ranked[0]["params"])
+    header = f"{'#':>3} {'сигн':>6} {'hit':>7} {'avg':>8} {'sum':>9}  " + " ".join(f"{k:>15}" for k in keys)
+    lines = [header]
+    for i, r in enumerate(ranked[:top], 1):
+        lines.append(
+            f"{i:>3} {r['signals']:>6} {r['hit_rate'] * 100:>6.1f}% {r['avg_ret']:>+7.3f}% {r['total_ret']:>+8.2f}%  "
+            + " ".join(f"{r['params'][k]:>15}" for k in keys)
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перебор параметров range_breakout_5m / wave3_setup")
+    parser.add_argument("strategy", choices=sorted(STRATEGIES))
+    parser.add_argument("--store", default=OHLCV_STORE_DIR, help="каталог хранилища свечей")
+    parser.add_argument("--source", default="binance")
+    parser.add_argument("--tf", default="5m")
+    parser.add_argument("--symbols", help="через запятую; по умолчанию — все ряды источника с этим tf")
+    parser.add_argument("--samples", type=int, help="случайная выборка комбинаций вместо полной сетки")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="горизонт доходности в барах")
+    parser.add_argument("--workers", type=int, help="процессов (по умолчанию — все ядра)")
+    parser.add_argument("--rank", default="avg_ret", choices=["avg_ret", "hit_rate", "total_ret"])
+    parser.add_argument("--min-signals", type=int, default=MIN_SIGNALS)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", help="сохранить все результаты в файл")
+    args = parser.parse_args()
+
+    if args.symbols:
+        symbols = [s.strip().upper() for s in args.symbols.split(",") if s.strip()]
+    else:
+        folder = os.path.join(args.store, args.source)
+        suffix = f"_{args.tf}.f64"
+        names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+        symbols = [n[:-len(suffix)] for n in names if n.endswith(suffix)]
+    if not symbols:
+        print(f"[SWEEP] нет {args.tf} свечей в {args.store}/{args.source}", flush=True)
+        return
+
+    grid, _ = STRATEGIES[args.strategy]
+    combos = grid_combos(grid, args.samples, args.seed)
+
+    started = time.time()
+    results = run_sweep(args.store, args.source, symbols, args.strategy, combos,
+                        tf=args.tf, horizon=args.horizon, workers=args.workers)
+    print(f"[SWEEP] {args.strategy}: {len(combos)} комбинаций × {len(symbols)} монет за {time.time() - started:.1f}s", flush=True)
+    print(format_table(rank(results, args.rank, args.min_signals), args.top), flush=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()